@@ -1,28 +1,286 @@
-from flask import Flask, render_template, jsonify, request
+import atexit
+import json
+import math
+import os
+import queue
+import threading
+import time
+from flask import Flask, Response, render_template, jsonify, request, g
 from flask_cors import CORS
+from werkzeug.local import LocalProxy
 from pow_simulator import PoWSimulator
 from pos_simulator import PoSSimulator
 from fork_resolution import ForkResolutionSimulator
+from chain_storage import SegmentLogStore
+from mining_jobs import MiningScheduler, QueueFullError
+from retarget import RETARGET_ALGORITHMS
+from session_registry import Session, SessionRegistry
+from metrics import METRICS, SIZE_BUCKETS, RequestProfiler
 
 app = Flask(__name__)
 CORS(app)
 
-# Khởi tạo các simulator
-pow_sim = PoWSimulator()
-pos_sim = PoSSimulator()
-fork_sim = ForkResolutionSimulator()
+# Số cuộc đua tối đa cho một lần gọi /api/pow/mine-batch
+MAX_BATCH_RACES = 10000
 
-# Khởi tạo với dữ liệu mặc định
-pow_sim.create_genesis_block()
-pow_sim.add_miner("Miner Alpha", hash_power=100)
-pow_sim.add_miner("Miner Beta", hash_power=150)
-pow_sim.add_miner("Miner Gamma", hash_power=80)
+# Số vòng validation tối đa cho một lần gọi /api/pos/validate-multiple
+MAX_VALIDATION_ROUNDS = 10000000
 
-pos_sim.add_validator("Validator A", stake=10)
-pos_sim.add_validator("Validator B", stake=50)
-pos_sim.add_validator("Validator C", stake=40)
+# Giới hạn cho một lần gọi /api/fork/network-sim
+MAX_NETWORK_NODES = 5000
+MAX_NETWORK_EVENTS = 5000000
 
-fork_sim.create_initial_chain()
+# Giới hạn cho một lần gọi /api/pos/epochs (tổng số slot = epochs * slots_per_epoch)
+MAX_EPOCH_SLOTS = 2000000
+MAX_EPOCH_VALIDATORS = 1000000
+
+# Tham số số được chấp nhận cho từng thuật toán ở /api/pow/retarget
+RETARGET_PARAMS = {
+    'legacy': {},
+    'epoch': {'window': int, 'max_step': float},
+    'window': {'window': int, 'max_step': float},
+    'asert': {'half_life': float}
+}
+
+# Thời gian tối đa một request chờ job đào xong (?wait=...)
+MAX_JOB_WAIT = 30
+
+# Thư mục lưu chain bền vững (segment log + mmap); không đặt thì chain chỉ nằm trong bộ nhớ
+CHAIN_DATA_DIR = os.environ.get('CHAIN_DATA_DIR')
+
+def _open_chain_store(name: str):
+    """Mở chain store trong CHAIN_DATA_DIR, None nếu không bật lưu trữ"""
+    if not CHAIN_DATA_DIR:
+        return None
+    return SegmentLogStore(os.path.join(CHAIN_DATA_DIR, name))
+
+# Phiên mô phỏng: mỗi client (session id) có bộ simulator riêng
+# Session id lấy từ header X-Session-Id, ?session= hoặc cookie sim_session; không có thì dùng phiên 'default'
+DEFAULT_SESSION_ID = 'default'
+SESSION_COOKIE = 'sim_session'
+MAX_SESSIONS = int(os.environ.get('MAX_SESSIONS', 200))
+SESSION_TTL = float(os.environ.get('SESSION_TTL', 1800))
+SESSION_MEMORY_BUDGET = int(os.environ.get('SESSION_MEMORY_BUDGET', 512 * 1024 * 1024))
+# Phiên không dùng tới được ghi ra thư mục này (chỉ chủ sở hữu truy cập được) và nạp lại khi client quay lại
+# Không đặt thì dùng thư mục tạm riêng của tiến trình (tên ngẫu nhiên, quyền 0700),
+# chỉ được tạo khi có phiên đầu tiên cần ghi ra đĩa và bị xoá khi tiến trình thoát
+SESSION_DATA_DIR = os.environ.get('SESSION_DATA_DIR') or (
+    os.path.join(CHAIN_DATA_DIR, 'sessions') if CHAIN_DATA_DIR else None
+)
+# Tổng dung lượng tối đa của các file phiên trên đĩa (bytes), vượt thì xoá phiên cũ nhất
+SESSION_DISK_BUDGET = int(os.environ.get('SESSION_DISK_BUDGET', 2 * 1024 * 1024 * 1024))
+# Khoá ký HMAC cho file phiên; đặt SESSION_SECRET để nạp lại được phiên đã ghi sau khi khởi động lại server
+SESSION_SECRET = os.environ.get('SESSION_SECRET')
+
+def _new_session(session_id: str) -> Session:
+    """
+    Tạo phiên mới với dữ liệu mặc định
+    Phiên 'default' dùng chain store trong CHAIN_DATA_DIR (nếu có) và luôn nằm trong bộ nhớ
+    """
+    pinned = session_id == DEFAULT_SESSION_ID
+    pow_sim = PoWSimulator(storage=_open_chain_store('pow') if pinned else None)
+    pos_sim = PoSSimulator()
+    fork_sim = ForkResolutionSimulator(storage=_open_chain_store('fork') if pinned else None)
+    
+    # Khởi tạo với dữ liệu mặc định (chain đã lưu trên đĩa thì nạp lại)
+    if not pow_sim.blockchain:
+        pow_sim.create_genesis_block()
+    pow_sim.add_miner("Miner Alpha", hash_power=100)
+    pow_sim.add_miner("Miner Beta", hash_power=150)
+    pow_sim.add_miner("Miner Gamma", hash_power=80)
+    
+    pos_sim.add_validator("Validator A", stake=10)
+    pos_sim.add_validator("Validator B", stake=50)
+    pos_sim.add_validator("Validator C", stake=40)
+    
+    if not fork_sim.load_from_storage():
+        fork_sim.create_initial_chain()
+    
+    return Session(session_id, {'pow': pow_sim, 'pos': pos_sim, 'fork': fork_sim}, pinned=pinned)
+
+# Các job đào chạy nền: mỗi phiên có hàng đợi riêng, vài thread nền xoay vòng giữa các phiên
+# (mỗi lần một cuộc đua), mỗi job chạy trên simulator của phiên đã gửi nó
+MINING_WORKERS = int(os.environ.get('MINING_WORKERS', 2))
+MAX_SESSION_JOBS = int(os.environ.get('MAX_SESSION_JOBS', 10))
+mining_scheduler = MiningScheduler(workers=MINING_WORKERS, owner_queue_size=MAX_SESSION_JOBS)
+
+sessions = SessionRegistry(
+    _new_session,
+    max_sessions=MAX_SESSIONS,
+    ttl=SESSION_TTL,
+    memory_budget=SESSION_MEMORY_BUDGET,
+    spill_dir=SESSION_DATA_DIR,
+    temporary_spill=SESSION_DATA_DIR is None,
+    disk_budget=SESSION_DISK_BUDGET,
+    is_busy=lambda session: mining_scheduler.is_busy(session.id),
+    spill_key=SESSION_SECRET.encode() if SESSION_SECRET else None
+)
+atexit.register(sessions.close)
+sessions.release(sessions.acquire(DEFAULT_SESSION_ID))
+
+# Simulator và luồng event của phiên đang phục vụ request hiện tại
+# Các simulator không bao giờ bị thay thế (reset diễn ra tại chỗ); mọi truy cập từ request
+# đi qua khoá đọc/ghi của từng simulator (sim.lock) để chạy được với server nhiều thread
+pow_sim = LocalProxy(lambda: g.session.pow)
+pos_sim = LocalProxy(lambda: g.session.pos)
+fork_sim = LocalProxy(lambda: g.session.fork)
+events = LocalProxy(lambda: g.session.events)
+
+# Metric theo endpoint (nhãn là route, vd. /api/pow/jobs/<job_id>, để số chuỗi nhãn có giới hạn)
+HTTP_REQUESTS = METRICS.counter('http_requests_total', 'Số request theo endpoint, method và status',
+                                ('endpoint', 'method', 'status'))
+HTTP_DURATION = METRICS.histogram('http_request_duration_seconds', 'Thời gian xử lý request (giây)', ('endpoint',))
+HTTP_RESPONSE_SIZE = METRICS.histogram('http_response_size_bytes', 'Kích thước response (bytes)', ('endpoint',),
+                                       buckets=SIZE_BUCKETS)
+METRICS.gauge('sessions_in_memory', 'Số phiên mô phỏng đang nằm trong bộ nhớ',
+              callback=lambda: sessions.stats()['sessions_in_memory'])
+METRICS.gauge('mining_jobs_queued', 'Số job đào đang chờ trong hàng đợi',
+              callback=lambda: mining_scheduler.stats()['queued'])
+
+# Hook profiling: bật bằng PROFILING_ENABLED=1, thêm ?profile=1 vào request để chạy nó dưới cProfile;
+# response có header X-Profile-Id, xem kết quả tại /api/metrics/profiles/<id>
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED') == '1'
+request_profiler = RequestProfiler()
+
+@app.before_request
+def _start_request_metrics():
+    if METRICS.enabled:
+        g.request_start = time.perf_counter()
+    if PROFILING_ENABLED and request.args.get('profile'):
+        g.profiler = request_profiler.start()
+
+@app.after_request
+def _record_request_metrics(response):
+    active = g.pop('profiler', None)
+    if active is not None:
+        response.headers['X-Profile-Id'] = request_profiler.stop(active, f"{request.method} {request.full_path}")
+    start = g.pop('request_start', None)
+    if start is not None:
+        endpoint = request.url_rule.rule if request.url_rule is not None else 'unmatched'
+        HTTP_DURATION.observe(time.perf_counter() - start, endpoint=endpoint)
+        HTTP_REQUESTS.inc(endpoint=endpoint, method=request.method, status=response.status_code)
+        # Response streaming (NDJSON, SSE) không biết trước kích thước
+        if not response.is_streamed and response.content_length is not None:
+            HTTP_RESPONSE_SIZE.observe(response.content_length, endpoint=endpoint)
+    return response
+
+@app.teardown_request
+def _stop_request_profiler(exc=None):
+    # Request lỗi không qua after_request: vẫn phải dừng profiler để nhả khoá
+    active = g.pop('profiler', None)
+    if active is not None:
+        request_profiler.stop(active, f"{request.method} {request.full_path} (lỗi)")
+
+def _request_session_id() -> str:
+    return (
+        request.headers.get('X-Session-Id')
+        or request.args.get('session')
+        or request.cookies.get(SESSION_COOKIE)
+        or DEFAULT_SESSION_ID
+    )
+
+@app.before_request
+def _acquire_session():
+    if not request.path.startswith('/api/'):
+        return None
+    try:
+        g.session = sessions.acquire(_request_session_id())
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    return None
+
+@app.after_request
+def _session_header(response):
+    if 'session' in g:
+        response.headers['X-Session-Id'] = g.session.id
+    return response
+
+@app.teardown_request
+def _release_session(exc=None):
+    session = g.pop('session', None)
+    if session is not None:
+        sessions.release(session)
+
+def _publish_race(result: dict, bus=None):
+    """
+    Phát event block mới (và điều chỉnh độ khó nếu có) từ kết quả một cuộc đua
+    bus: EventBus của phiên, mặc định là phiên của request hiện tại
+    """
+    if 'block' not in result:
+        return
+    if bus is None:
+        bus = events
+    bus.publish('block', {
+        'chain': 'pow',
+        'block': result['block'],
+        'winner': result['winner'],
+        'attempts': result['attempts'],
+        'mining_time': result['mining_time'],
+        'blockchain_length': result['blockchain_length']
+    })
+    if result['adjustment']:
+        bus.publish('difficulty', {
+            'difficulty': result['difficulty'],
+            'difficulty_value': result['difficulty_value'],
+            'adjustment': result['adjustment']
+        })
+
+def _numeric_options(data: dict, spec: dict) -> dict:
+    """
+    Lấy các tham số số trong body theo spec (tên -> int hoặc float), ép kiểu và kiểm tra
+    Giá trị null được giữ nguyên (dùng mặc định / None); bool, chuỗi không phải số
+    và số không nguyên cho tham số int thì báo ValueError
+    """
+    options = {}
+    for key, kind in spec.items():
+        if key not in data:
+            continue
+        value = data[key]
+        if value is None:
+            options[key] = None
+            continue
+        if isinstance(value, bool) or (kind is int and isinstance(value, float) and not value.is_integer()):
+            raise ValueError(f"{key} phải là số {'nguyên' if kind is int else 'thực'}")
+        try:
+            options[key] = kind(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"{key} phải là số {'nguyên' if kind is int else 'thực'}") from None
+    return options
+
+def _request_seed():
+    """Seed tuỳ chọn trong body JSON của request reset ({"seed": 42}), None nếu không có"""
+    seed = (request.get_json(silent=True) or {}).get('seed')
+    if seed is not None and (not isinstance(seed, int) or isinstance(seed, bool) or seed < 0):
+        raise ValueError("seed phải là số nguyên không âm")
+    return seed
+
+def _spliced_json_response(data_json: bytes, pagination=None) -> Response:
+    """
+    Dựng response {"success": true, "data": ...} từ mảng JSON đã encode sẵn
+    (ghép từ JSON cache của từng block thay vì jsonify lại toàn bộ chain)
+    """
+    body = b'{"success":true,"data":' + data_json
+    if pagination is not None:
+        body += b',"pagination":' + json.dumps(pagination, separators=(',', ':')).encode()
+    return Response(body + b'}', mimetype='application/json')
+
+def _page_args():
+    """
+    Đọc tham số phân trang từ query string: start, limit, since (hash), tip=1
+    Trả về None nếu request không dùng phân trang (giữ nguyên response cũ)
+    """
+    args = request.args
+    if not any(key in args for key in ('start', 'limit', 'since', 'tip')):
+        return None
+    return {
+        'start': args.get('start', type=int),
+        'limit': args.get('limit', type=int),
+        'since_hash': args.get('since'),
+        'tip_only': args.get('tip', '0').lower() in ('1', 'true')
+    }
 
 @app.route('/')
 def index():
@@ -36,6 +294,141 @@ def pow_mine():
     """Đào một block mới sử dụng PoW"""
     try:
         result = pow_sim.simulate_mining_race()
+        _publish_race(result)
+        return jsonify({
+            'success': True,
+            'data': result
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/pow/jobs', methods=['POST'])
+def pow_submit_job():
+    """
+    Xếp hàng một job đào chạy nền, trả về ngay job id
+    Body: {"count": 1}
+    """
+    data = request.get_json(silent=True) or {}
+    count = data.get('count', 1)
+    
+    if isinstance(count, bool) or not isinstance(count, int) or not 1 <= count <= MAX_BATCH_RACES:
+        return jsonify({
+            'success': False,
+            'error': f'count phải là số nguyên từ 1 đến {MAX_BATCH_RACES}'
+        }), 400
+    
+    try:
+        session = g.session
+        job = mining_scheduler.submit(
+            count,
+            simulator=session.pow,
+            owner=session.id,
+            on_result=lambda result: _publish_race(result, session.events)
+        )
+    except QueueFullError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 503
+    return jsonify({
+        'success': True,
+        'data': job.to_dict()
+    }), 202
+
+@app.route('/api/pow/jobs', methods=['GET'])
+def pow_list_jobs():
+    """Các job đào gần nhất và trạng thái hàng đợi"""
+    return jsonify({
+        'success': True,
+        'data': {
+            'jobs': mining_scheduler.list_jobs(owner=g.session.id),
+            'queue': mining_scheduler.stats()
+        }
+    })
+
+@app.route('/api/pow/jobs/<job_id>', methods=['GET'])
+def pow_get_job(job_id):
+    """
+    Trạng thái và kết quả của một job đào
+    ?wait=10 chờ tối đa 10 giây (không quá MAX_JOB_WAIT) cho tới khi job xong
+    """
+    job = mining_scheduler.get(job_id)
+    if job is None or job.owner != g.session.id:
+        return jsonify({
+            'success': False,
+            'error': f'Không tìm thấy job {job_id}'
+        }), 404
+    
+    try:
+        wait = _numeric_options(request.args, {'wait': float}).get('wait', 0)
+        if not math.isfinite(wait):
+            raise ValueError('wait phải là số giây hữu hạn')
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    wait = min(max(wait, 0), MAX_JOB_WAIT)
+    if wait:
+        job.wait(wait)
+    return jsonify({
+        'success': True,
+        'data': job.to_dict()
+    })
+
+@app.route('/api/pow/mine-batch', methods=['POST'])
+def pow_mine_batch():
+    """
+    Đào liên tiếp nhiều block trong một request
+    Body: {"count": 100, "stream": false}
+    stream=true trả về NDJSON: mỗi dòng là kết quả một block, dòng cuối là thống kê
+    """
+    data = request.get_json(silent=True) or {}
+    count = data.get('count', 10)
+    stream = data.get('stream', False)
+    
+    if isinstance(count, bool) or not isinstance(count, int) or not 1 <= count <= MAX_BATCH_RACES:
+        return jsonify({
+            'success': False,
+            'error': f'count phải là số nguyên từ 1 đến {MAX_BATCH_RACES}'
+        }), 400
+    
+    if stream:
+        # simulate_many chạy trên thread riêng, từng kết quả được chuyển qua hàng đợi cho generator
+        # Thread giữ thêm một lượt dùng phiên (teardown đã nhả phiên của request) để registry không ghi
+        # phiên ra đĩa khi còn đang đào, và nhả khi đào xong; response đóng (client ngắt) thì dừng loạt đào
+        session = sessions.acquire(g.session.id)
+        bus = session.events
+        lines = queue.Queue()
+        cancelled = threading.Event()
+        
+        def on_block(result):
+            _publish_race(result, bus)
+            lines.put({'type': 'block', 'data': result})
+        
+        def mine():
+            try:
+                summary = session.pow.simulate_many(count, on_block=on_block, stop_event=cancelled)
+                lines.put({'type': 'summary', 'data': summary})
+            except Exception as e:
+                lines.put({'type': 'error', 'error': str(e)})
+            finally:
+                sessions.release(session)
+        
+        def generate():
+            while True:
+                line = lines.get()
+                yield json.dumps(line) + '\n'
+                if line['type'] != 'block':
+                    return
+        
+        threading.Thread(target=mine, name='mine-batch-stream', daemon=True).start()
+        response = Response(generate(), mimetype='application/x-ndjson')
+        response.call_on_close(cancelled.set)
+        return response
+    
+    try:
+        result = pow_sim.simulate_many(count, on_block=_publish_race)
         return jsonify({
             'success': True,
             'data': result
@@ -48,28 +441,51 @@ def pow_mine():
 
 @app.route('/api/pow/blockchain', methods=['GET'])
 def pow_blockchain():
-    """Lấy blockchain PoW hiện tại"""
+    """
+    Lấy blockchain PoW hiện tại
+    Hỗ trợ phân trang: ?start=0&limit=100, ?since=<hash>, ?tip=1
+    """
+    page_args = _page_args()
+    
+    try:
+        with pow_sim.lock.read():
+            data_json, pagination = pow_sim.get_blockchain_json(paged=page_args is not None, **(page_args or {}))
+    except KeyError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 404
+    return _spliced_json_response(data_json, pagination)
+
+@app.route('/api/pow/validate', methods=['GET'])
+def pow_validate_chain():
+    """Kiểm tra lại toàn bộ blockchain PoW (hash, proof-of-work, liên kết)"""
+    with pow_sim.lock.read():
+        result = pow_sim.validate_chain()
     return jsonify({
         'success': True,
-        'data': pow_sim.get_blockchain()
+        'data': result
     })
 
 @app.route('/api/pow/miners', methods=['GET'])
 def pow_miners():
     """Lấy thống kê cho tất cả các miner"""
+    with pow_sim.lock.read():
+        stats = pow_sim.get_miners_stats()
     return jsonify({
         'success': True,
-        'data': pow_sim.get_miners_stats()
+        'data': stats
     })
 
 @app.route('/api/pow/add-miner', methods=['POST'])
 def pow_add_miner():
     """Thêm một miner mới"""
     data = request.json
-    name = data.get('name', f'Miner {len(pow_sim.miners) + 1}')
     hash_power = data.get('hash_power', 100)
     
-    miner = pow_sim.add_miner(name, hash_power)
+    with pow_sim.lock.write():
+        name = data.get('name', f'Miner {len(pow_sim.miners) + 1}')
+        miner = pow_sim.add_miner(name, hash_power)
     
     return jsonify({
         'success': True,
@@ -79,19 +495,76 @@ def pow_add_miner():
         }
     })
 
+@app.route('/api/pow/retarget', methods=['GET'])
+def pow_get_retarget():
+    """Thuật toán điều chỉnh độ khó đang dùng và target hiện tại"""
+    with pow_sim.lock.read():
+        data = {
+            **pow_sim.retargeter.to_dict(),
+            'target': hex(pow_sim.target),
+            'difficulty': pow_sim.difficulty,
+            'difficulty_value': round(pow_sim.difficulty_value, 3),
+            'available': list(RETARGET_ALGORITHMS)
+        }
+    return jsonify({
+        'success': True,
+        'data': data
+    })
+
+@app.route('/api/pow/retarget', methods=['POST'])
+def pow_set_retarget():
+    """Đổi thuật toán điều chỉnh độ khó: {"algorithm": "asert", ...tham số riêng của thuật toán}"""
+    data = dict(request.json or {})
+    name = data.pop('algorithm', None)
+    try:
+        if name not in RETARGET_PARAMS:
+            raise ValueError(f"Thuật toán retarget không hợp lệ: {name}")
+        unknown = sorted(set(data) - set(RETARGET_PARAMS[name]))
+        if unknown:
+            raise ValueError(f"Tham số không hợp lệ cho {name}: {', '.join(unknown)}")
+        params = {key: value for key, value in _numeric_options(data, RETARGET_PARAMS[name]).items()
+                  if value is not None}
+        with pow_sim.lock.write():
+            pow_sim.set_retarget(name, **params)
+            info = pow_sim.retargeter.to_dict()
+    except (TypeError, ValueError) as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    return jsonify({
+        'success': True,
+        'data': info
+    })
+
 @app.route('/api/pow/reset', methods=['POST'])
 def pow_reset():
-    """Reset simulator PoW"""
-    global pow_sim
-    pow_sim = PoWSimulator()
-    pow_sim.create_genesis_block()
-    pow_sim.add_miner("Miner Alpha", hash_power=100)
-    pow_sim.add_miner("Miner Beta", hash_power=150)
-    pow_sim.add_miner("Miner Gamma", hash_power=80)
+    """
+    Reset simulator PoW (tại chỗ; cuộc đua đang chạy sẽ bị bỏ khi chain đã đổi)
+    Body tuỳ chọn {"seed": 42} để chạy lại đúng dãy ngẫu nhiên của một lần chạy trước
+    """
+    try:
+        seed = _request_seed()
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    with pow_sim.lock.write():
+        pow_sim.clear(seed)
+        pow_sim.create_genesis_block()
+        pow_sim.add_miner("Miner Alpha", hash_power=100)
+        pow_sim.add_miner("Miner Beta", hash_power=150)
+        pow_sim.add_miner("Miner Gamma", hash_power=80)
+        seed = pow_sim.seed
+    events.publish('reset', {'simulator': 'pow', 'seed': seed})
     
     return jsonify({
         'success': True,
-        'message': 'PoW simulator đã được reset'
+        'message': 'PoW simulator đã được reset',
+        'data': {'seed': seed}
     })
 
 # ==================== PoS Endpoints ====================
@@ -100,7 +573,9 @@ def pow_reset():
 def pos_validate():
     """Mô phỏng một lần validation"""
     try:
-        result = pos_sim.simulate_validation()
+        with pos_sim.lock.write():
+            result = pos_sim.simulate_validation()
+        events.publish('validator_selected', result)
         return jsonify({
             'success': True,
             'data': result
@@ -114,11 +589,93 @@ def pos_validate():
 @app.route('/api/pos/validate-multiple', methods=['POST'])
 def pos_validate_multiple():
     """Mô phỏng nhiều lần validation để test weighted selection"""
-    data = request.json
-    count = data.get('count', 100)
+    data = request.get_json(silent=True) or {}
+    vectorized = data.get('vectorized', True)
+    try:
+        count = _numeric_options(data, {'count': int}).get('count')
+        if count is None:
+            count = 100
+        if not 1 <= count <= MAX_VALIDATION_ROUNDS:
+            raise ValueError(f'count phải là số nguyên từ 1 đến {MAX_VALIDATION_ROUNDS}')
+        if not isinstance(vectorized, bool):
+            raise ValueError('vectorized phải là true hoặc false')
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    try:
+        with pos_sim.lock.write():
+            result = pos_sim.simulate_multiple_validations(count, vectorized=vectorized)
+        events.publish('validations', {
+            'total_validations': result['total_validations'],
+            'statistics': result['statistics']
+        })
+        return jsonify({
+            'success': True,
+            'data': result
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/pos/epochs', methods=['POST'])
+def pos_epochs():
+    """
+    Mô phỏng PoS theo epoch (slot, committee, thưởng cộng dồn vào stake, slashing, slot bị bỏ lỡ)
+    Body: {"epochs": 100, "slots_per_epoch": 32, "committee_size": 128, "uptime": 0.99, "seed": 1, ...}
+    Có "num_validators" thì chạy trên mạng giả lập, không thì chạy trên các validator hiện tại
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        options = _numeric_options(data, {
+            'epochs': int, 'num_validators': int, 'mean_stake': float, 'slots_per_epoch': int,
+            'committee_size': int, 'proposer_reward': float, 'attester_reward': float, 'missed_penalty': float,
+            'uptime': float, 'slashing_rate': float, 'slash_fraction': float, 'min_stake': float, 'top': int,
+            'seed': int
+        })
+        epochs = options.pop('epochs', None)
+        if epochs is None:
+            epochs = 100
+        # null = mặc định (riêng committee_size = null là chia toàn bộ validator cho các slot, seed = null là seed mới)
+        options = {
+            key: value for key, value in options.items()
+            if value is not None or key in ('committee_size', 'seed')
+        }
+        slots = epochs * options.get('slots_per_epoch', 32)
+        if epochs <= 0 or not 0 < slots <= MAX_EPOCH_SLOTS:
+            raise ValueError(f'epochs * slots_per_epoch phải là số nguyên từ 1 đến {MAX_EPOCH_SLOTS}')
+        num_validators = options.get('num_validators')
+        if num_validators is not None and not 0 < num_validators <= MAX_EPOCH_VALIDATORS:
+            raise ValueError(f'num_validators phải từ 1 đến {MAX_EPOCH_VALIDATORS}')
+        if options.get('seed') is not None and options['seed'] < 0:
+            raise ValueError("seed phải là số nguyên không âm")
+        if options.get('top') is not None and options['top'] < 0:
+            raise ValueError("top phải là số nguyên không âm")
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
     
     try:
-        result = pos_sim.simulate_multiple_validations(count)
+        if num_validators is None:
+            with pos_sim.lock.write():
+                result = pos_sim.simulate_epochs(epochs, **options)
+        else:
+            # Mạng giả lập không đụng tới validator của phiên: chỉ giữ khoá khi lấy seed
+            if options.get('seed') is None:
+                with pos_sim.lock.write():
+                    options['seed'] = pos_sim.next_epoch_seed()
+            result = pos_sim.simulate_epochs(epochs, **options)
+        events.publish('epochs', {
+            key: result[key]
+            for key in ('validators', 'epochs', 'slots', 'blocks_proposed', 'missed_slots', 'slashed',
+                        'stake_growth_percentage', 'seed')
+        })
         return jsonify({
             'success': True,
             'data': result
@@ -132,37 +689,52 @@ def pos_validate_multiple():
 @app.route('/api/pos/validators', methods=['GET'])
 def pos_validators():
     """Lấy thống kê cho tất cả các validator"""
+    with pos_sim.lock.read():
+        stats = pos_sim.get_validators_stats()
     return jsonify({
         'success': True,
-        'data': pos_sim.get_validators_stats()
+        'data': stats
     })
 
 @app.route('/api/pos/add-validator', methods=['POST'])
 def pos_add_validator():
     """Thêm một validator mới"""
     data = request.json
-    name = data.get('name', f'Validator {len(pos_sim.validators) + 1}')
     stake = data.get('stake', 10)
     
-    validator = pos_sim.add_validator(name, stake)
+    with pos_sim.lock.write():
+        name = data.get('name', f'Validator {len(pos_sim.validators) + 1}')
+        validator = pos_sim.add_validator(name, stake)
+        validator_data = validator.to_dict()
     
     return jsonify({
         'success': True,
-        'data': validator.to_dict()
+        'data': validator_data
     })
 
 @app.route('/api/pos/reset', methods=['POST'])
 def pos_reset():
-    """Reset simulator PoS"""
-    global pos_sim
-    pos_sim = PoSSimulator()
-    pos_sim.add_validator("Validator A", stake=10)
-    pos_sim.add_validator("Validator B", stake=50)
-    pos_sim.add_validator("Validator C", stake=40)
+    """Reset simulator PoS (tại chỗ), body tuỳ chọn {"seed": 42}"""
+    try:
+        seed = _request_seed()
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    with pos_sim.lock.write():
+        pos_sim.clear(seed)
+        pos_sim.add_validator("Validator A", stake=10)
+        pos_sim.add_validator("Validator B", stake=50)
+        pos_sim.add_validator("Validator C", stake=40)
+        seed = pos_sim.seed
+    events.publish('reset', {'simulator': 'pos', 'seed': seed})
     
     return jsonify({
         'success': True,
-        'message': 'PoS simulator đã được reset'
+        'message': 'PoS simulator đã được reset',
+        'data': {'seed': seed}
     })
 
 # ==================== Fork Resolution Endpoints ====================
@@ -171,7 +743,10 @@ def pos_reset():
 def fork_create():
     """Tạo một tình huống fork"""
     try:
-        result = fork_sim.simulate_fork_scenario()
+        with fork_sim.lock.write():
+            result = fork_sim.simulate_fork_scenario()
+        # Sự kiện fork chỉ chứa điểm rẽ nhánh và đoạn block mới của mỗi nhánh
+        events.publish('fork_created', result)
         return jsonify({
             'success': True,
             'data': result
@@ -186,7 +761,55 @@ def fork_create():
 def fork_resolve():
     """Giải quyết fork sử dụng longest chain rule"""
     try:
-        result = fork_sim.apply_longest_chain_rule()
+        with fork_sim.lock.write():
+            result = fork_sim.apply_longest_chain_rule()
+        events.publish('fork_resolved', result)
+        return jsonify({
+            'success': True,
+            'data': result
+        })
+    except Exception as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 500
+
+@app.route('/api/fork/network-sim', methods=['POST'])
+def fork_network_sim():
+    """
+    Mô phỏng mạng nhiều node bằng sự kiện rời rạc
+    Body: {"num_nodes": 50, "duration": 3600, "block_interval": 10, "seed": 1, ...}
+    """
+    data = request.get_json(silent=True) or {}
+    try:
+        options = _numeric_options(data, {
+            'num_nodes': int, 'peers_per_node': int, 'block_interval': float, 'latency_min': float,
+            'latency_max': float, 'latency_jitter': float, 'seed': int, 'duration': float
+        })
+        options = {key: value for key, value in options.items() if value is not None}
+        duration = options.pop('duration', 3600)
+        if not 2 <= options.get('num_nodes', 50) <= MAX_NETWORK_NODES:
+            raise ValueError(f'num_nodes phải từ 2 đến {MAX_NETWORK_NODES}')
+        if duration <= 0:
+            raise ValueError('duration phải lớn hơn 0')
+        if options.get('block_interval', 10.0) <= 0:
+            raise ValueError('block_interval phải lớn hơn 0')
+        if not 0 <= options.get('latency_min', 0.05) <= options.get('latency_max', 0.5):
+            raise ValueError('Cần 0 <= latency_min <= latency_max')
+        if options.get('latency_jitter', 0) < 0 or options.get('peers_per_node', 0) < 0:
+            raise ValueError('latency_jitter và peers_per_node không được âm')
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    try:
+        # Mạng giả lập không đụng tới chain của fork_sim: chỉ giữ khoá khi lấy seed từ stream của phiên
+        if options.get('seed') is None:
+            with fork_sim.lock.write():
+                options['seed'] = fork_sim.next_network_seed()
+        result = fork_sim.simulate_network(duration, max_events=MAX_NETWORK_EVENTS, **options)
         return jsonify({
             'success': True,
             'data': result
@@ -199,32 +822,133 @@ def fork_resolve():
 
 @app.route('/api/fork/chains', methods=['GET'])
 def fork_chains():
-    """Lấy tất cả các chain hiện tại"""
+    """
+    Lấy tất cả các chain hiện tại
+    Hỗ trợ phân trang cho block của từng chain: ?start=0&limit=100, ?since=<hash>, ?tip=1
+    """
+    page_args = _page_args()
+    if page_args is None:
+        with fork_sim.lock.read():
+            data_json = fork_sim.get_all_chains_json()
+        return _spliced_json_response(data_json)
+    
+    try:
+        with fork_sim.lock.read():
+            data_json = fork_sim.get_chains_page_json(**page_args)
+    except KeyError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 404
+    return _spliced_json_response(data_json)
+
+@app.route('/api/fork/validate', methods=['GET'])
+def fork_validate_chains():
+    """Kiểm tra hash và liên kết của tất cả các chain hiện tại"""
+    with fork_sim.lock.read():
+        result = fork_sim.validate_chains()
     return jsonify({
         'success': True,
-        'data': fork_sim.get_all_chains()
+        'data': result
     })
 
 @app.route('/api/fork/history', methods=['GET'])
 def fork_history():
     """Lấy lịch sử fork"""
+    with fork_sim.lock.read():
+        history = list(fork_sim.get_fork_history())
     return jsonify({
         'success': True,
-        'data': fork_sim.get_fork_history()
+        'data': history
     })
 
 @app.route('/api/fork/reset', methods=['POST'])
 def fork_reset():
-    """Reset simulator fork"""
-    global fork_sim
-    fork_sim = ForkResolutionSimulator()
-    fork_sim.create_initial_chain()
+    """Reset simulator fork (tại chỗ), body tuỳ chọn {"seed": 42}"""
+    try:
+        seed = _request_seed()
+    except ValueError as e:
+        return jsonify({
+            'success': False,
+            'error': str(e)
+        }), 400
+    
+    with fork_sim.lock.write():
+        fork_sim.reset(seed)
+        seed = fork_sim.seed
+    events.publish('reset', {'simulator': 'fork', 'seed': seed})
     
     return jsonify({
         'success': True,
-        'message': 'Fork simulator đã được reset'
+        'message': 'Fork simulator đã được reset',
+        'data': {'seed': seed}
+    })
+
+# ==================== Session Endpoints ====================
+
+@app.route('/api/session', methods=['GET'])
+def session_info():
+    """Thông tin phiên hiện tại và thống kê các phiên trên server"""
+    return jsonify({
+        'success': True,
+        'data': {
+            'session': g.session.to_dict(),
+            # Seed hiện tại của từng simulator (reset với seed này để chạy lại)
+            'seeds': {name: simulator.seed for name, simulator in g.session.simulators.items()},
+            'registry': sessions.stats()
+        }
+    })
+
+# ==================== Metrics ====================
+
+@app.route('/api/metrics', methods=['GET'])
+def prometheus_metrics():
+    """Các metric (hash/giây theo miner, thời gian đua, validation, request...) theo định dạng Prometheus"""
+    return Response(METRICS.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
+@app.route('/api/metrics/profiles', methods=['GET'])
+def list_profiles():
+    """Id các kết quả profile gần nhất (mới nhất trước)"""
+    return jsonify({
+        'success': True,
+        'data': {
+            'enabled': PROFILING_ENABLED,
+            'profiles': request_profiler.list_ids()
+        }
     })
 
+@app.route('/api/metrics/profiles/<profile_id>', methods=['GET'])
+def get_profile(profile_id):
+    """Bảng thống kê cProfile (text, sắp theo thời gian tích luỹ) của một request đã profile"""
+    stats = request_profiler.get(profile_id)
+    if stats is None:
+        return jsonify({
+            'success': False,
+            'error': 'Không tìm thấy kết quả profile'
+        }), 404
+    return Response(stats, content_type='text/plain; charset=utf-8')
+
+# ==================== Event Stream ====================
+
+@app.route('/api/events', methods=['GET'])
+def event_stream():
+    """
+    Server-Sent Events: đẩy các thay đổi (block, difficulty, validator_selected, validations,
+    fork_created, fork_resolved, reset) thay vì client phải tải lại toàn bộ dữ liệu
+    Header Last-Event-ID (hoặc ?last_event_id=) để nhận bù các event bị lỡ khi kết nối lại
+    """
+    last_event_id = request.headers.get('Last-Event-ID') or request.args.get('last_event_id')
+    try:
+        last_event_id = int(last_event_id) if last_event_id else None
+    except ValueError:
+        last_event_id = None
+    
+    return Response(
+        events.stream(last_event_id),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
 if __name__ == '__main__':
     print("🚀 Đang khởi động Blockchain Consensus Simulator...")
     print("📡 Server đang chạy tại: http://localhost:5000")
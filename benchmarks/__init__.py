@@ -0,0 +1 @@
+"""Các micro-benchmark cho simulator (chạy bằng: python -m benchmarks.<tên_module>)"""
@@ -0,0 +1,51 @@
+"""
+Micro-benchmark: so sánh tốc độ thử nonce giữa
+- calculate_hash(): dựng lại toàn bộ chuỗi header mỗi lần thử
+- midstate: header cố định được hash sẵn, mỗi lần thử chỉ copy() + nạp nonce
+
+Chạy: python -m benchmarks.bench_hashing [số_lần_thử]
+"""
+import sys
+import time
+from pow_simulator import Block
+
+
+def bench_calculate_hash(block: Block, attempts: int) -> float:
+    """Số lần thử/giây khi gọi calculate_hash() cho mỗi nonce"""
+    start = time.perf_counter()
+    for nonce in range(attempts):
+        block.nonce = nonce
+        block.calculate_hash()
+    return attempts / (time.perf_counter() - start)
+
+
+def bench_midstate(block: Block, attempts: int) -> float:
+    """Số lần thử/giây khi dùng midstate đã nạp sẵn header"""
+    start = time.perf_counter()
+    midstate = block.midstate()
+    for nonce in range(attempts):
+        h = midstate.copy()
+        h.update(str(nonce).encode())
+        h.hexdigest()
+    return attempts / (time.perf_counter() - start)
+
+
+def main():
+    attempts = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    block = Block(1, time.time(), "Block 1 data", "0" * 64)
+    
+    # Đảm bảo hai cách tính cho kết quả giống hệt nhau
+    midstate = block.midstate()
+    for nonce in (0, 1, 12345, 9999999):
+        block.nonce = nonce
+        assert block.calculate_hash() == Block.hash_from_midstate(midstate, nonce)
+    
+    before = bench_calculate_hash(block, attempts)
+    after = bench_midstate(block, attempts)
+    print(f"calculate_hash: {before:,.0f} lần thử/giây")
+    print(f"midstate:       {after:,.0f} lần thử/giây")
+    print(f"Tăng tốc:       x{after / before:.2f}")
+
+
+if __name__ == '__main__':
+    main()
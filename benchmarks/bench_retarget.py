@@ -0,0 +1,120 @@
+"""
+Benchmark hội tụ của các thuật toán điều chỉnh độ khó (retarget.RETARGET_ALGORITHMS)
+- Chạy PoWSimulator với backend 'virtual' (thời gian ảo, có seed) cho từng thuật toán
+- Target ban đầu đặt sai (khó hơn mức cân bằng 64 lần), giữa chừng hash rate của mọi miner tăng 4 lần
+- Với mỗi pha đo: số block để trung bình trượt thời gian block vào khoảng ±10% target_time,
+  trung bình / hệ số biến thiên / p95 thời gian block ở trạng thái ổn định,
+  độ lệch target so với mức cân bằng và số block chậm quá TIMEOUT_FACTOR lần target_time
+
+Chạy: python -m benchmarks.bench_retarget [số_block_mỗi_pha] [số_lần_chạy]
+"""
+import math
+import statistics
+import sys
+from pow_simulator import PoWSimulator
+from retarget import RETARGET_ALGORITHMS
+from sim_random import ManualClock
+
+# Hash power của các miner (giống bộ miner mặc định của app)
+HASH_POWERS = (100, 150, 80)
+
+# Target ban đầu khó hơn mức cân bằng bao nhiêu lần
+INITIAL_OFFSET = 64
+
+# Hash rate của mọi miner được nhân lên bao nhiêu lần ở đầu pha thứ hai
+HASH_RATE_STEP = 4
+
+# Cửa sổ trung bình trượt và sai số cho phép khi xác định đã hội tụ
+CONVERGENCE_WINDOW = 50
+CONVERGENCE_TOLERANCE = 0.10
+
+# Block chậm hơn TIMEOUT_FACTOR * target_time được tính là "timeout" (30s với target_time 2s)
+TIMEOUT_FACTOR = 15
+
+
+def equilibrium_target(sim: PoWSimulator) -> int:
+    """Target mà với tổng hash rate hiện tại thì thời gian block kỳ vọng đúng bằng target_time"""
+    hash_rate = sum(m.hash_power for m in sim.miners) * sim.virtual_hashes_per_power
+    return int(2 ** 256 / (hash_rate * sim.target_time))
+
+
+def converged_after(times, target_time: float) -> int:
+    """Số block đến khi trung bình CONVERGENCE_WINDOW block gần nhất nằm trong ±tolerance (-1 nếu không)"""
+    window_sum = 0.0
+    for i, t in enumerate(times):
+        window_sum += t
+        if i >= CONVERGENCE_WINDOW:
+            window_sum -= times[i - CONVERGENCE_WINDOW]
+        n = min(i + 1, CONVERGENCE_WINDOW)
+        if n == CONVERGENCE_WINDOW and abs(window_sum / n - target_time) <= target_time * CONVERGENCE_TOLERANCE:
+            return i + 1
+    return -1
+
+
+def phase_metrics(times, targets, ideal: int, target_time: float) -> dict:
+    """Các chỉ số của một pha (nửa sau của pha được coi là trạng thái ổn định)"""
+    steady = times[len(times) // 2:]
+    steady_targets = targets[len(targets) // 2:]
+    mean = statistics.fmean(steady)
+    return {
+        'converge': converged_after(times, target_time),
+        'mean': mean,
+        'cv': statistics.pstdev(steady) / mean,
+        'p95': sorted(steady)[int(len(steady) * 0.95)],
+        # Độ lệch target so với mức cân bằng, tính theo log2 (1.0 = lệch 2 lần công việc)
+        'target_error': math.sqrt(statistics.fmean(math.log2(t / ideal) ** 2 for t in steady_targets)),
+        'timeouts': sum(1 for t in times if t > target_time * TIMEOUT_FACTOR)
+    }
+
+
+def run(algorithm: str, blocks: int, seed: int) -> list:
+    """Chạy hai pha cho một thuật toán, trả về chỉ số của từng pha"""
+    sim = PoWSimulator(mining_backend='virtual', retarget=algorithm, seed=seed, clock=ManualClock())
+    sim.create_genesis_block()
+    for i, hash_power in enumerate(HASH_POWERS):
+        sim.add_miner(f"Miner {i + 1}", hash_power)
+    sim.target = equilibrium_target(sim) // INITIAL_OFFSET
+    sim.virtual_time = 0.0
+
+    phases = []
+    for phase in range(2):
+        if phase == 1:
+            for miner in sim.miners:
+                miner.hash_power *= HASH_RATE_STEP
+        ideal = equilibrium_target(sim)
+        times, targets = [], []
+        for _ in range(blocks):
+            targets.append(sim.target)
+            start = sim.virtual_time
+            sim.simulate_mining_race()
+            # Thời gian ảo chính xác (không phụ thuộc đồng hồ thật)
+            times.append(sim.virtual_time - start)
+        phases.append(phase_metrics(times, targets, ideal, sim.target_time))
+    return phases
+
+
+def main():
+    blocks = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    runs = int(sys.argv[2]) if len(sys.argv) > 2 else 3
+
+    print(f"{blocks} block mỗi pha, {runs} lần chạy, target_time = 2s; "
+          f"pha 1: target ban đầu khó x{INITIAL_OFFSET}, pha 2: hash rate x{HASH_RATE_STEP}")
+    print(f"{'thuật toán':<10} {'pha':>3} {'hội tụ':>8} {'TB (s)':>7} {'CV':>6} "
+          f"{'p95 (s)':>8} {'lệch target':>11} {'timeout':>8}")
+    for algorithm in RETARGET_ALGORITHMS:
+        results = [run(algorithm, blocks, seed) for seed in range(runs)]
+        for phase in range(2):
+            metrics = [r[phase] for r in results]
+            converge = [m['converge'] for m in metrics]
+            converge_text = (f"{statistics.median(converge):.0f}" if all(c >= 0 for c in converge)
+                             else f"{sum(c < 0 for c in converge)}/{runs} ✗")
+            print(f"{algorithm:<10} {phase + 1:>3} {converge_text:>8} "
+                  f"{statistics.fmean(m['mean'] for m in metrics):>7.2f} "
+                  f"{statistics.fmean(m['cv'] for m in metrics):>6.2f} "
+                  f"{statistics.fmean(m['p95'] for m in metrics):>8.2f} "
+                  f"{statistics.fmean(m['target_error'] for m in metrics):>11.2f} "
+                  f"{sum(m['timeouts'] for m in metrics):>8}")
+
+
+if __name__ == '__main__':
+    main()
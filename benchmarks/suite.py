@@ -0,0 +1,401 @@
+"""
+Bộ benchmark cho các đường nóng của simulator, kết quả ghi ra JSON để so sánh giữa các phiên bản
+- hashing: tốc độ Block.calculate_hash() và midstate
+- pow.race: độ trễ simulate_mining_race theo số miner và độ khó (backend thread hash thật, backend virtual)
+- pos.validations: simulate_multiple_validations từ 10^3 tới 10^7 vòng (vòng lặp và vectorized)
+- pos_epoch: số slot/giây của chế độ epoch (EpochSimulator) theo số validator
+- fork: simulate_fork_scenario + apply_longest_chain_rule theo độ dài chain
+- api: độ trễ và kích thước response của các endpoint qua Flask test client
+
+Chạy:   python -m benchmarks.suite run [--quick] [--only pow,pos] [--output ket_qua.json]
+So sánh: python -m benchmarks.suite compare truoc.json sau.json [--threshold 10]
+(compare trả về exit code 1 nếu có chỉ số chậm đi quá ngưỡng của chỉ số đó, xem allowed_change)
+Chỉ số độ trễ của code tất định (fork, api) lấy min của N lần đo, cuộc đua đào (ngẫu nhiên) lấy trung vị;
+mỗi chỉ số độ trễ kèm noise (%, xem latency) dùng làm dải nhiễu khi so sánh
+"""
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+import time
+from typing import Callable, Dict, List, Optional
+from metrics import METRICS
+from pow_simulator import Block, PoWSimulator
+from pos_simulator import PoSSimulator
+from pos_epoch import EpochSimulator
+from fork_resolution import ForkResolutionSimulator
+from sim_random import ManualClock
+
+# Seed cố định để mọi lần chạy dùng cùng dữ liệu đầu vào
+SEED = 12345
+
+# Tham số cho chế độ đầy đủ và chế độ nhanh (--quick, dùng khi kiểm tra nhanh / CI)
+PROFILES = {
+    'full': {
+        'hash_attempts': 200000,
+        'race_miners': (1, 2, 4, 8),
+        'race_difficulties': (2, 3, 4),
+        'race_repeat': 30,
+        'virtual_miners': (10, 100, 1000),
+        'virtual_repeat': 2000,
+        'pos_loop_rounds': (10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6),
+        'pos_vectorized_rounds': (10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7),
+        'epoch_validators': (10 ** 3, 10 ** 4, 10 ** 5),
+        'epoch_slots': 320000,
+        'fork_lengths': (100, 1000, 10000, 100000),
+        'fork_repeat': 30,
+        'api_chain_length': 1000,
+        'api_repeat': 50
+    },
+    'quick': {
+        'hash_attempts': 20000,
+        'race_miners': (1, 4),
+        'race_difficulties': (2, 3),
+        'race_repeat': 5,
+        'virtual_miners': (10, 100),
+        'virtual_repeat': 200,
+        'pos_loop_rounds': (10 ** 3, 10 ** 4),
+        'pos_vectorized_rounds': (10 ** 3, 10 ** 5),
+        'epoch_validators': (10 ** 3, 10 ** 5),
+        'epoch_slots': 32000,
+        'fork_lengths': (100, 1000),
+        'fork_repeat': 5,
+        'api_chain_length': 100,
+        'api_repeat': 20
+    }
+}
+
+# Ngưỡng regression tối thiểu (%) theo nhóm: cuộc đua đào hash thật có thời gian ngẫu nhiên (phân phối mũ),
+# các lời gọi fork / api chỉ dưới 1ms nên dao động giữa các lần chạy lớn hơn nhóm đo thông lượng
+GROUP_THRESHOLDS = {
+    'pow': 30.0,
+    'fork': 20.0,
+    'api': 20.0
+}
+
+
+def result(value: float, unit: str, higher_is_better: bool, **extra) -> Dict:
+    """Một chỉ số benchmark"""
+    return {'value': value, 'unit': unit, 'higher_is_better': higher_is_better, **extra}
+
+
+def time_calls(fn: Callable[[], object], repeat: int) -> List[float]:
+    """Thời gian (giây) của từng lần gọi fn"""
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        timings.append(time.perf_counter() - start)
+    return timings
+
+
+def latency(timings: List[float], statistic: str = 'median', **extra) -> Dict:
+    """
+    Chỉ số độ trễ: value là trung vị (statistic='median') hoặc lần nhanh nhất (statistic='min'),
+    kèm min, trung vị, p95, số lần đo và noise (%): IQR / trung vị với 'median',
+    (q1 - min) / min với 'min' (độ trải của nhóm lần đo nhanh)
+    """
+    ordered = sorted(timings)
+    median = statistics.median(ordered)
+    noise = 0.0
+    if len(ordered) >= 4 and ordered[0] > 0:
+        q1, _, q3 = statistics.quantiles(ordered, n=4)
+        noise = (q1 - ordered[0]) / ordered[0] * 100 if statistic == 'min' else (q3 - q1) / median * 100
+    return result(ordered[0] if statistic == 'min' else median, 's', False,
+                  statistic=statistic, min=ordered[0], median=median,
+                  p95=ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))],
+                  samples=len(ordered), noise=noise, **extra)
+
+
+def fixed_target_simulator(backend: str, miners: int, difficulty: int) -> PoWSimulator:
+    """PoWSimulator có seed, độ khó cố định (epoch retarget với window rất lớn nên không bao giờ đổi)"""
+    sim = PoWSimulator(mining_backend=backend, seed=SEED, clock=ManualClock(tick=1.0))
+    sim.set_retarget('epoch', window=10 ** 12)
+    sim.difficulty = difficulty
+    sim.create_genesis_block()
+    for i in range(miners):
+        sim.add_miner(f"Miner {i + 1}", 100 + 10 * i)
+    return sim
+
+
+def bench_hashing(params: Dict) -> Dict:
+    attempts = params['hash_attempts']
+    block = Block(1, 1700000000.0, "Block 1 data", "0" * 64)
+
+    def calculate_hash():
+        for nonce in range(attempts):
+            block.nonce = nonce
+            block.calculate_hash()
+
+    def midstate():
+        state = block.midstate()
+        for nonce in range(attempts):
+            h = state.copy()
+            h.update(str(nonce).encode())
+            h.hexdigest()
+
+    return {
+        'hashing.calculate_hash': result(attempts / min(time_calls(calculate_hash, 5)), 'hash/s', True),
+        'hashing.midstate': result(attempts / min(time_calls(midstate, 5)), 'hash/s', True)
+    }
+
+
+def bench_pow(params: Dict) -> Dict:
+    results = {}
+    for difficulty in params['race_difficulties']:
+        for miners in params['race_miners']:
+            sim = fixed_target_simulator('thread', miners, difficulty)
+            timings = time_calls(sim.simulate_mining_race, params['race_repeat'])
+            results[f'pow.race.thread.difficulty={difficulty}.miners={miners}'] = latency(timings)
+    for miners in params['virtual_miners']:
+        sim = fixed_target_simulator('virtual', miners, 4)
+        timings = time_calls(sim.simulate_mining_race, params['virtual_repeat'])
+        results[f'pow.race.virtual.miners={miners}'] = latency(timings)
+    return results
+
+
+def bench_pos(params: Dict) -> Dict:
+    results = {}
+    for vectorized, rounds_list in ((False, params['pos_loop_rounds']), (True, params['pos_vectorized_rounds'])):
+        mode = 'vectorized' if vectorized else 'loop'
+        for rounds in rounds_list:
+            # Lấy lần nhanh nhất trong vài lần chạy (lần chạy nhỏ dễ bị nhiễu)
+            elapsed = float('inf')
+            for _ in range(max(1, min(5, 10 ** 6 // rounds))):
+                sim = PoSSimulator(seed=SEED)
+                for i, stake in enumerate((10, 50, 40, 25, 75)):
+                    sim.add_validator(f"Validator {i + 1}", stake)
+                start = time.perf_counter()
+                sim.simulate_multiple_validations(rounds, vectorized=vectorized)
+                elapsed = min(elapsed, time.perf_counter() - start)
+            results[f'pos.validations.{mode}.rounds={rounds}'] = result(rounds / elapsed, 'rounds/s', True,
+                                                                        elapsed=elapsed)
+    return results
+
+
+def bench_pos_epoch(params: Dict) -> Dict:
+    results = {}
+    for validators in params['epoch_validators']:
+        sim = EpochSimulator.with_random_stakes(validators, seed=SEED, uptime=0.99, slashing_rate=1e-6)
+        summary = sim.run(params['epoch_slots'] // sim.slots_per_epoch)
+        results[f'pos_epoch.slots.validators={validators}'] = result(
+            summary['slots'] / summary['elapsed'], 'slots/s', True, elapsed=summary['elapsed']
+        )
+    return results
+
+
+def bench_fork(params: Dict) -> Dict:
+    results = {}
+    for length in params['fork_lengths']:
+        sim = ForkResolutionSimulator(seed=SEED, clock=ManualClock(tick=1.0))
+        chain = sim.create_initial_chain()
+        for i in range(1, length):
+            last = chain.get_last_block()
+            chain.add_block(Block(i, float(i), f"Block {i} data", last.hash, target=last.target))
+        fork_timings, resolve_timings = [], []
+        for _ in range(params['fork_repeat']):
+            fork_timings.extend(time_calls(sim.simulate_fork_scenario, 1))
+            resolve_timings.extend(time_calls(sim.apply_longest_chain_rule, 1))
+        results[f'fork.simulate_fork_scenario.length={length}'] = latency(fork_timings, 'min')
+        results[f'fork.apply_longest_chain_rule.length={length}'] = latency(resolve_timings, 'min')
+    return results
+
+
+def bench_api(params: Dict) -> Dict:
+    """Đo với metrics tắt để kết quả không phụ thuộc METRICS_ENABLED (trạng thái gốc ghi trong meta)"""
+    metrics_enabled = METRICS.enabled
+    METRICS.enabled = False
+    try:
+        return _bench_api(params)
+    finally:
+        METRICS.enabled = metrics_enabled
+
+
+def _bench_api(params: Dict) -> Dict:
+    # Import tại chỗ: tạo app sẽ khởi tạo registry phiên
+    from app import app, sessions
+    session_id = 'benchmark'
+    headers = {'X-Session-Id': session_id}
+
+    # Dữ liệu dựng sẵn trong phiên riêng: chain PoW đào bằng backend virtual (nhanh, có seed)
+    session = sessions.acquire(session_id)
+    try:
+        pow_sim = session.pow
+        pow_sim.clear(SEED)
+        pow_sim.mining_backend = 'virtual'
+        pow_sim.create_genesis_block()
+        pow_sim.add_miner("Miner Alpha", hash_power=100)
+        pow_sim.add_miner("Miner Beta", hash_power=150)
+        pow_sim.simulate_many(params['api_chain_length'] - 1)
+    finally:
+        sessions.release(session)
+
+    client = app.test_client()
+    endpoints = [
+        ('GET', '/api/pow/blockchain', None),
+        ('GET', '/api/pow/blockchain?tip=1', None),
+        ('GET', '/api/pow/blockchain?start=0&limit=100', None),
+        ('GET', '/api/pow/miners', None),
+        ('POST', '/api/pos/validate', None),
+        ('POST', '/api/pos/validate-multiple', {'count': 100}),
+        ('GET', '/api/pos/validators', None),
+        ('POST', '/api/fork/create', None),
+        ('GET', '/api/fork/chains', None),
+        ('POST', '/api/fork/resolve', None),
+        ('GET', '/api/session', None)
+    ]
+    results = {}
+    for method, path, body in endpoints:
+        sizes = []
+
+        def call():
+            response = client.open(path, method=method, json=body, headers=headers)
+            if response.status_code >= 500:
+                raise RuntimeError(f"{method} {path}: HTTP {response.status_code}")
+            sizes.append(len(response.get_data()))
+
+        timings = time_calls(call, params['api_repeat'])
+        results[f'api.{method} {path}'] = latency(timings, 'min', payload_bytes=max(sizes))
+    return results
+
+
+# Các nhóm benchmark theo tên (dùng với --only)
+BENCHMARKS = {
+    'hashing': bench_hashing,
+    'pow': bench_pow,
+    'pos': bench_pos,
+    'pos_epoch': bench_pos_epoch,
+    'fork': bench_fork,
+    'api': bench_api
+}
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(['git', 'rev-parse', 'HEAD'], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(profile: str, only: Optional[List[str]]) -> Dict:
+    """Chạy các nhóm benchmark, trả về dict kết quả (meta + results)"""
+    params = PROFILES[profile]
+    report = {
+        'meta': {
+            'timestamp': time.time(),
+            'commit': git_commit(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'profile': profile,
+            'seed': SEED,
+            'metrics_enabled': METRICS.enabled,
+            'api_metrics_enabled': False
+        },
+        'results': {}
+    }
+    for name, bench in BENCHMARKS.items():
+        if only and name not in only:
+            continue
+        start = time.perf_counter()
+        group = bench(params)
+        report['results'].update(group)
+        print(f"{name}: {len(group)} chỉ số ({time.perf_counter() - start:.1f}s)", file=sys.stderr)
+    return report
+
+
+def allowed_change(name: str, old: Dict, new: Dict, threshold: float) -> float:
+    """
+    Mức tệ đi tối đa (%) của một chỉ số: lớn nhất trong threshold, ngưỡng của nhóm
+    và dải nhiễu (tổng noise đo được ở hai lần chạy)
+    """
+    group = name.split('.', 1)[0]
+    noise_band = old.get('noise', 0.0) + new.get('noise', 0.0)
+    return max(threshold, GROUP_THRESHOLDS.get(group, 0.0), noise_band)
+
+
+def compare(baseline: Dict, current: Dict, threshold: float) -> List[Dict]:
+    """
+    So sánh hai kết quả theo từng chỉ số có mặt ở cả hai
+    change: % thay đổi của giá trị; regression khi tệ đi quá allowed (theo chiều higher_is_better)
+    """
+    rows = []
+    for name, new in current['results'].items():
+        old = baseline['results'].get(name)
+        if old is None or not old['value']:
+            continue
+        change = (new['value'] - old['value']) / old['value'] * 100
+        worse = -change if new['higher_is_better'] else change
+        allowed = allowed_change(name, old, new, threshold)
+        rows.append({
+            'name': name,
+            'unit': new['unit'],
+            'baseline': old['value'],
+            'current': new['value'],
+            'change': change,
+            'allowed': allowed,
+            'regression': worse > allowed
+        })
+    return rows
+
+
+def print_results(report: Dict):
+    for name, metric in report['results'].items():
+        print(f"{name:<60} {metric['value']:>14.6g} {metric['unit']}")
+
+
+def print_comparison(rows: List[Dict], threshold: float):
+    for row in rows:
+        flag = '  ❌ chậm hơn' if row['regression'] else ''
+        print(f"{row['name']:<60} {row['baseline']:>12.6g} -> {row['current']:>12.6g} "
+              f"{row['unit']:<9} {row['change']:+7.1f}% (±{row['allowed']:.0f}%){flag}")
+    regressions = sum(row['regression'] for row in rows)
+    print(f"{len(rows)} chỉ số, {regressions} chỉ số tệ đi quá ngưỡng (tối thiểu {threshold:g}%)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark simulator")
+    commands = parser.add_subparsers(dest='command', required=True)
+    run_parser = commands.add_parser('run', help="Chạy benchmark")
+    run_parser.add_argument('--quick', action='store_true', help="Tham số nhỏ, chạy nhanh")
+    run_parser.add_argument('--only', help="Chỉ chạy các nhóm này, cách nhau bởi dấu phẩy: " + ','.join(BENCHMARKS))
+    run_parser.add_argument('--output', help="Ghi kết quả JSON ra file này")
+    run_parser.add_argument('--baseline', help="So sánh ngay với file kết quả cũ")
+    run_parser.add_argument('--threshold', type=float, default=10.0)
+    compare_parser = commands.add_parser('compare', help="So sánh hai file kết quả")
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=10.0,
+                                help="Phần trăm tệ đi tối thiểu trước khi tính là regression "
+                                     "(nới rộng theo GROUP_THRESHOLDS và noise của chỉ số)")
+    args = parser.parse_args()
+
+    if args.command == 'run':
+        only = args.only.split(',') if args.only else None
+        unknown = set(only or ()) - set(BENCHMARKS)
+        if unknown:
+            parser.error(f"Nhóm benchmark không tồn tại: {', '.join(sorted(unknown))}")
+        current = run('quick' if args.quick else 'full', only)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(current, f, indent=2)
+        print_results(current)
+        baseline_path = args.baseline
+    else:
+        with open(args.current) as f:
+            current = json.load(f)
+        baseline_path = args.baseline
+
+    if baseline_path:
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        rows = compare(baseline, current, args.threshold)
+        print_comparison(rows, args.threshold)
+        if any(row['regression'] for row in rows):
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,146 @@
+from typing import Dict, Iterator, List, Optional
+from pow_simulator import Block
+
+
+class BlockTree:
+    """
+    Cây block: mỗi block được lưu một lần theo hash, trỏ về block cha qua previous_hash
+    Các nhánh fork dùng chung phần tổ tiên thay vì mỗi nhánh giữ một bản copy của cả chain
+    Khi mở lại từ storage (xem ForkChoice.from_storage), các block đã lưu không được nạp vào bộ nhớ:
+    block được decode từ storage khi cần, vị trí của block được tra bằng chỉ mục hash của storage
+    (SegmentLogStore.find) hoặc dò thẳng trên index của storage quanh vị trí đã biết
+    """
+    def __init__(self, storage=None):
+        self.blocks: Dict[str, Block] = {}  # Block thêm vào trong lần chạy này
+        self.heights: Dict[str, int] = {}  # hash -> độ cao (genesis = 0)
+        # storage (tuỳ chọn): nơi ghi nối mọi block mới, vd. chain_storage.SegmentLogStore
+        self.storage = storage
+        self._stored_count = 0  # Số block đầu tiên của storage không nạp vào self.blocks
+        self._known_positions: Dict[str, int] = {}  # Vị trí trong storage đã biết trước (vd. của các tip)
+    
+    def __len__(self) -> int:
+        return len(self.blocks) + self._stored_count
+    
+    def __contains__(self, block_hash: str) -> bool:
+        return block_hash in self.blocks or self._stored_position(block_hash) is not None
+    
+    def _stored_position(self, block_hash: str, lowest: int = 0, below: Optional[int] = None) -> Optional[int]:
+        """
+        Vị trí trong storage của block chưa nạp vào bộ nhớ (None nếu không có)
+        Dò ngược digest trên index của storage từ below (mặc định: cuối phần đã lưu) xuống lowest
+        Block ở độ cao h nằm ở vị trí >= h (tổ tiên của nó được ghi trước), bằng h nếu chain không có fork,
+        nên biết độ cao thì chỉ phải dò từ h trở lên
+        Không có gợi ý vị trí thì tra chỉ mục hash của storage (nếu có) thay vì dò cả index
+        """
+        if not self._stored_count:
+            return None
+        position = self._known_positions.get(block_hash)
+        if position is not None:
+            return position
+        try:
+            digest = bytes.fromhex(block_hash)
+        except ValueError:
+            return None
+        if lowest <= 0 and below is None and hasattr(self.storage, 'find'):
+            position = self.storage.find(digest)
+            return position if position is not None and position < self._stored_count else None
+        below = self._stored_count if below is None else min(below, self._stored_count)
+        for position in range(below - 1, max(lowest, 0) - 1, -1):
+            if self.storage.digest(position) == digest:
+                return position
+        return None
+    
+    def _is_new(self, block: Block) -> bool:
+        return block.hash not in self.blocks and self._stored_position(block.hash, block.index) is None
+    
+    def add_block(self, block: Block):
+        """Thêm block; block cha phải có sẵn trong cây (trừ genesis)"""
+        if not self._is_new(block):
+            return
+        position = len(self.storage) if self.storage is not None else None
+        self._insert(block, position)
+        if self.storage is not None:
+            self.storage.append(block)
+    
+    def _insert(self, block: Block, position: Optional[int] = None):
+        """Đưa block vào cây (không ghi storage); position: vị trí của block trong storage nếu có"""
+        parent_height = self._height(block.previous_hash)
+        if parent_height is None and len(self):
+            raise ValueError(f"Không tìm thấy block cha {block.previous_hash[:16]}...")
+        self.blocks[block.hash] = block
+        self.heights[block.hash] = 0 if parent_height is None else parent_height + 1
+    
+    def get(self, block_hash: str) -> Optional[Block]:
+        """Lấy block theo hash"""
+        block = self.blocks.get(block_hash)
+        if block is None:
+            position = self._stored_position(block_hash)
+            if position is not None:
+                block = self.storage[position]
+        return block
+    
+    def _height(self, block_hash: str) -> Optional[int]:
+        height = self.heights.get(block_hash)
+        if height is None:
+            block = self.get(block_hash)
+            # Block đã lưu: độ cao chính là index của block (genesis = 0)
+            height = block.index if block is not None else None
+        return height
+    
+    def height(self, block_hash: str) -> int:
+        """Độ cao của block (số block phía trước nó)"""
+        height = self._height(block_hash)
+        if height is None:
+            raise KeyError(block_hash)
+        return height
+    
+    def parent(self, block_hash: str) -> Optional[Block]:
+        """Lấy block cha (None với genesis)"""
+        return self.get(self.get(block_hash).previous_hash)
+    
+    def iter_ancestors(self, block_hash: str) -> Iterator[Block]:
+        """Duyệt ngược từ block_hash về genesis (bao gồm chính nó)"""
+        block = self.blocks.get(block_hash)
+        position = None if block is not None else self._stored_position(block_hash)
+        while block is not None or position is not None:
+            if block is None:
+                block = self.storage[position]
+            yield block
+            parent = self.blocks.get(block.previous_hash)
+            # Block cha đã lưu nằm trước block con trong storage (thường ngay vị trí liền trước)
+            position = None if parent is not None else self._stored_position(
+                block.previous_hash, block.index - 1, position
+            )
+            block = parent
+    
+    def path_to(self, tip_hash: str) -> List[Block]:
+        """Danh sách block từ genesis đến tip"""
+        path = list(self.iter_ancestors(tip_hash))
+        path.reverse()
+        return path
+    
+    def common_ancestor(self, hash_a: str, hash_b: str) -> Optional[str]:
+        """Tổ tiên chung gần nhất của hai block, chỉ đi ngược đúng đoạn rẽ nhánh"""
+        height_a, height_b = self.height(hash_a), self.height(hash_b)
+        while height_a > height_b:
+            hash_a = self.get(hash_a).previous_hash
+            height_a -= 1
+        while height_b > height_a:
+            hash_b = self.get(hash_b).previous_hash
+            height_b -= 1
+        while hash_a != hash_b:
+            hash_a = self.get(hash_a).previous_hash
+            hash_b = self.get(hash_b).previous_hash
+            if hash_a not in self or hash_b not in self:
+                return None
+        return hash_a
+    
+    def segment(self, tip_hash: str, ancestor_hash: str) -> List[Block]:
+        """Các block sau ancestor_hash cho tới tip (đoạn rẽ nhánh), theo thứ tự tăng dần"""
+        segment = []
+        for block in self.iter_ancestors(tip_hash):
+            if block.hash == ancestor_hash:
+                break
+            segment.append(block)
+        segment.reverse()
+        return segment
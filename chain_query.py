@@ -0,0 +1,58 @@
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Số block mặc định / tối đa cho một trang
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+
+def page_blocks(blocks: Sequence, find_index: Callable[[str], Optional[int]],
+                start: Optional[int] = None, limit: Optional[int] = None,
+                since_hash: Optional[str] = None, tip_only: bool = False,
+                missing_ok: bool = False) -> Tuple[List, Dict]:
+    """
+    Lấy một trang block từ chain theo vị trí, theo hash hoặc chỉ block tip
+    - start / limit: trang bắt đầu từ index start, tối đa limit block
+    - since_hash: các block đứng sau block có hash này (dùng làm con trỏ khi poll)
+    - tip_only: chỉ block cuối cùng
+    blocks: dãy hỗ trợ len, index và lát cắt (list, SegmentLogStore, đường đi lười trong block tree)
+    find_index(hash) trả về index của block trong chain (None nếu không thuộc chain)
+    since_hash không thuộc chain: KeyError, hoặc trang rỗng có 'since_missing': True nếu missing_ok
+    limit tối thiểu là 1 để next_start luôn tiến lên
+    Chi phí tỉ lệ với kích thước trang, không phải độ dài chain
+    Trả về (danh_sách_block, thông_tin_phân_trang)
+    """
+    total = len(blocks)
+    limit = DEFAULT_PAGE_SIZE if limit is None else max(1, min(limit, MAX_PAGE_SIZE))
+    tip_hash = blocks[total - 1].hash if total else None
+    
+    if tip_only:
+        start = max(0, total - 1)
+        limit = 1
+    elif since_hash is not None:
+        index = find_index(since_hash)
+        if index is None:
+            if not missing_ok:
+                raise KeyError(f"Không tìm thấy block {since_hash}")
+            return [], {
+                'start': None,
+                'limit': limit,
+                'total': total,
+                'next_start': None,
+                'tip_hash': tip_hash,
+                'since_missing': True
+            }
+        start = index + 1
+    elif start is None:
+        start = 0
+    
+    start = max(0, min(start, total))
+    end = min(start + limit, total)
+    page = list(blocks[start:end])
+    
+    return page, {
+        'start': start,
+        'limit': limit,
+        'total': total,
+        'next_start': end if end < total else None,
+        'tip_hash': tip_hash
+    }
@@ -0,0 +1,328 @@
+import json
+import mmap
+import os
+import struct
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterator, List, Optional, Union
+from pow_simulator import Block, BLOCK_HEADER
+
+try:
+    import numpy as np
+except ImportError:  # numpy là tuỳ chọn, chỉ dùng để giữ chỉ mục hash gọn trong bộ nhớ
+    np = None
+
+# Vị trí của hash trong header nhị phân (sau index, timestamp, nonce, flags)
+BLOCK_HASH_OFFSET = struct.calcsize('<QdQB')
+
+# Mỗi mục trong file index: số thứ tự segment, offset trong segment, độ dài bản ghi
+INDEX_ENTRY = struct.Struct('<IQI')
+
+# Kích thước tối đa của một segment log (bytes)
+DEFAULT_SEGMENT_SIZE = 64 * 1024 * 1024
+
+# Số block đã decode được giữ lại để tái sử dụng (kèm cache JSON của chúng)
+DEFAULT_BLOCK_CACHE_SIZE = 4096
+
+# Số block mới được tra trong dict trước khi gộp vào mảng chỉ mục hash đã sắp xếp
+HASH_INDEX_TAIL = 4096
+
+# Tên file metadata (JSON nhỏ, vd. trạng thái fork choice) nằm cạnh log
+META_FILE = 'meta.json'
+
+
+class _MappedFile:
+    """
+    File chỉ ghi nối thêm, đọc qua mmap; tự map lại khi file đã dài hơn vùng đang map
+    Vùng map cũ không bị đóng khi map lại: reader khác có thể vẫn đang đọc nó (chỉ giữ khoá đọc),
+    nên nó được giải phóng khi reader cuối cùng bỏ tham chiếu
+    """
+    def __init__(self, path: str):
+        self.path = path
+        self.file = open(path, 'ab+')
+        self.size = self.file.seek(0, os.SEEK_END)
+        self._map: Optional[mmap.mmap] = None
+        self._lock = threading.Lock()  # Chỉ bảo vệ việc kiểm tra + thay vùng map
+    
+    def append(self, data: bytes) -> int:
+        """Ghi nối dữ liệu, trả về offset bắt đầu"""
+        offset = self.size
+        self.file.write(data)
+        self.file.flush()
+        self.size += len(data)
+        return offset
+    
+    def view(self, end: int) -> mmap.mmap:
+        """Vùng map bao phủ ít nhất tới byte end (caller giữ tham chiếu trong lúc đọc)"""
+        current = self._map
+        if current is not None and len(current) >= end:
+            return current
+        with self._lock:
+            if self._map is None or len(self._map) < end:
+                self._map = mmap.mmap(self.file.fileno(), self.size, access=mmap.ACCESS_READ)
+            return self._map
+    
+    def close(self):
+        if self._map is not None:
+            self._map.close()
+            self._map = None
+        self.file.close()
+
+
+class SegmentLogStore:
+    """
+    Lưu trữ chain bền vững: log chỉ ghi nối thêm chia thành nhiều segment + file index offset
+    - Block được ghi theo định dạng nhị phân của Block.to_bytes()
+    - Đọc lại qua mmap và chỉ decode block được yêu cầu, nên khởi động lại với chain lớn
+      gần như tức thời và có thể phục vụ các đoạn lịch sử mà không nạp cả chain vào bộ nhớ
+    Dùng được thay cho list trong PoWSimulator.blockchain (append, len, index, slice, iter)
+    Khi mở, mục index ghi dở (lỗi giữa chừng) hoặc trỏ ra ngoài segment bị cắt bỏ
+    Đọc an toàn từ nhiều thread song song với một writer ghi nối (như PoWSimulator dưới lock.read / lock.write)
+    """
+    def __init__(self, directory: str, segment_size: int = DEFAULT_SEGMENT_SIZE,
+                 cache_size: int = DEFAULT_BLOCK_CACHE_SIZE):
+        self.directory = directory
+        self.segment_size = segment_size
+        self.cache_size = cache_size
+        self._cache_lock = threading.Lock()  # Cache LRU bị thay đổi cả khi chỉ đọc (nhiều reader cùng lúc)
+        self._hash_lock = threading.Lock()  # Chỉ mục hash cũng được dựng / cập nhật khi chỉ đọc
+        os.makedirs(directory, exist_ok=True)
+        self._open()
+    
+    def _open(self):
+        index_path = os.path.join(self.directory, 'index.bin')
+        self._repair_index(index_path)
+        self._index = _MappedFile(index_path)
+        self._segments: List[_MappedFile] = []
+        self._cache: OrderedDict = OrderedDict()
+        # Chỉ mục hash (xem find): 8 byte cuối của digest đã sắp xếp + vị trí tương ứng,
+        # các block ghi sau lần gộp cuối nằm trong dict digest -> vị trí
+        self._hash_keys = None
+        self._hash_positions = None
+        self._hash_tail: Dict[bytes, int] = {}
+        self._hash_indexed = 0
+        count = len(self)
+        if count:
+            last_segment = self._entry(count - 1)[0]
+            for number in range(last_segment + 1):
+                self._segments.append(_MappedFile(self._segment_path(number)))
+    
+    def _repair_index(self, index_path: str):
+        """
+        Cắt index về mục nguyên vẹn cuối cùng: bỏ phần mục ghi dở ở cuối file,
+        rồi bỏ dần các mục cuối không khớp với bản ghi trong segment (segment thiếu / ngắn hơn / header sai)
+        Segment cũng được cắt về cuối bản ghi được index cuối cùng (bỏ phần đuôi ghi dở và segment thừa),
+        để block ghi sau đó nằm ngay sau bản ghi hợp lệ
+        """
+        try:
+            size = os.path.getsize(index_path)
+        except FileNotFoundError:
+            size = 0
+        valid = size - size % INDEX_ENTRY.size
+        last_entry = None
+        if valid:
+            with open(index_path, 'rb') as f:
+                while valid:
+                    f.seek(valid - INDEX_ENTRY.size)
+                    entry = INDEX_ENTRY.unpack(f.read(INDEX_ENTRY.size))
+                    if self._record_matches(*entry):
+                        last_entry = entry
+                        break
+                    valid -= INDEX_ENTRY.size
+        if valid != size:
+            os.truncate(index_path, valid)
+        
+        last_segment, end = (last_entry[0], last_entry[1] + last_entry[2]) if last_entry else (-1, 0)
+        for name in os.listdir(self.directory):
+            if not (name.startswith('segment-') and name.endswith('.log')):
+                continue
+            number = int(name[len('segment-'):-len('.log')])
+            path = os.path.join(self.directory, name)
+            if number > last_segment:
+                os.remove(path)
+            elif number == last_segment and os.path.getsize(path) > end:
+                os.truncate(path, end)
+    
+    def _record_matches(self, number: int, offset: int, length: int) -> bool:
+        """Bản ghi (segment, offset, length) có nằm trọn trong segment và có độ dài khớp với header không"""
+        try:
+            with open(self._segment_path(number), 'rb') as f:
+                f.seek(0, os.SEEK_END)
+                if length < BLOCK_HEADER.size or f.tell() < offset + length:
+                    return False
+                f.seek(offset)
+                header = BLOCK_HEADER.unpack(f.read(BLOCK_HEADER.size))
+        except (OSError, struct.error):
+            return False
+        data_length, previous_length = header[-2], header[-1]
+        return BLOCK_HEADER.size + data_length + previous_length == length
+    
+    def _segment_path(self, number: int) -> str:
+        return os.path.join(self.directory, f'segment-{number:06d}.log')
+    
+    def __len__(self) -> int:
+        return self._index.size // INDEX_ENTRY.size
+    
+    def _entry(self, i: int) -> tuple:
+        end = (i + 1) * INDEX_ENTRY.size
+        return INDEX_ENTRY.unpack_from(self._index.view(end), i * INDEX_ENTRY.size)
+    
+    def append(self, block: Block):
+        """Ghi nối một block vào cuối log"""
+        record = block.to_bytes()
+        if not self._segments or self._segments[-1].size + len(record) > self.segment_size:
+            self._segments.append(_MappedFile(self._segment_path(len(self._segments))))
+        segment = self._segments[-1]
+        offset = segment.append(record)
+        self._index.append(INDEX_ENTRY.pack(len(self._segments) - 1, offset, len(record)))
+        self._remember(len(self) - 1, block)
+    
+    def _remember(self, i: int, block: Block):
+        with self._cache_lock:
+            self._cache[i] = block
+            self._cache.move_to_end(i)
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+    
+    def raw(self, i: int) -> bytes:
+        """Bản ghi nhị phân của block thứ i (không decode)"""
+        number, offset, length = self._entry(i)
+        return self._segments[number].view(offset + length)[offset:offset + length]
+    
+    def raw_range(self, start: int, stop: int) -> bytes:
+        """Các bản ghi nhị phân liên tiếp [start, stop), ghép qua ranh giới segment nếu cần"""
+        start, stop, _ = slice(start, stop).indices(len(self))
+        if start >= stop:
+            return b''
+        parts = []
+        i = start
+        while i < stop:
+            number, offset, _ = self._entry(i)
+            # Các bản ghi liên tiếp trong cùng segment được đọc bằng một lát cắt duy nhất
+            j = i
+            while j + 1 < stop and self._entry(j + 1)[0] == number:
+                j += 1
+            _, last_offset, last_length = self._entry(j)
+            end = last_offset + last_length
+            parts.append(self._segments[number].view(end)[offset:end])
+            i = j + 1
+        return b''.join(parts)
+    
+    def iter_hashes(self) -> Iterator[str]:
+        """Duyệt hash (hex) của mọi block, đọc thẳng từ header mà không decode block"""
+        for digest in self.iter_digests():
+            yield digest.hex()
+    
+    def digest(self, i: int) -> bytes:
+        """Hash (digest 32 bytes) của block thứ i, đọc thẳng từ header"""
+        number, offset, length = self._entry(i)
+        view = self._segments[number].view(offset + length)
+        return view[offset + BLOCK_HASH_OFFSET:offset + BLOCK_HASH_OFFSET + 32]
+    
+    def iter_digests(self, stop: Optional[int] = None) -> Iterator[bytes]:
+        """Duyệt hash (digest 32 bytes) của các block [0, stop), đọc thẳng từ header"""
+        hash_offset = BLOCK_HASH_OFFSET
+        for i in range(len(self) if stop is None else stop):
+            number, offset, length = self._entry(i)
+            view = self._segments[number].view(offset + length)
+            yield view[offset + hash_offset:offset + hash_offset + 32]
+    
+    def find(self, block_hash: Union[str, bytes]) -> Optional[int]:
+        """
+        Vị trí của block theo hash (hex hoặc digest 32 bytes), None nếu không có
+        Chỉ mục gọn (12 byte mỗi block, cần numpy) được dựng ở lần gọi đầu tiên và cập nhật dần
+        theo các block ghi thêm; ứng viên trùng khoá được so lại với digest đọc từ header
+        """
+        try:
+            digest = bytes.fromhex(block_hash) if isinstance(block_hash, str) else bytes(block_hash)
+        except ValueError:
+            return None
+        if len(digest) != 32:
+            return None
+        with self._hash_lock:
+            self._update_hash_index()
+            position = self._hash_tail.get(digest)
+            if position is not None or self._hash_keys is None:
+                return position
+            key = int.from_bytes(digest[-8:], 'little')
+            i = int(np.searchsorted(self._hash_keys, key))
+            while i < len(self._hash_keys) and self._hash_keys[i] == key:
+                position = int(self._hash_positions[i])
+                if self.digest(position) == digest:
+                    return position
+                i += 1
+        return None
+    
+    def _update_hash_index(self):
+        """Đưa các block chưa có trong chỉ mục hash vào dict, gộp vào mảng đã sắp xếp khi dict đủ lớn"""
+        count = len(self)
+        for i in range(self._hash_indexed, count):
+            self._hash_tail[self.digest(i)] = i
+        self._hash_indexed = count
+        # Không có numpy thì dict giữ toàn bộ chỉ mục
+        if np is None or len(self._hash_tail) <= max(HASH_INDEX_TAIL, count // 8):
+            return
+        tail_keys = np.fromiter((int.from_bytes(digest[-8:], 'little') for digest in self._hash_tail),
+                                dtype=np.uint64, count=len(self._hash_tail))
+        tail_positions = np.fromiter(self._hash_tail.values(), dtype=np.uint32, count=len(self._hash_tail))
+        if self._hash_keys is not None:
+            tail_keys = np.concatenate([self._hash_keys, tail_keys])
+            tail_positions = np.concatenate([self._hash_positions, tail_positions])
+        order = np.argsort(tail_keys, kind='stable')
+        self._hash_keys = tail_keys[order]
+        self._hash_positions = tail_positions[order]
+        self._hash_tail = {}
+    
+    def read_meta(self) -> Optional[Dict]:
+        """Metadata đã lưu bằng write_meta (None nếu chưa có hoặc file hỏng)"""
+        try:
+            with open(os.path.join(self.directory, META_FILE), encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+    
+    def write_meta(self, meta: Dict):
+        """Ghi metadata (thay thế nguyên tử bản cũ)"""
+        path = os.path.join(self.directory, META_FILE)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(meta, f, separators=(',', ':'))
+        os.replace(path + '.tmp', path)
+    
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        count = len(self)
+        if i < 0:
+            i += count
+        if not 0 <= i < count:
+            raise IndexError("chain index out of range")
+        with self._cache_lock:
+            block = self._cache.get(i)
+            if block is not None:
+                self._cache.move_to_end(i)
+        if block is None:
+            number, offset, length = self._entry(i)
+            block = Block.from_buffer(self._segments[number].view(offset + length), offset)[0]
+            self._remember(i, block)
+        return block
+    
+    def __iter__(self) -> Iterator[Block]:
+        for i in range(len(self)):
+            yield self[i]
+    
+    def __bool__(self) -> bool:
+        return len(self) > 0
+    
+    def clear(self):
+        """Xoá toàn bộ chain đã lưu"""
+        self.close()
+        for name in os.listdir(self.directory):
+            if name in ('index.bin', META_FILE) or name.startswith('segment-'):
+                os.remove(os.path.join(self.directory, name))
+        self._open()
+    
+    def close(self):
+        """Đóng các file đang mở"""
+        for segment in self._segments:
+            segment.close()
+        self._index.close()
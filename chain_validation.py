@@ -0,0 +1,138 @@
+import hashlib
+import time
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+from pow_simulator import (
+    Block, BLOCK_HEADER, FLAG_HAS_TARGET, FLAG_TEXT_PREVIOUS_HASH, encode_blocks
+)
+from retarget import MAX_TARGET
+
+# Số block mỗi chunk gửi cho một process worker
+VALIDATION_CHUNK_SIZE = 50000
+
+# Số lỗi tối đa ghi lại trong kết quả (vẫn đếm đủ tổng số lỗi)
+MAX_REPORTED_ERRORS = 100
+
+# Các loại lỗi có thể gặp khi kiểm tra chain
+ERROR_HASH_MISMATCH = 'hash_mismatch'          # hash lưu trong block khác calculate_hash()
+ERROR_INSUFFICIENT_WORK = 'insufficient_work'  # hash không đạt target của block
+ERROR_BROKEN_LINK = 'broken_link'              # previous_hash không trỏ tới block liền trước
+ERROR_BAD_INDEX = 'bad_index'                  # block.index khác vị trí trong chain
+ERROR_TARGET_TOO_EASY = 'target_too_easy'      # target của block dễ hơn mọi target retarget có thể đặt
+
+# MAX_TARGET ở dạng lưu trong header (target - 1, bytes big-endian)
+_MAX_STORED_TARGET = (MAX_TARGET - 1).to_bytes(32, 'big')
+
+
+def _validate_chunk(buffer: bytes, position: int, check_pow: bool) -> tuple:
+    """
+    Kiểm tra một đoạn block liên tiếp ở dạng nhị phân (xem Block.to_bytes)
+    Đọc thẳng các trường từ header thay vì tạo đối tượng Block
+    position: vị trí trong chain của block đầu tiên trong đoạn
+    Trả về: (số_block, danh_sách_lỗi, previous_hash_của_block_đầu, hash_của_block_cuối)
+    previous_hash của block đầu là None nếu không phải digest (vd. genesis "0")
+    """
+    unpack_from = BLOCK_HEADER.unpack_from
+    header_size = BLOCK_HEADER.size
+    sha256 = hashlib.sha256
+    errors = []
+    first_previous = None
+    previous_hash = None
+    offset = 0
+    end = len(buffer)
+    i = position
+
+    while offset < end:
+        (index, timestamp, nonce, flags, block_hash, previous, target,
+         data_length, previous_length) = unpack_from(buffer, offset)
+        offset += header_size
+        data = buffer[offset:offset + data_length].decode()
+        offset += data_length
+        if flags & FLAG_TEXT_PREVIOUS_HASH:
+            previous_text = buffer[offset:offset + previous_length].decode()
+            offset += previous_length
+            previous = None
+        else:
+            previous_text = previous.hex()
+
+        # Cùng chuỗi với Block.calculate_hash()
+        digest = sha256(f"{index}{timestamp}{data}{previous_text}{nonce}".encode()).digest()
+        if digest != block_hash:
+            errors.append((i, ERROR_HASH_MISMATCH))
+        # target lưu dưới dạng target - 1: hash hợp lệ khi digest <= target (bytes big-endian)
+        if check_pow and i > 0 and flags & FLAG_HAS_TARGET:
+            if block_hash > target:
+                errors.append((i, ERROR_INSUFFICIENT_WORK))
+            if target > _MAX_STORED_TARGET:
+                errors.append((i, ERROR_TARGET_TOO_EASY))
+        if index != i:
+            errors.append((i, ERROR_BAD_INDEX))
+
+        if i == position:
+            first_previous = previous
+        elif previous != previous_hash:
+            errors.append((i, ERROR_BROKEN_LINK))
+        previous_hash = block_hash
+        i += 1
+
+    return i - position, errors, first_previous, previous_hash
+
+
+def _chunk_bytes(blocks: Sequence[Block], start: int, stop: int) -> bytes:
+    """Dữ liệu nhị phân của blocks[start:stop], lấy thẳng từ storage nếu có"""
+    raw_range = getattr(blocks, 'raw_range', None)
+    if raw_range is not None:
+        return raw_range(start, stop)
+    return encode_blocks(blocks[i] for i in range(start, stop))
+
+
+def validate_chain(blocks: Sequence[Block], check_pow: bool = True, processes: Optional[int] = None,
+                   chunk_size: int = VALIDATION_CHUNK_SIZE) -> Dict:
+    """
+    Kiểm tra toàn bộ chain: hash của từng block, proof-of-work theo target của block
+    (bỏ qua genesis và block không có target), liên kết previous_hash và index
+    Target do chính block ghi lại: thời gian đào dùng để retarget không nằm trong chain (và thuật toán
+    có thể đổi giữa chừng), nên không tính lại được target mong đợi; chỉ kiểm tra target không dễ hơn MAX_TARGET
+    Hash được tính lại song song theo từng chunk trên nhiều process; liên kết giữa
+    hai chunk liền nhau được kiểm tra khi gộp kết quả
+    processes: số process worker (None = số CPU); chain chỉ có một chunk được kiểm tra ngay trong process hiện tại
+    Trả về: valid, số block, vị trí lỗi đầu tiên và danh sách lỗi (tối đa MAX_REPORTED_ERRORS)
+    """
+    if chunk_size <= 0:
+        raise ValueError("chunk_size phải lớn hơn 0")
+    start_time = time.time()
+    length = len(blocks)
+    bounds = [(start, min(start + chunk_size, length)) for start in range(0, length, chunk_size)]
+
+    if len(bounds) <= 1 or processes == 1:
+        results = [_validate_chunk(_chunk_bytes(blocks, start, stop), start, check_pow)
+                   for start, stop in bounds]
+    else:
+        ctx = multiprocessing.get_context()
+        with ProcessPoolExecutor(max_workers=processes, mp_context=ctx) as pool:
+            futures = [pool.submit(_validate_chunk, _chunk_bytes(blocks, start, stop), start, check_pow)
+                       for start, stop in bounds]
+            results = [future.result() for future in futures]
+
+    errors: List[tuple] = []
+    last_hash = None
+    for (start, _), (count, chunk_errors, first_previous, chunk_last_hash) in zip(bounds, results):
+        # Block đầu mỗi chunk (trừ genesis) phải trỏ tới block cuối của chunk trước
+        if start > 0 and first_previous != last_hash:
+            errors.append((start, ERROR_BROKEN_LINK))
+        errors.extend(chunk_errors)
+        last_hash = chunk_last_hash
+    errors.sort()
+
+    return {
+        'valid': not errors,
+        'length': length,
+        'pow_checked': check_pow,
+        'first_invalid_index': errors[0][0] if errors else None,
+        'error_count': len(errors),
+        'errors': [{'index': index, 'error': error} for index, error in errors[:MAX_REPORTED_ERRORS]],
+        'chunks': len(bounds),
+        'elapsed': round(time.time() - start_time, 4)
+    }
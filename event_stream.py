@@ -0,0 +1,95 @@
+import json
+import queue
+import threading
+import time
+from collections import deque
+from typing import Dict, Iterator, List, Optional
+
+# Số event gần nhất được giữ lại để client kết nối lại (Last-Event-ID) nhận bù
+DEFAULT_REPLAY_SIZE = 1000
+
+# Số event tối đa chờ gửi cho một client; client chậm hơn sẽ bị bỏ bớt event
+DEFAULT_SUBSCRIBER_QUEUE_SIZE = 1000
+
+# Khoảng thời gian gửi comment giữ kết nối khi không có event (giây)
+HEARTBEAT_INTERVAL = 15.0
+
+
+class EventBus:
+    """
+    Phát các event thay đổi (block mới, điều chỉnh độ khó, validator được chọn, fork...)
+    tới mọi client đang theo dõi qua Server-Sent Events
+    Mỗi event chỉ mang phần thay đổi (delta), client không phải tải lại toàn bộ chain
+    """
+    def __init__(self, replay_size: int = DEFAULT_REPLAY_SIZE,
+                 subscriber_queue_size: int = DEFAULT_SUBSCRIBER_QUEUE_SIZE, last_event_id: int = 0):
+        self.subscriber_queue_size = subscriber_queue_size
+        self._recent: deque = deque(maxlen=replay_size)
+        self._subscribers: List[queue.Queue] = []
+        self._lock = threading.Lock()
+        # Id của event gần nhất; bus tạo lại cho cùng luồng event (vd. phiên nạp lại từ đĩa)
+        # tiếp tục đánh số sau id này để Last-Event-ID của client không trỏ nhầm event mới
+        self.last_event_id = last_event_id
+
+    def publish(self, event_type: str, data: Dict) -> int:
+        """Phát một event tới tất cả subscriber, trả về id của event"""
+        with self._lock:
+            self.last_event_id += 1
+            event_id = self.last_event_id
+            payload = json.dumps({'type': event_type, 'time': time.time(), 'data': data},
+                                 separators=(',', ':'))
+            # Encode sẵn một lần cho mọi client
+            event = (event_id, f"id: {event_id}\nevent: {event_type}\ndata: {payload}\n\n".encode())
+            self._recent.append(event)
+            for subscriber in self._subscribers:
+                try:
+                    subscriber.put_nowait(event)
+                except queue.Full:
+                    pass  # Client quá chậm: bỏ event, client có thể kết nối lại với Last-Event-ID
+        return event_id
+
+    def subscribe(self, last_event_id: Optional[int] = None) -> queue.Queue:
+        """Đăng ký nhận event; có last_event_id thì nhận bù các event sau id đó (nếu còn giữ)"""
+        subscriber: queue.Queue = queue.Queue(maxsize=self.subscriber_queue_size)
+        with self._lock:
+            if last_event_id is not None:
+                for event in self._recent:
+                    if event[0] > last_event_id:
+                        try:
+                            subscriber.put_nowait(event)
+                        except queue.Full:
+                            break
+            self._subscribers.append(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: queue.Queue):
+        """Huỷ đăng ký"""
+        with self._lock:
+            if subscriber in self._subscribers:
+                self._subscribers.remove(subscriber)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def stream(self, last_event_id: Optional[int] = None,
+               heartbeat: float = HEARTBEAT_INTERVAL) -> Iterator[bytes]:
+        """
+        Generator trả về dữ liệu text/event-stream cho một client
+        Đăng ký ngay khi gọi (trước khi response bắt đầu được gửi) để không lỡ event
+        """
+        return self._stream(self.subscribe(last_event_id), heartbeat)
+
+    def _stream(self, subscriber: queue.Queue, heartbeat: float) -> Iterator[bytes]:
+        try:
+            # Gợi ý client thời gian chờ trước khi tự kết nối lại (ms)
+            yield b"retry: 3000\n\n"
+            while True:
+                try:
+                    _, chunk = subscriber.get(timeout=heartbeat)
+                except queue.Empty:
+                    yield b": keepalive\n\n"
+                    continue
+                yield chunk
+        finally:
+            self.unsubscribe(subscriber)
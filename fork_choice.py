@@ -0,0 +1,194 @@
+import bisect
+import heapq
+import itertools
+from typing import Dict, List, Optional
+from pow_simulator import Block, block_work
+from block_tree import BlockTree
+
+# Số block giữa hai lần lưu metadata fork choice vào storage (cũng là số block tối đa phải đọc lại khi mở)
+META_INTERVAL = 256
+
+
+class ForkChoice(BlockTree):
+    """
+    Block tree kèm fork choice theo công việc tích luỹ (heaviest chain)
+    - Công việc tích luỹ của mỗi block được tính tăng dần khi block đến: O(1)
+    - Tip tốt nhất được giữ sẵn, các tip cạnh tranh nằm trong heap
+    - Khi đổi nhánh (reorg) chỉ đi ngược tới tổ tiên chung, chi phí tỉ lệ với độ sâu reorg
+    Khi bằng công việc, tip được thấy trước được giữ (first-seen)
+    Có storage hỗ trợ metadata (write_meta / read_meta) thì trạng thái tip được lưu định kỳ,
+    nên from_storage mở lại cây mà không phải nạp cả chain
+    Chain tốt nhất được chỉ mục theo độ cao (main_block): không có storage là danh sách hash,
+    có storage là các đoạn block nằm liền nhau trong storage (chain không fork chỉ có một đoạn)
+    """
+    def __init__(self, storage=None):
+        super().__init__(storage)
+        self.work: Dict[str, int] = {}  # hash -> công việc tích luỹ từ genesis
+        self.tips: Dict[str, int] = {}  # hash tip -> công việc tích luỹ (theo thứ tự đến)
+        self.best_tip: Optional[str] = None
+        self._heap = []  # (-công_việc, thứ_tự_đến, hash)
+        self._arrival = itertools.count()
+        self._tip_positions: Dict[str, int] = {}  # hash tip -> vị trí trong storage
+        self._meta_count = 0  # len(storage) ở lần lưu metadata gần nhất
+        # Chỉ mục chain tốt nhất theo độ cao: hash từng block (không có storage)
+        # hoặc (độ cao bắt đầu, vị trí trong storage) của từng đoạn liền nhau
+        self._main_hashes: List[str] = []
+        self._run_heights: List[int] = []
+        self._run_positions: List[int] = []
+        self._main_length = 0
+    
+    @classmethod
+    def from_storage(cls, storage) -> 'ForkChoice':
+        """
+        Mở lại cây từ storage: đọc trạng thái tip đã lưu, chỉ decode các block ghi sau lần lưu metadata cuối
+        (storage không có metadata hợp lệ thì nạp lại toàn bộ block)
+        """
+        tree = cls(storage)
+        meta = storage.read_meta() if hasattr(storage, 'read_meta') else None
+        count = len(storage)
+        if meta is not None and meta.get('count', count + 1) <= count and 'main_runs' in meta:
+            tree._stored_count = meta['count']
+            for block_hash, height, work, position in meta['tips']:
+                tree.heights[block_hash] = height
+                tree.work[block_hash] = work
+                tree._known_positions[block_hash] = position
+                tree._tip_positions[block_hash] = position
+                tree._add_tip(block_hash, work)
+            tree.best_tip = meta['best_tip']
+            tree._run_heights = [height for height, _ in meta['main_runs']]
+            tree._run_positions = [position for _, position in meta['main_runs']]
+            tree._main_length = tree.height(tree.best_tip) + 1
+        for position in range(tree._stored_count, count):
+            block = storage[position]
+            if tree._is_new(block):
+                tree._insert(block, position)
+        tree.save_meta()
+        return tree
+    
+    def _is_new(self, block: Block) -> bool:
+        # Con của một tip chắc chắn chưa có trong cây: không cần tra storage
+        if block.previous_hash in self.tips:
+            return block.hash not in self.blocks
+        return super()._is_new(block)
+    
+    def _add_tip(self, block_hash: str, work: int):
+        self.tips[block_hash] = work
+        heapq.heappush(self._heap, (-work, next(self._arrival), block_hash))
+    
+    def add_block(self, block: Block):
+        """Thêm block và cập nhật tip tốt nhất"""
+        if not self._is_new(block):
+            return
+        super().add_block(block)
+        if self.storage is not None and len(self.storage) - self._meta_count >= META_INTERVAL:
+            self.save_meta()
+    
+    def _insert(self, block: Block, position: Optional[int] = None):
+        super()._insert(block, position)
+        parent_work = self.cumulative_work(block.previous_hash) if block.previous_hash in self else 0
+        work = parent_work + block_work(block.target)
+        self.work[block.hash] = work
+        self.tips.pop(block.previous_hash, None)
+        self._tip_positions.pop(block.previous_hash, None)
+        self._add_tip(block.hash, work)
+        if position is not None:
+            self._tip_positions[block.hash] = position
+        
+        if self.best_tip is None or work > self.work[self.best_tip]:
+            self._move_main(block, position)
+            self.best_tip = block.hash
+    
+    def _move_main(self, block: Block, position: Optional[int]):
+        """Cập nhật chỉ mục chain tốt nhất khi block trở thành tip tốt nhất (reorg: chỉ sửa đoạn rẽ nhánh)"""
+        if self.best_tip is not None and block.previous_hash != self.best_tip:
+            ancestor = self.common_ancestor(self.best_tip, block.hash)
+            self._truncate_main(self.height(ancestor) + 1 if ancestor is not None else 0)
+            for connected in self.segment(block.previous_hash, ancestor):
+                connected_position = self.storage.find(connected.hash) if self.storage is not None else None
+                self._extend_main(connected.hash, connected_position)
+        self._extend_main(block.hash, position)
+    
+    def _extend_main(self, block_hash: str, position: Optional[int]):
+        if self.storage is None:
+            self._main_hashes.append(block_hash)
+        elif not self._run_heights or self._run_positions[-1] + self._main_length - self._run_heights[-1] != position:
+            self._run_heights.append(self._main_length)
+            self._run_positions.append(position)
+        self._main_length += 1
+    
+    def _truncate_main(self, length: int):
+        del self._main_hashes[length:]
+        keep = bisect.bisect_left(self._run_heights, length)
+        del self._run_heights[keep:]
+        del self._run_positions[keep:]
+        self._main_length = length
+    
+    def main_block(self, height: int) -> Optional[Block]:
+        """Block ở độ cao height trên chain tốt nhất (None nếu chain chưa dài tới đó)"""
+        if not 0 <= height < self._main_length:
+            return None
+        if self.storage is None:
+            return self.blocks[self._main_hashes[height]]
+        run = bisect.bisect_right(self._run_heights, height) - 1
+        return self.storage[self._run_positions[run] + height - self._run_heights[run]]
+    
+    def main_hash(self, height: int) -> Optional[str]:
+        """Hash của block ở độ cao height trên chain tốt nhất (không decode block đã lưu)"""
+        if not 0 <= height < self._main_length:
+            return None
+        if self.storage is None:
+            return self._main_hashes[height]
+        run = bisect.bisect_right(self._run_heights, height) - 1
+        return self.storage.digest(self._run_positions[run] + height - self._run_heights[run]).hex()
+    
+    def save_meta(self):
+        """
+        Lưu trạng thái tip (hash, độ cao, công việc, vị trí) kèm số block storage đã phản ánh
+        Gọi tự động mỗi META_INTERVAL block; block ghi sau lần lưu cuối được from_storage đọc lại từ storage
+        """
+        if self.storage is None or not hasattr(self.storage, 'write_meta'):
+            return
+        tips = [[block_hash, self.height(block_hash), work, self._tip_positions[block_hash]]
+                for block_hash, work in self.tips.items()]
+        self._meta_count = len(self.storage)
+        main_runs = [list(run) for run in zip(self._run_heights, self._run_positions)]
+        self.storage.write_meta({'count': self._meta_count, 'best_tip': self.best_tip, 'tips': tips,
+                                 'main_runs': main_runs})
+    
+    def cumulative_work(self, block_hash: str) -> int:
+        """Công việc tích luỹ từ genesis tới block"""
+        work = self.work.get(block_hash)
+        if work is None:
+            # Block đã lưu nhưng không phải tip: cộng công việc dọc theo tổ tiên (hiếm, ghi nhớ lại)
+            ancestors = []
+            for block in self.iter_ancestors(block_hash):
+                known = self.work.get(block.hash)
+                if known is not None:
+                    work = known
+                    break
+                ancestors.append(block)
+            else:
+                work = 0
+            for block in reversed(ancestors):
+                work += block_work(block.target)
+                self.work[block.hash] = work
+        return work
+    
+    def top_tips(self, count: int = 10) -> List[str]:
+        """Các tip đang cạnh tranh có công việc tích luỹ lớn nhất"""
+        # Loại bỏ dần các mục trong heap không còn là tip (đã có block con)
+        while self._heap and self._heap[0][2] not in self.tips:
+            heapq.heappop(self._heap)
+        return [h for _, _, h in heapq.nsmallest(count, self._heap) if h in self.tips][:count]
+    
+    def reorg(self, old_tip: str, new_tip: str) -> Dict:
+        """Mô tả việc chuyển từ old_tip sang new_tip: tổ tiên chung và các block bị bỏ / được nối"""
+        ancestor = self.common_ancestor(old_tip, new_tip)
+        disconnected = self.segment(old_tip, ancestor)
+        connected = self.segment(new_tip, ancestor)
+        return {
+            'common_ancestor': ancestor,
+            'depth': len(disconnected),
+            'disconnected': [block.hash for block in disconnected],
+            'connected': [block.hash for block in connected]
+        }
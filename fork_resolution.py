@@ -1,25 +1,119 @@
-import time
-import random
+import itertools
+import json
 from typing import List, Dict, Optional
-from pow_simulator import Block
+from pow_simulator import Block, difficulty_to_target
+from chain_query import page_blocks
+from chain_validation import validate_chain
+from block_tree import BlockTree
+from fork_choice import ForkChoice
+from network_simulator import NetworkSimulator
+from rwlock import ReadWriteLock
+from sim_random import RandomStreams, SYSTEM_CLOCK
+
+class _ChainPath:
+    """
+    Dãy block genesis..tip của một chain, đọc lười từ block tree (dùng cho chain_query.page_blocks)
+    Chỉ đi ngược từ tip cho tới khi gặp chain tốt nhất (ForkChoice.main_block), phần còn lại
+    được lấy thẳng theo độ cao, nên chi phí tỉ lệ với độ dài nhánh rẽ cộng độ dài lát cắt,
+    không phải độ dài chain (block tree không có chỉ mục theo độ cao thì đi ngược cả đoạn từ tip)
+    """
+    def __init__(self, tree: BlockTree, tip_hash: Optional[str]):
+        self.tree = tree
+        self.tip_hash = tip_hash
+        self._length = tree.height(tip_hash) + 1 if tip_hash is not None else 0
+    
+    def __len__(self) -> int:
+        return self._length
+    
+    def _walk(self, start: int, stop: int) -> List[Block]:
+        """Các block có index trong [start, stop), theo thứ tự tăng dần"""
+        main_hash = getattr(self.tree, 'main_hash', None)
+        if main_hash is None:
+            blocks = list(itertools.islice(
+                self.tree.iter_ancestors(self.tip_hash), self._length - stop, self._length - start
+            ))
+            blocks.reverse()
+            return blocks
+        branch = []
+        height = self._length - 1
+        for block in self.tree.iter_ancestors(self.tip_hash):
+            if height < start or main_hash(height) == block.hash:
+                break
+            if height < stop:
+                branch.append(block)
+            height -= 1
+        branch.reverse()
+        return [self.tree.main_block(h) for h in range(start, min(stop, height + 1))] + branch
+    
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            start, stop, step = i.indices(self._length)
+            return self._walk(start, stop)[::step] if start < stop and step > 0 else []
+        if i < 0:
+            i += self._length
+        if not 0 <= i < self._length:
+            raise IndexError("chain index out of range")
+        return self._walk(i, i + 1)[0]
+
 
 class Blockchain:
-    """Đại diện cho một blockchain (có thể là một nhánh fork)"""
-    def __init__(self, name: str):
+    """
+    Đại diện cho một blockchain (có thể là một nhánh fork)
+    Chain chỉ là con trỏ tới block tip trong BlockTree dùng chung,
+    nên các nhánh fork không phải copy lại phần tổ tiên chung
+    """
+    def __init__(self, name: str, tree: Optional[BlockTree] = None, tip_hash: Optional[str] = None):
         self.name = name
-        self.chain: List[Block] = []
+        self.tree = tree if tree is not None else BlockTree()
+        self.tip_hash = tip_hash
+        
+    @property
+    def chain(self) -> List[Block]:
+        """
+        Danh sách block từ genesis đến tip (dựng mỗi lần gọi, chi phí O(độ dài chain))
+        Đọc theo trang thì dùng page_to_dict / page_to_json
+        """
+        if self.tip_hash is None:
+            return []
+        return self.tree.path_to(self.tip_hash)
         
     def add_block(self, block: Block):
         """Thêm một block vào chain này"""
-        self.chain.append(block)
+        self.tree.add_block(block)
+        self.tip_hash = block.hash
+    
+    def find_block_index(self, block_hash: str) -> Optional[int]:
+        """
+        Index của block trong chain này (None nếu block không nằm trên chain)
+        Chỉ đi ngược từ tip tới độ cao của block, chi phí tỉ lệ với khoảng cách tới tip
+        """
+        if self.tip_hash is None:
+            return None
+        try:
+            index = self.tree.height(block_hash)
+        except KeyError:
+            return None
+        path = _ChainPath(self.tree, self.tip_hash)
+        return index if index < len(path) and path[index].hash == block_hash else None
         
     def get_length(self) -> int:
         """Lấy độ dài của chain này"""
-        return len(self.chain)
+        return self.tree.height(self.tip_hash) + 1 if self.tip_hash is not None else 0
     
     def get_last_block(self) -> Optional[Block]:
         """Lấy block cuối cùng trong chain"""
-        return self.chain[-1] if self.chain else None
+        return self.tree.get(self.tip_hash) if self.tip_hash is not None else None
+    
+    def validate(self, check_pow: bool = False, processes: Optional[int] = None) -> Dict:
+        """
+        Kiểm tra hash và liên kết của chain (xem chain_validation.validate_chain)
+        Block mô phỏng fork không được đào thật nên mặc định không kiểm tra proof-of-work
+        """
+        return validate_chain(self.chain, check_pow=check_pow, processes=processes)
+    
+    def fork(self, name: str) -> 'Blockchain':
+        """Tạo nhánh mới dùng chung toàn bộ block hiện tại của chain này"""
+        return Blockchain(name, self.tree, self.tip_hash)
     
     def to_dict(self) -> Dict:
         """Chuyển đổi blockchain sang dictionary"""
@@ -28,27 +122,133 @@ class Blockchain:
             'length': self.get_length(),
             'blocks': [block.to_dict() for block in self.chain]
         }
+    
+    def to_json(self, blocks: Optional[List[Block]] = None, pagination: Optional[Dict] = None) -> bytes:
+        """JSON (bytes) của chain, ghép từ JSON cache của từng block"""
+        header = {'name': self.name, 'length': self.get_length()}
+        if pagination is not None:
+            header['pagination'] = pagination
+        blocks = self.chain if blocks is None else blocks
+        return (
+            json.dumps(header, separators=(',', ':')).encode()[:-1]
+            + b',"blocks":[' + b','.join(block.to_json() for block in blocks) + b']}'
+        )
+    
+    def page_to_json(self, start: Optional[int] = None, limit: Optional[int] = None,
+                     since_hash: Optional[str] = None, tip_only: bool = False,
+                     missing_ok: bool = False) -> bytes:
+        """Như page_to_dict nhưng trả về JSON (bytes) ghép từ cache"""
+        blocks, pagination = page_blocks(
+            _ChainPath(self.tree, self.tip_hash), self.find_block_index,
+            start, limit, since_hash, tip_only, missing_ok
+        )
+        return self.to_json(blocks, pagination)
+    
+    def page_to_dict(self, start: Optional[int] = None, limit: Optional[int] = None,
+                     since_hash: Optional[str] = None, tip_only: bool = False,
+                     missing_ok: bool = False) -> Dict:
+        """Chuyển đổi một trang block của chain sang dictionary (xem chain_query.page_blocks)"""
+        blocks, pagination = page_blocks(
+            _ChainPath(self.tree, self.tip_hash), self.find_block_index,
+            start, limit, since_hash, tip_only, missing_ok
+        )
+        return {
+            'name': self.name,
+            'length': self.get_length(),
+            'blocks': [block.to_dict() for block in blocks],
+            'pagination': pagination
+        }
+    
+    def segment_to_dict(self, ancestor_hash: str) -> Dict:
+        """Chỉ serialize đoạn rẽ nhánh sau ancestor_hash (dùng cho sự kiện fork)"""
+        return {
+            'name': self.name,
+            'length': self.get_length(),
+            'blocks': [block.to_dict() for block in self.tree.segment(self.tip_hash, ancestor_hash)]
+        }
 
 
 class ForkResolutionSimulator:
     """Mô phỏng giải quyết fork sử dụng Longest Chain Rule"""
-    def __init__(self):
+    def __init__(self, storage=None, seed: Optional[int] = None, clock=None):
+        # storage (tuỳ chọn): lưu bền vững mọi block của block tree, vd. chain_storage.SegmentLogStore
+        self.storage = storage
+        # Nguồn ngẫu nhiên có seed (độ trễ mạng, nonce, số block thêm) và đồng hồ cho timestamp
+        self.streams = RandomStreams(seed)
+        self.rng = self.streams.stream('fork')
+        self.clock = clock if clock is not None else SYSTEM_CLOCK
+        self.tree = ForkChoice()
         self.blockchains: List[Blockchain] = []
+        self.difficulty = 4  # Độ khó gán cho các block mô phỏng (quyết định công việc của block)
         self.network_latency_min = 0.5  # giây
         self.network_latency_max = 2.0  # giây
         self.fork_events: List[Dict] = []
+        # Khoá đọc/ghi cho truy cập đồng thời: caller giữ lock.read() khi đọc, lock.write() khi thay đổi
+        self.lock = ReadWriteLock()
+    
+    def __getstate__(self):
+        # Khoá không pickle được, tạo lại khi nạp
+        state = self.__dict__.copy()
+        del state['lock']
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = ReadWriteLock()
         
     def create_initial_chain(self):
         """Tạo blockchain ban đầu với genesis block"""
-        chain = Blockchain("Main Chain")
-        genesis = Block(0, time.time(), "Genesis Block", "0")
+        if self.storage is not None:
+            self.storage.clear()
+        self.tree = ForkChoice(self.storage)
+        chain = Blockchain("Main Chain", self.tree)
+        genesis = Block(0, self.clock.time(), "Genesis Block", "0", target=difficulty_to_target(self.difficulty))
         chain.add_block(genesis)
         self.blockchains = [chain]
         return chain
     
+    def load_from_storage(self) -> bool:
+        """
+        Dựng lại block tree từ storage (nếu có dữ liệu), chain chính là tip nặng nhất
+        Chỉ trạng thái tip đã lưu được nạp, các block cũ được đọc từ storage khi cần
+        Trả về True nếu đã nạp được chain
+        """
+        if self.storage is None or not self.storage:
+            return False
+        self.tree = ForkChoice.from_storage(self.storage)
+        self.blockchains = [Blockchain("Main Chain", self.tree, self.tree.best_tip)]
+        return True
+    
+    @property
+    def seed(self) -> int:
+        """Seed của lần chạy hiện tại"""
+        return self.streams.seed
+    
     def simulate_network_latency(self) -> float:
         """Mô phỏng độ trễ mạng ngẫu nhiên"""
-        return random.uniform(self.network_latency_min, self.network_latency_max)
+        return self.rng.uniform(self.network_latency_min, self.network_latency_max)
+    
+    def simulate_network(self, duration: float = 3600.0, max_events: int = 5000000,
+                         **network_options) -> Dict:
+        """
+        Mô phỏng lan truyền block trên mạng nhiều node bằng sự kiện rời rạc
+        Fork xuất hiện tự nhiên do độ trễ mạng; trả về tỉ lệ stale/orphan và reorg
+        network_options được chuyển cho NetworkSimulator (num_nodes, block_interval, ...)
+        Không truyền seed thì mỗi lần chạy lấy seed kế tiếp từ stream 'network' của simulator (next_network_seed)
+        """
+        if network_options.get('seed') is None:
+            network_options['seed'] = self.next_network_seed()
+        network = NetworkSimulator(
+            latency_min=network_options.pop('latency_min', self.network_latency_min),
+            latency_max=network_options.pop('latency_max', self.network_latency_max),
+            difficulty=self.difficulty,
+            **network_options
+        )
+        return network.run(duration, max_events)
+    
+    def next_network_seed(self) -> int:
+        """Seed cho lần mô phỏng mạng tiếp theo (lấy từ stream 'network', cần giữ khoá ghi)"""
+        return self.streams.stream('network').getrandbits(64)
     
     def simulate_fork_scenario(self) -> Dict:
         """
@@ -60,70 +260,79 @@ class ForkResolutionSimulator:
         
         main_chain = self.blockchains[0]
         last_block = main_chain.get_last_block()
+        target = difficulty_to_target(self.difficulty)
         
         # Mô phỏng hai miner tạo block gần như cùng lúc
+        now = self.clock.time()
         miner_a_delay = self.simulate_network_latency()
         miner_b_delay = self.simulate_network_latency()
         
         # Cả hai miner đều bắt đầu từ cùng một block trước đó
         block_a = Block(
-            index=len(main_chain.chain),
-            timestamp=time.time() + miner_a_delay,
+            index=main_chain.get_length(),
+            timestamp=now + miner_a_delay,
             data=f"Block by Miner A (delay: {miner_a_delay:.2f}s)",
             previous_hash=last_block.hash,
-            nonce=random.randint(1000, 9999)
+            nonce=self.rng.randint(1000, 9999),
+            target=target
         )
         
         block_b = Block(
-            index=len(main_chain.chain),
-            timestamp=time.time() + miner_b_delay,
+            index=main_chain.get_length(),
+            timestamp=now + miner_b_delay,
             data=f"Block by Miner B (delay: {miner_b_delay:.2f}s)",
             previous_hash=last_block.hash,
-            nonce=random.randint(1000, 9999)
+            nonce=self.rng.randint(1000, 9999),
+            target=target
         )
         
-        # Tạo hai nhánh fork
-        fork_a = Blockchain("Fork A")
-        fork_a.chain = main_chain.chain.copy()
+        # Tạo hai nhánh fork (dùng chung phần tổ tiên trong block tree)
+        fork_a = main_chain.fork("Fork A")
         fork_a.add_block(block_a)
         
-        fork_b = Blockchain("Fork B")
-        fork_b.chain = main_chain.chain.copy()
+        fork_b = main_chain.fork("Fork B")
         fork_b.add_block(block_b)
         
         # Thêm ngẫu nhiên thêm block vào mỗi fork để tạo độ dài khác nhau
         # Điều này mô phỏng việc tiếp tục đào trên cả hai nhánh
-        additional_blocks_a = random.randint(0, 2)
-        additional_blocks_b = random.randint(0, 2)
+        additional_blocks_a = self.rng.randint(0, 2)
+        additional_blocks_b = self.rng.randint(0, 2)
         
         for i in range(additional_blocks_a):
             last = fork_a.get_last_block()
             new_block = Block(
-                index=len(fork_a.chain),
-                timestamp=time.time() + self.simulate_network_latency(),
+                index=fork_a.get_length(),
+                timestamp=now + self.simulate_network_latency(),
                 data=f"Additional block {i+1} on Fork A",
                 previous_hash=last.hash,
-                nonce=random.randint(1000, 9999)
+                nonce=self.rng.randint(1000, 9999),
+                target=target
             )
             fork_a.add_block(new_block)
         
         for i in range(additional_blocks_b):
             last = fork_b.get_last_block()
             new_block = Block(
-                index=len(fork_b.chain),
-                timestamp=time.time() + self.simulate_network_latency(),
+                index=fork_b.get_length(),
+                timestamp=now + self.simulate_network_latency(),
                 data=f"Additional block {i+1} on Fork B",
                 previous_hash=last.hash,
-                nonce=random.randint(1000, 9999)
+                nonce=self.rng.randint(1000, 9999),
+                target=target
             )
             fork_b.add_block(new_block)
         
         self.blockchains = [fork_a, fork_b]
         
+        # Sự kiện fork chỉ ghi lại điểm rẽ nhánh và đoạn block khác nhau của mỗi nhánh
         fork_event = {
-            'timestamp': time.time(),
-            'fork_a': fork_a.to_dict(),
-            'fork_b': fork_b.to_dict(),
+            'timestamp': now,
+            'fork_point': {
+                'index': last_block.index,
+                'hash': last_block.hash
+            },
+            'fork_a': fork_a.segment_to_dict(last_block.hash),
+            'fork_b': fork_b.segment_to_dict(last_block.hash),
             'miner_a_delay': round(miner_a_delay, 2),
             'miner_b_delay': round(miner_b_delay, 2),
             'additional_blocks_a': additional_blocks_a,
@@ -137,26 +346,50 @@ class ForkResolutionSimulator:
     def apply_longest_chain_rule(self) -> Dict:
         """
         Áp dụng Longest Chain Rule để giải quyết fork
-        Chain có nhiều block nhất (công việc tích lũy nhiều nhất) trở thành chain chính
+        Chain có công việc tích lũy nhiều nhất (tính theo độ khó của từng block) trở thành chain chính
+        Công việc tích lũy được fork choice duy trì sẵn nên không phải duyệt lại các chain
+        Kết quả chỉ gồm tip mới và các đoạn block bị bỏ / được nối, cả chain lấy qua /api/fork/chains
         """
         if len(self.blockchains) < 2:
             return {
                 'error': 'Không có fork để giải quyết. Vui lòng tạo fork trước.'
             }
         
-        # Tìm chain dài nhất
-        longest_chain = max(self.blockchains, key=lambda bc: bc.get_length())
+        # Ưu tiên tip tốt nhất của fork choice (bằng công việc thì nhánh thấy trước thắng)
+        best_tip = self.tree.best_tip
+        longest_chain = next(
+            (chain for chain in self.blockchains if chain.tip_hash == best_tip),
+            None
+        ) or max(self.blockchains, key=lambda bc: self.tree.cumulative_work(bc.tip_hash))
         
         # Tìm tất cả các chain và độ dài của chúng để so sánh
         chains_info = [
             {
                 'name': chain.name,
                 'length': chain.get_length(),
+                'cumulative_work': self.tree.cumulative_work(chain.tip_hash),
                 'is_winner': chain == longest_chain
             }
             for chain in self.blockchains
         ]
         
+        # Reorg từ mỗi nhánh bị loại sang chain thắng: chỉ đi ngược tới tổ tiên chung,
+        # chi phí tỉ lệ với độ sâu reorg chứ không phải độ dài chain
+        reorgs = []
+        for chain in self.blockchains:
+            if chain is longest_chain:
+                continue
+            ancestor = self.tree.common_ancestor(chain.tip_hash, longest_chain.tip_hash)
+            disconnected = self.tree.segment(chain.tip_hash, ancestor)
+            reorgs.append({
+                'chain': chain.name,
+                'common_ancestor': ancestor,
+                'depth': len(disconnected),
+                'disconnected': [block.to_dict() for block in disconnected],
+                'connected': [block.to_dict() for block in self.tree.segment(longest_chain.tip_hash, ancestor)]
+            })
+        reorg_depth = max((reorg['depth'] for reorg in reorgs), default=0)
+        
         # Đặt chain dài nhất làm chain chính
         self.blockchains = [longest_chain]
         longest_chain.name = "Main Chain (Resolved)"
@@ -164,8 +397,11 @@ class ForkResolutionSimulator:
         result = {
             'winner': longest_chain.name,
             'winner_length': longest_chain.get_length(),
+            'winner_work': self.tree.cumulative_work(longest_chain.tip_hash),
+            'tip_hash': longest_chain.tip_hash,
+            'reorg_depth': reorg_depth,
+            'reorgs': reorgs,
             'chains_compared': chains_info,
-            'resolved_chain': longest_chain.to_dict(),
             'resolution_rule': 'Longest Chain Rule',
             'explanation': f'Chain có {longest_chain.get_length()} blocks được chọn vì có nhiều proof-of-work tích lũy nhất'
         }
@@ -176,12 +412,51 @@ class ForkResolutionSimulator:
         """Lấy thông tin về tất cả các chain hiện tại"""
         return [chain.to_dict() for chain in self.blockchains]
     
+    def get_all_chains_json(self) -> bytes:
+        """Như get_all_chains nhưng trả về mảng JSON (bytes) ghép từ cache của block"""
+        return b'[' + b','.join(chain.to_json() for chain in self.blockchains) + b']'
+    
+    def get_chains_page_json(self, start: Optional[int] = None, limit: Optional[int] = None,
+                             since_hash: Optional[str] = None, tip_only: bool = False) -> bytes:
+        """Như get_chains_page nhưng trả về mảng JSON (bytes) ghép từ cache của block"""
+        self._check_since(since_hash)
+        return b'[' + b','.join(
+            chain.page_to_json(start, limit, since_hash, tip_only, missing_ok=True)
+            for chain in self.blockchains
+        ) + b']'
+    
+    def get_chains_page(self, start: Optional[int] = None, limit: Optional[int] = None,
+                        since_hash: Optional[str] = None, tip_only: bool = False) -> List[Dict]:
+        """
+        Lấy một trang block của mỗi chain hiện tại
+        since_hash được tra riêng trên từng chain: chain không chứa nó trả về trang rỗng
+        có pagination.since_missing; KeyError chỉ khi không chain nào chứa since_hash
+        """
+        self._check_since(since_hash)
+        return [
+            chain.page_to_dict(start, limit, since_hash, tip_only, missing_ok=True)
+            for chain in self.blockchains
+        ]
+    
+    def _check_since(self, since_hash: Optional[str]):
+        if since_hash is not None and since_hash not in self.tree:
+            raise KeyError(f"Không tìm thấy block {since_hash}")
+    
+    def validate_chains(self, processes: Optional[int] = None) -> List[Dict]:
+        """Kiểm tra tất cả các chain hiện tại"""
+        return [dict(chain.validate(processes=processes), name=chain.name) for chain in self.blockchains]
+    
     def get_fork_history(self) -> List[Dict]:
         """Lấy lịch sử của tất cả các sự kiện fork"""
         return self.fork_events
     
-    def reset(self):
-        """Reset simulator"""
+    def reset(self, seed: Optional[int] = None):
+        """
+        Reset simulator
+        seed: seed cho lần chạy mới (None = seed ngẫu nhiên mới)
+        """
+        self.streams = RandomStreams(seed)
+        self.rng = self.streams.stream('fork')
         self.blockchains = []
         self.fork_events = []
         self.create_initial_chain()
@@ -0,0 +1,254 @@
+import bisect
+import cProfile
+import io
+import itertools
+import math
+import os
+import pstats
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+# Bucket mặc định cho histogram thời gian (giây)
+DEFAULT_TIME_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# Bucket cho histogram kích thước response (bytes)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+# Số kết quả profile gần nhất được giữ lại
+DEFAULT_PROFILE_RETENTION = 20
+
+
+def _format_value(value: float) -> str:
+    if value == math.inf:
+        return '+Inf'
+    if float(value).is_integer():
+        return str(int(value))
+    return repr(float(value))
+
+
+def _escape(value: str) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = '') -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class _Metric:
+    """Phần chung của các loại metric: tên, mô tả, nhãn và khoá"""
+    kind = ''
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help_text
+        self.label_names = tuple(labels)
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict) -> Tuple:
+        return tuple(str(labels.get(name, '')) for name in self.label_names)
+
+    def header(self) -> List[str]:
+        return [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+
+
+class Counter(_Metric):
+    """Bộ đếm chỉ tăng"""
+    kind = 'counter'
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()):
+        super().__init__(name, help_text, labels)
+        self._values: Dict[Tuple, float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0)
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}" for key, value in items
+        ]
+
+
+class Gauge(_Metric):
+    """Giá trị tức thời; có thể lấy từ callback tại thời điểm xuất (gauge không nhãn)"""
+    kind = 'gauge'
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (),
+                 callback: Optional[Callable[[], float]] = None):
+        super().__init__(name, help_text, labels)
+        self.callback = callback
+        self._values: Dict[Tuple, float] = {}
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def render(self) -> List[str]:
+        if self.callback is not None:
+            items = [((), self.callback())]
+        else:
+            with self._lock:
+                items = sorted(self._values.items())
+        return self.header() + [
+            f"{self.name}{_format_labels(self.label_names, key)} {_format_value(value)}" for key, value in items
+        ]
+
+
+class Histogram(_Metric):
+    """Histogram với các bucket cố định (đếm tích luỹ theo kiểu Prometheus khi xuất)"""
+    kind = 'histogram'
+
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_TIME_BUCKETS):
+        super().__init__(name, help_text, labels)
+        self.buckets = tuple(sorted(buckets))
+        self._values: Dict[Tuple, List] = {}  # key -> [đếm theo bucket..., đếm > bucket cuối, tổng]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            state[index] += 1
+            state[-1] += value
+
+    def count(self, **labels) -> int:
+        state = self._values.get(self._key(labels))
+        return sum(state[:-1]) if state else 0
+
+    def render(self) -> List[str]:
+        with self._lock:
+            items = sorted((key, list(state)) for key, state in self._values.items())
+        lines = self.header()
+        for key, state in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (math.inf,), state[:-1]):
+                cumulative += count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, key, le)} {cumulative}")
+            labels = _format_labels(self.label_names, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(state[-1])}")
+            lines.append(f"{self.name}_count{labels} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """
+    Tập các metric của tiến trình, xuất theo định dạng text của Prometheus
+    Khi enabled = False, code đo chỉ tốn một lần kiểm tra thuộc tính (if METRICS.enabled)
+    """
+    def __init__(self, enabled: bool = True):
+        self.enabled = enabled
+        self._metrics: 'OrderedDict[str, _Metric]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _register(self, metric: _Metric) -> _Metric:
+        with self._lock:
+            existing = self._metrics.get(metric.name)
+            if existing is not None:
+                return existing
+            self._metrics[metric.name] = metric
+            return metric
+
+    def counter(self, name: str, help_text: str, labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter(name, help_text, labels))
+
+    def gauge(self, name: str, help_text: str, labels: Sequence[str] = (),
+              callback: Optional[Callable[[], float]] = None) -> Gauge:
+        return self._register(Gauge(name, help_text, labels, callback))
+
+    def histogram(self, name: str, help_text: str, labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_TIME_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, labels, buckets))
+
+    def render(self) -> str:
+        """Toàn bộ metric theo định dạng text exposition của Prometheus"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+# Registry dùng chung của tiến trình; tắt bằng biến môi trường METRICS_ENABLED=0
+METRICS = MetricsRegistry(enabled=os.environ.get('METRICS_ENABLED', '1') != '0')
+
+# Metric của các đường nóng trong simulator
+# Registry dùng chung cho mọi phiên nên nhãn chỉ lấy từ tập giá trị cố định (backend, outcome, mode...),
+# không dùng tên miner / validator do client đặt (số chuỗi nhãn sẽ tăng không giới hạn và trộn lẫn giữa các phiên)
+POW_HASHES = METRICS.counter('pow_hashes_total', 'Số hash đã thử (mọi miner, mọi phiên) theo backend', ('backend',))
+POW_HASH_SECONDS = METRICS.counter('pow_hash_seconds_total',
+                                   'Thời gian đào (giây, cộng dồn của các miner) theo backend', ('backend',))
+POW_RACES = METRICS.counter('pow_races_total', 'Số cuộc đua đào theo kết quả (ok, timeout, stale)',
+                            ('backend', 'outcome'))
+POW_RACE_DURATION = METRICS.histogram('pow_race_duration_seconds', 'Thời gian một cuộc đua đào (giây, đồng hồ thật)',
+                                      ('backend',))
+POS_VALIDATIONS = METRICS.counter('pos_validations_total', 'Số vòng validation PoS (sequential / vectorized / epoch)',
+                                  ('mode',))
+POS_BATCH_DURATION = METRICS.histogram('pos_batch_duration_seconds',
+                                       'Thời gian một lần chạy nhiều vòng validation PoS (giây)', ('mode',))
+POS_BATCH_ROUNDS = METRICS.counter('pos_batch_rounds_total', 'Số vòng đã chạy trong các lần chạy nhiều vòng',
+                                   ('mode',))
+
+
+def record_mining(backend: str, attempts: int, elapsed: float):
+    """Ghi nhận một lần đào của một miner (kể cả khi bị dừng vì thua cuộc đua)"""
+    POW_HASHES.inc(attempts, backend=backend)
+    POW_HASH_SECONDS.inc(elapsed, backend=backend)
+
+
+class RequestProfiler:
+    """
+    Hook profiling: chạy một request dưới cProfile và giữ lại kết quả (pstats dạng text) theo id
+    Mỗi lúc chỉ profile một request (cProfile không chạy lồng nhau được)
+    """
+    def __init__(self, retention: int = DEFAULT_PROFILE_RETENTION):
+        self.retention = retention
+        self._results: 'OrderedDict[str, str]' = OrderedDict()
+        self._active = threading.Lock()
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+
+    def start(self) -> Optional[cProfile.Profile]:
+        """Bắt đầu profile request hiện tại; None nếu đang có request khác được profile"""
+        if not self._active.acquire(blocking=False):
+            return None
+        profiler = cProfile.Profile()
+        profiler.enable()
+        return profiler
+
+    def stop(self, profiler: cProfile.Profile, label: str, sort: str = 'cumulative', limit: int = 50) -> str:
+        """Dừng profile, lưu bảng thống kê và trả về id của kết quả"""
+        profiler.disable()
+        self._active.release()
+        output = io.StringIO()
+        output.write(f"{label}\n\n")
+        pstats.Stats(profiler, stream=output).sort_stats(sort).print_stats(limit)
+        with self._lock:
+            profile_id = f"profile-{next(self._ids)}"
+            self._results[profile_id] = output.getvalue()
+            while len(self._results) > self.retention:
+                self._results.popitem(last=False)
+        return profile_id
+
+    def get(self, profile_id: str) -> Optional[str]:
+        with self._lock:
+            return self._results.get(profile_id)
+
+    def list_ids(self) -> List[str]:
+        with self._lock:
+            return list(reversed(self._results))
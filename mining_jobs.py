@@ -0,0 +1,222 @@
+import itertools
+import threading
+import time
+from collections import OrderedDict, deque
+from typing import Callable, Deque, Dict, List, Optional
+
+# Số job chưa xong tối đa của tất cả các phiên
+DEFAULT_QUEUE_SIZE = 100
+
+# Số job chưa xong tối đa của một phiên (owner)
+DEFAULT_OWNER_QUEUE_SIZE = 10
+
+# Số thread nền chạy các cuộc đua
+DEFAULT_WORKERS = 2
+
+# Số job (kể cả đã xong) được giữ lại để client tra cứu kết quả
+DEFAULT_RETAINED_JOBS = 1000
+
+# Trạng thái của một job
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+
+class QueueFullError(Exception):
+    """Hàng đợi job đã đầy, client cần thử lại sau"""
+
+
+class MiningJob:
+    """Một yêu cầu đào count block, được chạy nền bởi MiningScheduler"""
+    def __init__(self, job_id: str, count: int, owner: Optional[str] = None,
+                 simulator=None, on_result: Optional[Callable[[Dict], None]] = None):
+        self.id = job_id
+        self.count = count
+        self.owner = owner  # Phiên (session) đã gửi job, None = dùng chung
+        self.simulator = simulator
+        self.on_result = on_result
+        self.status = JOB_QUEUED
+        self.results: List[Dict] = []
+        self.error: Optional[str] = None
+        self.submitted_at = time.time()
+        self.started_at: Optional[float] = None
+        self.finished_at: Optional[float] = None
+        self._finished = threading.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self._finished.is_set()
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Chờ job kết thúc (tối đa timeout giây), trả về True nếu đã xong"""
+        return self._finished.wait(timeout)
+
+    def to_dict(self) -> Dict:
+        """Chuyển đổi job sang dictionary"""
+        return {
+            'id': self.id,
+            'status': self.status,
+            'count': self.count,
+            'completed': len(self.results),
+            'results': list(self.results),
+            'error': self.error,
+            'submitted_at': self.submitted_at,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at
+        }
+
+
+class MiningScheduler:
+    """
+    Chạy các cuộc đua đào trên các thread nền thay vì trong request Flask
+    - Mỗi owner (phiên) có hàng đợi job riêng; submit() trả về ngay, vượt owner_queue_size job chưa xong
+      của owner hoặc queue_size job chưa xong của tất cả owner thì báo QueueFullError
+    - workers thread lấy việc xoay vòng giữa các owner, mỗi lần một cuộc đua: job lớn của một phiên
+      không chặn job của phiên khác
+    - Job của cùng một owner chạy lần lượt (không bao giờ hai cuộc đua cùng lúc trên một chain)
+    - Job chạy trên simulator truyền vào submit(), nếu không có thì gọi get_simulator()
+    - on_result (của job, hoặc mặc định của scheduler) được gọi với kết quả của từng cuộc đua
+    """
+    def __init__(self, get_simulator: Optional[Callable] = None, queue_size: int = DEFAULT_QUEUE_SIZE,
+                 retained_jobs: int = DEFAULT_RETAINED_JOBS,
+                 on_result: Optional[Callable[[Dict], None]] = None,
+                 owner_queue_size: int = DEFAULT_OWNER_QUEUE_SIZE, workers: int = DEFAULT_WORKERS):
+        if workers <= 0:
+            raise ValueError("workers phải lớn hơn 0")
+        self.get_simulator = get_simulator
+        self.on_result = on_result
+        self.retained_jobs = retained_jobs
+        self.queue_size = queue_size
+        self.owner_queue_size = owner_queue_size
+        self.workers = workers
+        self._pending: Dict[Optional[str], Deque[MiningJob]] = {}  # owner -> job chưa xong (job đầu đang chạy)
+        self._ready: Deque[Optional[str]] = deque()  # owner có việc và không có cuộc đua nào đang chạy
+        self._unfinished = 0
+        self._queued = 0  # Job chưa bắt đầu chạy
+        self._jobs: 'OrderedDict[str, MiningJob]' = OrderedDict()
+        self._lock = threading.Lock()
+        self._work_available = threading.Condition(self._lock)
+        self._ids = itertools.count(1)
+        self._threads: List[threading.Thread] = []
+
+    def submit(self, count: int = 1, simulator=None, owner: Optional[str] = None,
+               on_result: Optional[Callable[[Dict], None]] = None) -> MiningJob:
+        """Tạo job đào count block và xếp hàng, trả về job ngay lập tức"""
+        with self._lock:
+            pending = self._pending.get(owner)
+            if pending is not None and len(pending) >= self.owner_queue_size:
+                raise QueueFullError("Phiên này đã có quá nhiều job đào chưa xong, vui lòng thử lại sau")
+            if self._unfinished >= self.queue_size:
+                raise QueueFullError("Hàng đợi đào đã đầy, vui lòng thử lại sau")
+            job = MiningJob(f"job-{next(self._ids)}", count, owner, simulator,
+                            on_result if on_result is not None else self.on_result)
+            if pending is None:
+                pending = self._pending[owner] = deque()
+                self._ready.append(owner)
+                self._work_available.notify()
+            pending.append(job)
+            self._unfinished += 1
+            self._queued += 1
+            self._jobs[job.id] = job
+            self._evict_finished()
+            self._ensure_workers()
+        return job
+
+    def get(self, job_id: str) -> Optional[MiningJob]:
+        """Tìm job theo id (None nếu không có hoặc đã bị xoá khỏi danh sách lưu)"""
+        with self._lock:
+            return self._jobs.get(job_id)
+
+    def list_jobs(self, limit: int = 20, owner: Optional[str] = None) -> List[Dict]:
+        """Các job gần nhất (mới nhất trước) của owner, không kèm kết quả từng block"""
+        with self._lock:
+            jobs = [job for job in self._jobs.values() if job.owner == owner]
+            jobs = jobs[-limit:] if limit > 0 else []
+        summaries = []
+        for job in reversed(jobs):
+            summary = job.to_dict()
+            del summary['results']
+            summaries.append(summary)
+        return summaries
+
+    def is_busy(self, owner: str) -> bool:
+        """owner còn job đang chờ hoặc đang chạy không"""
+        with self._lock:
+            return any(job.owner == owner and not job.finished for job in self._jobs.values())
+
+    def stats(self) -> Dict:
+        """Thống kê hàng đợi"""
+        with self._lock:
+            return {
+                'queued': self._queued,
+                'unfinished': self._unfinished,
+                'queue_size': self.queue_size,
+                'owner_queue_size': self.owner_queue_size,
+                'active_owners': len(self._pending),
+                'workers': self.workers,
+                'retained_jobs': len(self._jobs)
+            }
+
+    def _evict_finished(self):
+        """Bỏ các job cũ nhất đã xong khi vượt quá retained_jobs"""
+        while len(self._jobs) > self.retained_jobs:
+            oldest_id, oldest = next(iter(self._jobs.items()))
+            if not oldest.finished:
+                break
+            del self._jobs[oldest_id]
+
+    def _ensure_workers(self):
+        """Khởi động đủ workers thread nền (gọi khi đang giữ _lock)"""
+        self._threads = [thread for thread in self._threads if thread.is_alive()]
+        while len(self._threads) < self.workers:
+            thread = threading.Thread(target=self._run, name=f'mining-scheduler-{len(self._threads)}', daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def _run(self):
+        """Vòng lặp của thread nền: lấy owner kế tiếp theo vòng, chạy một cuộc đua của job đầu tiên của nó"""
+        while True:
+            with self._work_available:
+                while not self._ready:
+                    self._work_available.wait()
+                owner = self._ready.popleft()
+                job = self._pending[owner][0]
+                if job.status == JOB_QUEUED:
+                    job.status = JOB_RUNNING
+                    job.started_at = time.time()
+                    self._queued -= 1
+            finished = self._step(job)
+            with self._work_available:
+                pending = self._pending[owner]
+                if finished:
+                    pending.popleft()
+                    self._unfinished -= 1
+                    job._finished.set()
+                if pending:
+                    self._ready.append(owner)
+                    self._work_available.notify()
+                else:
+                    del self._pending[owner]
+
+    def _step(self, job: MiningJob) -> bool:
+        """Chạy cuộc đua kế tiếp của job; trả về True nếu job đã kết thúc (xong hoặc lỗi)"""
+        try:
+            if job.simulator is None:
+                job.simulator = self.get_simulator()
+            if len(job.results) < job.count:
+                result = job.simulator.simulate_mining_race()
+                job.results.append(result)
+                if job.on_result is not None:
+                    job.on_result(result)
+            if len(job.results) < job.count:
+                return False
+            job.status = JOB_DONE
+        except Exception as e:
+            job.error = str(e)
+            job.status = JOB_FAILED
+        job.finished_at = time.time()
+        # Không giữ simulator / callback của phiên sau khi xong
+        job.simulator = None
+        job.on_result = None
+        return True
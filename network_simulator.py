@@ -0,0 +1,211 @@
+import heapq
+import itertools
+import random
+from typing import Dict, List, Optional
+from pow_simulator import Block, difficulty_to_target
+from fork_choice import ForkChoice
+
+
+class Node:
+    """Một node trong mạng: chỉ giữ tập block đã biết và tip tốt nhất của nó"""
+    def __init__(self, node_id: int, hash_power: float):
+        self.node_id = node_id
+        self.hash_power = hash_power
+        self.peers: List[int] = []
+        self.link_latency: List[float] = []  # Độ trễ cơ sở tới từng peer (giây)
+        self.known = set()
+        self.waiting: Dict[str, List[Block]] = {}  # hash block cha -> các block con đến trước
+        self.pending = set()  # Hash các block đang nằm trong waiting (chưa có block cha)
+        self.best_tip: Optional[str] = None
+        self.blocks_mined = 0
+        self.reorgs = 0
+        self.max_reorg_depth = 0
+
+
+class NetworkSimulator:
+    """
+    Mô phỏng mạng PoW bằng sự kiện rời rạc (discrete-event) trên đồng hồ ảo
+    - Hàng đợi ưu tiên chứa hai loại sự kiện: node đào được block và block đến một node
+    - Block lan truyền qua các liên kết peer với độ trễ riêng từng liên kết
+    - Fork xuất hiện tự nhiên khi hai node đào được block trước khi nhận block của nhau
+    Không có sleep thật nên có thể mô phỏng hàng nghìn node trong hàng giờ chỉ trong vài giây
+    """
+    def __init__(self, num_nodes: int = 50, peers_per_node: int = 8,
+                 block_interval: float = 10.0, latency_min: float = 0.05,
+                 latency_max: float = 0.5, latency_jitter: float = 0.1,
+                 difficulty: int = 4, seed: Optional[int] = None):
+        if num_nodes < 2:
+            raise ValueError("Cần ít nhất 2 node")
+        if block_interval <= 0:
+            raise ValueError("block_interval phải lớn hơn 0")
+        if not 0 <= latency_min <= latency_max:
+            raise ValueError("Cần 0 <= latency_min <= latency_max")
+        if latency_jitter < 0 or peers_per_node < 0:
+            raise ValueError("latency_jitter và peers_per_node không được âm")
+        self.rng = random.Random(seed)
+        self.block_interval = block_interval  # Thời gian trung bình giữa hai block của cả mạng
+        self.latency_jitter = latency_jitter  # Trung bình phần trễ ngẫu nhiên cộng thêm mỗi lần gửi
+        self.target = difficulty_to_target(difficulty)
+        self.tree = ForkChoice()
+        self.now = 0.0
+        self.events_processed = 0
+        self.orphan_arrivals = 0  # Số lần block đến trước block cha của nó
+        self._events = []
+        self._sequence = itertools.count()
+        self._mining_scheduled = False
+        self._reach: Dict[str, List[float]] = {}  # hash -> [số node đã nhận, thời điểm node cuối nhận]
+        
+        self.nodes = [Node(i, self.rng.paretovariate(1.5)) for i in range(num_nodes)]
+        self.total_hash_power = sum(node.hash_power for node in self.nodes)
+        self._cumulative_power = list(itertools.accumulate(node.hash_power for node in self.nodes))
+        self._build_topology(min(peers_per_node, num_nodes - 1), latency_min, latency_max)
+        
+        genesis = Block(0, 0.0, "Genesis Block", "0", target=self.target)
+        self.tree.add_block(genesis)
+        for node in self.nodes:
+            node.known.add(genesis.hash)
+            node.best_tip = genesis.hash
+    
+    def _build_topology(self, peers_per_node: int, latency_min: float, latency_max: float):
+        """Nối mỗi node với một số peer ngẫu nhiên (liên kết hai chiều, cùng độ trễ)"""
+        links = set()
+        n = len(self.nodes)
+        # Vòng nối tiếp để chắc chắn mạng liên thông
+        for i in range(n):
+            links.add((min(i, (i + 1) % n), max(i, (i + 1) % n)))
+        for i in range(n):
+            for j in self.rng.sample(range(n), peers_per_node):
+                if j != i:
+                    links.add((min(i, j), max(i, j)))
+        for i, j in links:
+            latency = self.rng.uniform(latency_min, latency_max)
+            self.nodes[i].peers.append(j)
+            self.nodes[i].link_latency.append(latency)
+            self.nodes[j].peers.append(i)
+            self.nodes[j].link_latency.append(latency)
+    
+    def _schedule(self, at: float, kind: str, node_id: int, block: Optional[Block] = None):
+        heapq.heappush(self._events, (at, next(self._sequence), kind, node_id, block))
+    
+    def _schedule_next_block(self):
+        """Thời điểm block tiếp theo của cả mạng ~ Exp, node đào được chọn theo hash power"""
+        at = self.now + self.rng.expovariate(1.0 / self.block_interval)
+        pick = self.rng.random() * self.total_hash_power
+        low, high = 0, len(self._cumulative_power) - 1
+        while low < high:
+            mid = (low + high) // 2
+            if self._cumulative_power[mid] > pick:
+                high = mid
+            else:
+                low = mid + 1
+        self._schedule(at, 'mine', low)
+    
+    def _mine(self, node: Node):
+        """Node đào được block mới trên tip tốt nhất của nó"""
+        parent = self.tree.get(node.best_tip)
+        block = Block(
+            index=parent.index + 1,
+            timestamp=self.now,
+            data=f"Block by node {node.node_id}",
+            previous_hash=parent.hash,
+            nonce=self.rng.getrandbits(32),
+            target=self.target
+        )
+        node.blocks_mined += 1
+        self.tree.add_block(block)
+        self._reach[block.hash] = [0, self.now]
+        self._accept(node, block)
+    
+    def _deliver(self, node: Node, block: Block):
+        """Block đến một node qua mạng"""
+        if block.hash in node.known or block.hash in node.pending:
+            # Đã nhận (hoặc đang giữ chờ block cha) từ peer khác
+            return
+        if block.previous_hash not in node.known:
+            # Chưa có block cha: giữ lại tới khi block cha đến
+            self.orphan_arrivals += 1
+            node.pending.add(block.hash)
+            node.waiting.setdefault(block.previous_hash, []).append(block)
+            return
+        self._accept(node, block)
+    
+    def _accept(self, node: Node, block: Block):
+        """Node chấp nhận block, cập nhật tip và chuyển tiếp cho các peer"""
+        pending = [block]
+        while pending:
+            block = pending.pop()
+            node.pending.discard(block.hash)
+            node.known.add(block.hash)
+            reach = self._reach[block.hash]
+            reach[0] += 1
+            reach[1] = self.now
+            
+            work = self.tree.cumulative_work(block.hash)
+            if work > self.tree.cumulative_work(node.best_tip):
+                if block.previous_hash != node.best_tip:
+                    ancestor = self.tree.common_ancestor(node.best_tip, block.hash)
+                    depth = self.tree.height(node.best_tip) - self.tree.height(ancestor)
+                    node.reorgs += 1
+                    node.max_reorg_depth = max(node.max_reorg_depth, depth)
+                node.best_tip = block.hash
+            
+            # Chỉ gửi cho peer chưa biết block (giống cơ chế inv/getdata)
+            nodes = self.nodes
+            for peer, latency in zip(node.peers, node.link_latency):
+                if block.hash in nodes[peer].known:
+                    continue
+                delay = latency + self.rng.expovariate(1.0 / self.latency_jitter) if self.latency_jitter > 0 else latency
+                self._schedule(self.now + delay, 'deliver', peer, block)
+            
+            pending.extend(node.waiting.pop(block.hash, ()))
+    
+    def run(self, duration: float, max_events: int = 5000000) -> Dict:
+        """Chạy mô phỏng trong duration giây thời gian ảo, trả về báo cáo"""
+        end_time = self.now + duration
+        if not self._mining_scheduled:
+            self._schedule_next_block()
+            self._mining_scheduled = True
+        
+        while self._events and self._events[0][0] <= end_time and self.events_processed < max_events:
+            at, _, kind, node_id, block = heapq.heappop(self._events)
+            self.now = at
+            self.events_processed += 1
+            node = self.nodes[node_id]
+            if kind == 'mine':
+                self._mine(node)
+                self._schedule_next_block()
+            else:
+                self._deliver(node, block)
+        
+        if self.events_processed < max_events:
+            self.now = max(self.now, end_time)
+        return self.report()
+    
+    def report(self) -> Dict:
+        """Thống kê: tỉ lệ block bị bỏ (stale), block đến trước cha (orphan), reorg, độ trễ lan truyền"""
+        best_tip = self.tree.best_tip
+        canonical = {block.hash for block in self.tree.iter_ancestors(best_tip)}
+        mined = len(self.tree) - 1  # Không tính genesis
+        stale = mined - (len(canonical) - 1)
+        
+        num_nodes = len(self.nodes)
+        full_reach = [
+            last - self.tree.get(block_hash).timestamp
+            for block_hash, (count, last) in self._reach.items()
+            if count == num_nodes
+        ]
+        
+        return {
+            'simulated_time': round(self.now, 3),
+            'nodes': num_nodes,
+            'events_processed': self.events_processed,
+            'blocks_mined': mined,
+            'canonical_length': self.tree.height(best_tip) + 1,
+            'stale_blocks': stale,
+            'stale_rate': round(stale / mined * 100, 2) if mined else 0,
+            'orphan_arrivals': self.orphan_arrivals,
+            'reorgs': sum(node.reorgs for node in self.nodes),
+            'max_reorg_depth': max(node.max_reorg_depth for node in self.nodes),
+            'mean_full_propagation_time': round(sum(full_reach) / len(full_reach), 3) if full_reach else 0,
+            'nodes_on_best_tip': sum(1 for node in self.nodes if node.best_tip == best_tip)
+        }
@@ -0,0 +1,306 @@
+import time
+from typing import Dict, List, Optional, Sequence
+from sim_random import RandomStreams
+
+try:
+    import numpy as np
+except ImportError:  # numpy là tuỳ chọn; chế độ epoch cần numpy
+    np = None
+
+# Số slot trong một epoch
+DEFAULT_SLOTS_PER_EPOCH = 32
+
+# Số validator trong committee của mỗi slot (None = chia đều toàn bộ validator đang hoạt động cho các slot)
+DEFAULT_COMMITTEE_SIZE = 128
+
+# Phần thưởng mỗi nhiệm vụ, tính theo tỉ lệ stake của chính validator (được cộng dồn vào stake)
+DEFAULT_PROPOSER_REWARD = 1e-4
+DEFAULT_ATTESTER_REWARD = 1e-6
+
+# Mức phạt khi bỏ lỡ attestation (tỉ lệ stake)
+DEFAULT_MISSED_PENALTY = 1e-6
+
+# Tỉ lệ stake bị cắt khi bị slash
+DEFAULT_SLASH_FRACTION = 0.05
+
+# Số điểm tối đa của mỗi chuỗi lịch sử trong kết quả (lịch sử dài được lấy mẫu thưa lại)
+MAX_HISTORY_POINTS = 200
+
+
+def _gini(values) -> float:
+    """Hệ số Gini của phân bố stake (0 = đều tuyệt đối, 1 = dồn hết vào một validator)"""
+    if values.size == 0 or values.sum() <= 0:
+        return 0.0
+    ordered = np.sort(values)
+    n = ordered.size
+    cumulative = np.cumsum(ordered)
+    return float((n + 1 - 2 * (cumulative / cumulative[-1]).sum()) / n)
+
+
+def _top_share(values, fraction: float = 0.01) -> float:
+    """Tỉ lệ stake (%) nằm trong tay fraction validator có stake lớn nhất"""
+    if values.size == 0 or values.sum() <= 0:
+        return 0.0
+    k = max(1, int(values.size * fraction))
+    return float(np.partition(values, values.size - k)[-k:].sum() / values.sum() * 100)
+
+
+class EpochSimulator:
+    """
+    Mô phỏng PoS theo epoch cho số lượng lớn validator, toàn bộ trạng thái nằm trong mảng numpy
+    Mỗi epoch (slots_per_epoch slot) được tính theo lô:
+    - Proposer của từng slot chọn theo trọng số stake (một lần tìm kiếm nhị phân trên tổng tích luỹ cho cả epoch)
+    - Committee của từng slot lấy mẫu không hoàn lại từ các validator đang hoạt động
+      (mỗi validator attest tối đa một lần mỗi epoch)
+    - Validator online với xác suất uptime ở mỗi nhiệm vụ; proposer offline = slot bị bỏ lỡ (không có block),
+      attester offline bị phạt; attester của slot bị bỏ lỡ không được thưởng cũng không bị phạt
+    - Phần thưởng / phạt của cả epoch được gom bằng bincount và cộng dồn vào stake một lần ở cuối epoch
+    - Mỗi epoch, mỗi validator bị slash với xác suất slashing_rate: mất slash_fraction stake và bị loại;
+      validator có stake dưới min_stake cũng bị loại
+    """
+    def __init__(self, stakes: Sequence[float], slots_per_epoch: int = DEFAULT_SLOTS_PER_EPOCH,
+                 committee_size: Optional[int] = DEFAULT_COMMITTEE_SIZE,
+                 proposer_reward: float = DEFAULT_PROPOSER_REWARD, attester_reward: float = DEFAULT_ATTESTER_REWARD,
+                 missed_penalty: float = DEFAULT_MISSED_PENALTY, uptime: float = 1.0,
+                 slashing_rate: float = 0.0, slash_fraction: float = DEFAULT_SLASH_FRACTION,
+                 min_stake: float = 0.0, active: Optional[Sequence[bool]] = None, seed: Optional[int] = None):
+        if np is None:
+            raise RuntimeError("Cần cài numpy để dùng chế độ epoch")
+        if slots_per_epoch <= 0:
+            raise ValueError("slots_per_epoch phải lớn hơn 0")
+        if committee_size is not None and committee_size <= 0:
+            raise ValueError("committee_size phải lớn hơn 0")
+        if not 0 <= uptime <= 1 or not 0 <= slashing_rate <= 1 or not 0 <= slash_fraction <= 1:
+            raise ValueError("uptime, slashing_rate và slash_fraction phải nằm trong [0, 1]")
+        self.stake = np.array(stakes, dtype=np.float64)
+        if self.stake.ndim != 1 or self.stake.size == 0:
+            raise ValueError("Cần ít nhất một validator")
+        if (self.stake < 0).any():
+            raise ValueError("Stake không được âm")
+        self.slots_per_epoch = slots_per_epoch
+        self.committee_size = committee_size
+        self.proposer_reward = proposer_reward
+        self.attester_reward = attester_reward
+        self.missed_penalty = missed_penalty
+        self.uptime = uptime
+        self.slashing_rate = slashing_rate
+        self.slash_fraction = slash_fraction
+        self.min_stake = min_stake
+        self.streams = RandomStreams(seed)
+        self.rng = self.streams.numpy('epochs')
+
+        n = self.stake.size
+        self.initial_stake = self.stake.copy()
+        # active: trạng thái ban đầu (validator đã bị loại từ trước thì truyền False)
+        self.active = (self.stake > 0) & (self.stake >= min_stake)
+        if active is not None:
+            self.active &= np.asarray(active, dtype=bool)
+        # Trọng số chọn proposer: stake nếu đang hoạt động, 0 nếu không
+        self.weight = np.where(self.active, self.stake, 0.0)
+        self._active_idx: Optional[object] = None  # Chỉ số các validator đang hoạt động (tính lại khi thay đổi)
+        self._active_stake = float(self.weight.sum())
+        self.proposed = np.zeros(n, dtype=np.int64)
+        self.missed_proposals = np.zeros(n, dtype=np.int64)
+        self.attested = np.zeros(n, dtype=np.int64)
+        self.missed_attestations = np.zeros(n, dtype=np.int64)
+        self.rewards = np.zeros(n, dtype=np.float64)  # Thưởng ròng (đã trừ phạt và slash)
+        self.slashed = np.zeros(n, dtype=bool)
+
+        self.epoch = 0
+        self.slot = 0
+        self.blocks = 0
+        self.missed_slots = 0
+        self.empty_slots = 0  # Slot không có validator nào đang hoạt động
+        self.ejected = 0
+        self.elapsed = 0.0
+        # Lịch sử theo epoch: tổng stake đang hoạt động, số validator đang hoạt động
+        self.stake_history: List[float] = []
+        self.active_history: List[int] = []
+
+    @classmethod
+    def with_random_stakes(cls, num_validators: int, mean_stake: float = 32.0, seed: Optional[int] = None,
+                           **options) -> 'EpochSimulator':
+        """Tạo simulator với num_validators validator có stake phân bố log-normal (trung bình mean_stake)"""
+        if np is None:
+            raise RuntimeError("Cần cài numpy để dùng chế độ epoch")
+        if num_validators <= 0:
+            raise ValueError("num_validators phải lớn hơn 0")
+        streams = RandomStreams(seed)
+        stakes = mean_stake * streams.numpy('stakes').lognormal(-0.5, 1.0, num_validators)
+        return cls(stakes, seed=streams.seed_for('simulation'), **options)
+
+    @property
+    def num_validators(self) -> int:
+        return self.stake.size
+
+    def run_epoch(self):
+        """Chạy một epoch (slots_per_epoch slot) theo lô"""
+        slots = self.slots_per_epoch
+        rng = self.rng
+        self.epoch += 1
+        self.slot += slots
+        active_idx = self._active_indices()
+        if active_idx.size == 0:
+            self.empty_slots += slots
+            self._record_history()
+            return
+
+        # Proposer của từng slot theo trọng số stake đầu epoch
+        # (validator không hoạt động có trọng số 0 nên không bao giờ được chọn)
+        cumulative = np.cumsum(self.weight)
+        total = cumulative[-1]
+        proposers = np.searchsorted(cumulative, rng.random(slots) * total, side='right')
+        np.minimum(proposers, self.num_validators - 1, out=proposers)
+
+        # Committee: mẫu không hoàn lại từ các validator đang hoạt động, chia lần lượt cho các slot
+        if self.committee_size is None:
+            members = rng.permutation(active_idx)
+        else:
+            size = min(active_idx.size, self.committee_size * slots)
+            members = active_idx[rng.choice(active_idx.size, size=size, replace=False)]
+        member_slot = np.arange(members.size) * slots // members.size
+
+        # Nhiệm vụ nào được thực hiện (validator online)
+        if self.uptime < 1:
+            block_made = rng.random(slots) < self.uptime
+            attest_online = rng.random(members.size) < self.uptime
+        else:
+            block_made = np.ones(slots, dtype=bool)
+            attest_online = np.ones(members.size, dtype=bool)
+        producers = proposers[block_made]
+        # Slot bị bỏ lỡ (không có block): attester của slot đó không được thưởng cũng không bị phạt
+        slot_has_block = block_made[member_slot]
+        attesters = members[attest_online & slot_has_block]
+        absentees = members[~attest_online & slot_has_block]
+
+        np.add.at(self.proposed, producers, 1)
+        np.add.at(self.missed_proposals, proposers[~block_made], 1)
+        np.add.at(self.attested, attesters, 1)
+        np.add.at(self.missed_attestations, absentees, 1)
+        self.blocks += producers.size
+        self.missed_slots += slots - producers.size
+
+        # Thưởng / phạt cả epoch theo tỉ lệ stake đầu epoch, cộng dồn vào stake một lần
+        # (chỉ cập nhật các validator có nhiệm vụ trong epoch, không duyệt toàn bộ mảng)
+        duties = np.concatenate((producers, attesters, absentees))
+        rates = np.concatenate((
+            np.full(producers.size, self.proposer_reward),
+            np.full(attesters.size, self.attester_reward),
+            np.full(absentees.size, -self.missed_penalty)
+        ))
+        delta = self.stake[duties] * rates
+        np.add.at(self.stake, duties, delta)
+        np.add.at(self.rewards, duties, delta)
+        self.weight[duties] = self.stake[duties]
+        self._active_stake = float(total) + float(delta.sum())
+
+        # Slashing: số validator bị slash ~ Binomial, chọn ngẫu nhiên trong các validator đang hoạt động
+        if self.slashing_rate > 0:
+            count = rng.binomial(active_idx.size, self.slashing_rate)
+            if count:
+                victims = active_idx[rng.choice(active_idx.size, size=count, replace=False)]
+                penalty = self.stake[victims] * self.slash_fraction
+                self.stake[victims] -= penalty
+                self.rewards[victims] -= penalty
+                self.slashed[victims] = True
+                self._deactivate(victims)
+
+        # Chỉ validator bị phạt mới có thể tụt dưới min_stake
+        if self.min_stake > 0 and absentees.size:
+            low = absentees[self.active[absentees] & (self.stake[absentees] < self.min_stake)]
+            if low.size:
+                low = np.unique(low)
+                self.ejected += low.size
+                self._deactivate(low)
+
+        self._record_history()
+
+    def _deactivate(self, indices):
+        self._active_stake -= float(self.weight[indices].sum())
+        self.active[indices] = False
+        self.weight[indices] = 0.0
+        self._active_idx = None
+
+    def _record_history(self):
+        self.stake_history.append(self._active_stake)
+        self.active_history.append(int(self._active_indices().size))
+
+    def _active_indices(self):
+        """Chỉ số các validator đang hoạt động (chỉ tính lại sau khi có validator bị loại)"""
+        if self._active_idx is None:
+            self._active_idx = np.flatnonzero(self.active)
+        return self._active_idx
+
+    def run(self, epochs: int) -> Dict:
+        """Chạy thêm epochs epoch, trả về thống kê tổng hợp"""
+        if epochs < 0:
+            raise ValueError("epochs không được âm")
+        start = time.perf_counter()
+        for _ in range(epochs):
+            self.run_epoch()
+        self.elapsed += time.perf_counter() - start
+        return self.summary()
+
+    def summary(self) -> Dict:
+        """Thống kê tổng hợp của toàn bộ các epoch đã chạy"""
+        total_start = float(self.initial_stake.sum())
+        total_end = float(self.stake.sum())
+        step = max(1, len(self.stake_history) // MAX_HISTORY_POINTS)
+        return {
+            'validators': self.num_validators,
+            'active_validators': int(self.active.sum()),
+            'epochs': self.epoch,
+            'slots': self.slot,
+            'slots_per_epoch': self.slots_per_epoch,
+            'committee_size': self.committee_size,
+            'blocks_proposed': self.blocks,
+            'missed_slots': self.missed_slots,
+            'empty_slots': self.empty_slots,
+            'attestations': int(self.attested.sum()),
+            'missed_attestations': int(self.missed_attestations.sum()),
+            'slashed': int(self.slashed.sum()),
+            'ejected': self.ejected,
+            'total_stake_start': round(total_start, 6),
+            'total_stake_end': round(total_end, 6),
+            'stake_growth_percentage': round((total_end / total_start - 1) * 100, 4) if total_start > 0 else 0,
+            'gini_start': round(_gini(self.initial_stake), 4),
+            'gini_end': round(_gini(self.stake), 4),
+            'top_1pct_stake_share_start': round(_top_share(self.initial_stake), 2),
+            'top_1pct_stake_share_end': round(_top_share(self.stake), 2),
+            'elapsed': round(self.elapsed, 4),
+            'slots_per_second': round(self.slot / self.elapsed) if self.elapsed > 0 else None,
+            'history': {
+                'epoch': list(range(step, len(self.stake_history) + 1, step)),
+                'active_stake': [round(value, 6) for value in self.stake_history[step - 1::step]],
+                'active_validators': self.active_history[step - 1::step]
+            },
+            'seed': self.streams.seed
+        }
+
+    def validator_stats(self, indices: Optional[Sequence[int]] = None) -> List[Dict]:
+        """Thống kê của các validator theo vị trí (mặc định: tất cả)"""
+        if indices is None:
+            indices = range(self.num_validators)
+        return [
+            {
+                'index': int(i),
+                'stake': float(self.stake[i]),
+                'initial_stake': float(self.initial_stake[i]),
+                'blocks_proposed': int(self.proposed[i]),
+                'missed_proposals': int(self.missed_proposals[i]),
+                'attestations': int(self.attested[i]),
+                'missed_attestations': int(self.missed_attestations[i]),
+                'rewards': float(self.rewards[i]),
+                'slashed': bool(self.slashed[i]),
+                'active': bool(self.active[i])
+            }
+            for i in indices
+        ]
+
+    def top_validators(self, count: int = 10) -> List[Dict]:
+        """count validator có stake lớn nhất"""
+        count = min(count, self.num_validators)
+        if count <= 0:
+            return []
+        top = np.argpartition(self.stake, self.num_validators - count)[-count:]
+        return self.validator_stats(top[np.argsort(-self.stake[top])])
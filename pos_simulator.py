@@ -1,5 +1,19 @@
-import random
-from typing import List, Dict
+import time
+from typing import List, Dict, Optional
+from stake_index import StakeIndex
+from validation_history import ValidationHistory
+from rwlock import ReadWriteLock
+from sim_random import RandomStreams
+from pos_epoch import EpochSimulator
+from metrics import METRICS, POS_VALIDATIONS, POS_BATCH_DURATION, POS_BATCH_ROUNDS
+
+try:
+    import numpy as np
+except ImportError:  # numpy là tuỳ chọn, chỉ dùng để tăng tốc chế độ vectorized
+    np = None
+
+# Số bản ghi validation tối đa giữ trong bộ nhớ mặc định
+DEFAULT_HISTORY_LIMIT = 100000
 
 class Validator:
     """Đại diện cho một validator trong cơ chế đồng thuận PoS"""
@@ -8,6 +22,13 @@ class Validator:
         self.stake = stake
         self.blocks_validated = 0
         self.rewards = 0
+        self.active = True  # Validator bị slash / bị loại (chế độ epoch) không còn được chọn
+        self.slashed = False
+    
+    @property
+    def weight(self) -> float:
+        """Trọng số khi chọn validator: stake nếu đang hoạt động, 0 nếu đã bị loại"""
+        return self.stake if self.active else 0
         
     def to_dict(self) -> Dict:
         """Chuyển đổi validator sang dictionary"""
@@ -15,33 +36,82 @@ class Validator:
             'name': self.name,
             'stake': self.stake,
             'blocks_validated': self.blocks_validated,
-            'rewards': self.rewards
+            'rewards': self.rewards,
+            'active': self.active,
+            'slashed': self.slashed
         }
 
 
 class PoSSimulator:
     """Mô phỏng cơ chế đồng thuận Proof of Stake"""
-    def __init__(self):
+    def __init__(self, history_limit: Optional[int] = DEFAULT_HISTORY_LIMIT,
+                 history_spill_path: Optional[str] = None, seed: Optional[int] = None):
         self.validators: List[Validator] = []
-        self.validation_history: List[Dict] = []
+        # Nguồn ngẫu nhiên có seed cho việc chọn validator (cùng seed = cùng dãy validator được chọn)
+        self.streams = RandomStreams(seed)
+        self.validation_history = ValidationHistory(history_limit, history_spill_path)
+        self.total_validations = 0  # Tổng số lần validate, cập nhật tăng dần
+        self._stake_index = StakeIndex()
+        self._positions: Dict[int, int] = {}  # id(validator) -> vị trí trong danh sách
+        # Khoá đọc/ghi cho truy cập đồng thời: caller giữ lock.read() khi đọc, lock.write() khi thay đổi
+        self.lock = ReadWriteLock()
+    
+    def __getstate__(self):
+        # Khoá không pickle được; _positions dùng id() nên phải dựng lại khi nạp
+        state = self.__dict__.copy()
+        del state['lock']
+        del state['_positions']
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._positions = {id(validator): i for i, validator in enumerate(self.validators)}
+        self.lock = ReadWriteLock()
         
     def add_validator(self, name: str, stake: int):
         """Thêm một validator mới vào mạng"""
         validator = Validator(name, stake)
+        self._positions[id(validator)] = len(self.validators)
         self.validators.append(validator)
+        self._stake_index.append(stake)
+        self.validation_history.register_validator(name)
         return validator
     
+    def set_stake(self, validator: Validator, stake: int):
+        """
+        Thay đổi stake của một validator và cập nhật chỉ mục chọn trong O(log n)
+        Luôn dùng hàm này thay vì gán trực tiếp validator.stake
+        """
+        index = self._positions[id(validator)]
+        validator.stake = stake
+        self._stake_index.update(index, validator.weight)
+    
+    def rebuild_stake_index(self):
+        """Xây dựng lại chỉ mục chọn từ stake hiện tại của tất cả validators (validator bị loại có trọng số 0)"""
+        self._stake_index = StakeIndex(v.weight for v in self.validators)
+    
+    @property
+    def seed(self) -> int:
+        """Seed của lần chạy hiện tại"""
+        return self.streams.seed
+    
+    def total_stake(self) -> float:
+        """Tổng stake đang hoạt động của mạng (được chỉ mục duy trì, không cần cộng lại)"""
+        return self._stake_index.total
+    
+    def _select_index(self) -> int:
+        """Chọn vị trí validator theo trọng số stake (qua Fenwick tree, O(log n))"""
+        if not self.validators:
+            raise ValueError("Không có validator nào trong mạng")
+        return self._stake_index.select(self.streams.stream('selection'))
+    
     def weighted_random_selection(self) -> Validator:
         """
         Chọn validator bằng phương pháp weighted random selection
         Validator có stake cao hơn có xác suất được chọn cao hơn
         """
-        if not self.validators:
-            raise ValueError("Không có validator nào trong mạng")
-        
         # Sử dụng số lượng stake làm trọng số
-        stakes = [v.stake for v in self.validators]
-        selected = random.choices(self.validators, weights=stakes, k=1)[0]
+        selected = self.validators[self._select_index()]
         
         return selected
     
@@ -50,8 +120,12 @@ class PoSSimulator:
         Mô phỏng một lần validation block
         Trả về thông tin về ai đã validate và stake của họ
         """
-        selected_validator = self.weighted_random_selection()
+        index = self._select_index()
+        selected_validator = self.validators[index]
         selected_validator.blocks_validated += 1
+        self.total_validations += 1
+        if METRICS.enabled:
+            POS_VALIDATIONS.inc(mode='sequential')
         
         # Phần thưởng tỷ lệ với stake
         reward = selected_validator.stake * 0.1
@@ -61,32 +135,47 @@ class PoSSimulator:
             'validator': selected_validator.name,
             'stake': selected_validator.stake,
             'reward': round(reward, 2),
-            'total_blocks_validated': selected_validator.blocks_validated
+            'total_blocks_validated': selected_validator.blocks_validated,
+            'total_rewards': round(selected_validator.rewards, 2)
         }
         
-        self.validation_history.append(result)
+        self.validation_history.append(
+            index, selected_validator.stake, result['reward'], selected_validator.blocks_validated
+        )
         
         return result
     
-    def simulate_multiple_validations(self, count: int) -> Dict:
+    def simulate_multiple_validations(self, count: int, vectorized: bool = False) -> Dict:
         """
         Chạy nhiều vòng validation và trả về thống kê
         Được sử dụng để xác minh weighted random selection hoạt động đúng
+        vectorized=True: chọn tất cả các vòng trong một lần và cộng thưởng hàng loạt
         """
-        results = []
-        for _ in range(count):
-            result = self.simulate_validation()
-            results.append(result)
+        start = time.perf_counter()
+        if vectorized:
+            times_selected = self._simulate_validations_batch(count)
+        else:
+            selected_by_name = {}
+            for _ in range(count):
+                result = self.simulate_validation()
+                selected_by_name[result['validator']] = selected_by_name.get(result['validator'], 0) + 1
+            times_selected = [selected_by_name.get(v.name, 0) for v in self.validators]
+        if METRICS.enabled:
+            mode = 'vectorized' if vectorized else 'loop'
+            POS_BATCH_DURATION.observe(time.perf_counter() - start, mode=mode)
+            POS_BATCH_ROUNDS.inc(count, mode=mode)
         
-        # Tính toán thống kê
+        return self._build_statistics(count, times_selected)
+    
+    def _build_statistics(self, count: int, times_selected) -> Dict:
+        """Tính thống kê từ số lần được chọn của từng validator (theo vị trí)"""
         stats = {}
-        total_stake = sum(v.stake for v in self.validators)
+        total_stake = self.total_stake()
         
-        for validator in self.validators:
-            validator_results = [r for r in results if r['validator'] == validator.name]
-            count_selected = len(validator_results)
+        for i, validator in enumerate(self.validators):
+            count_selected = int(times_selected[i])
             percentage = (count_selected / count) * 100
-            expected_percentage = (validator.stake / total_stake) * 100
+            expected_percentage = (validator.weight / total_stake) * 100
             
             stats[validator.name] = {
                 'times_selected': count_selected,
@@ -102,19 +191,134 @@ class PoSSimulator:
             'validators': [v.to_dict() for v in self.validators]
         }
     
+    def _simulate_validations_batch(self, count: int) -> List[int]:
+        """
+        Chế độ vectorized: chọn validator cho cả count vòng trong một lần,
+        đếm bằng bincount và cộng blocks_validated / rewards hàng loạt
+        Trả về số lần được chọn của từng validator (theo vị trí)
+        """
+        if not self.validators:
+            raise ValueError("Không có validator nào trong mạng")
+        
+        n = len(self.validators)
+        stakes = [v.stake for v in self.validators]
+        weights = [v.weight for v in self.validators]
+        total_stake = sum(weights)
+        if total_stake <= 0:
+            raise ValueError("Tổng stake phải lớn hơn 0")
+        base_counts = [v.blocks_validated for v in self.validators]
+        
+        if np is not None:
+            probabilities = np.asarray(weights, dtype=float) / total_stake
+            selections = self.streams.numpy('selection').choice(n, size=count, p=probabilities)
+            times_selected = np.bincount(selections, minlength=n)
+            
+            # Số block đã validate tích luỹ tại từng vòng = số cũ + thứ tự lần được chọn
+            order = np.argsort(selections, kind='stable')
+            group_start = np.searchsorted(selections[order], np.arange(n))
+            rank = np.empty(count, dtype=np.int64)
+            rank[order] = np.arange(count) - group_start[selections[order]]
+            running_counts = np.asarray(base_counts)[selections] + rank + 1
+            # Các cột lịch sử giữ dạng mảng numpy: validation_history chép thẳng bytes
+            # (và chỉ giữ phần cuối nếu có giới hạn), không tạo count đối tượng Python
+            stake_column = np.asarray(stakes, dtype=float)[selections]
+            reward_column = np.round(np.asarray(stakes, dtype=float) * 0.1, 2)[selections]
+            times_selected = times_selected.tolist()
+        else:
+            selections = self.streams.stream('selection').choices(range(n), weights=weights, k=count)
+            times_selected = [0] * n
+            running_counts = []
+            for i in selections:
+                times_selected[i] += 1
+                running_counts.append(base_counts[i] + times_selected[i])
+            rewards = [round(stake * 0.1, 2) for stake in stakes]
+            stake_column = [stakes[i] for i in selections]
+            reward_column = [rewards[i] for i in selections]
+        
+        # Cộng thống kê và phần thưởng hàng loạt
+        for validator, selected in zip(self.validators, times_selected):
+            validator.blocks_validated += selected
+            validator.rewards += selected * validator.stake * 0.1
+        self.total_validations += count
+        if METRICS.enabled:
+            POS_VALIDATIONS.inc(count, mode='vectorized')
+        
+        self.validation_history.extend(selections, stake_column, reward_column, running_counts)
+        
+        return times_selected
+    
+    def simulate_epochs(self, epochs: int, num_validators: Optional[int] = None, mean_stake: float = 32.0,
+                        top: int = 10, **epoch_options) -> Dict:
+        """
+        Chế độ epoch (cần numpy): mỗi epoch gồm nhiều slot, mỗi slot có một proposer và một committee
+        lấy mẫu không hoàn lại; phần thưởng cộng dồn vào stake, có thể bật slashing và slot bị bỏ lỡ
+        epoch_options được chuyển cho EpochSimulator (slots_per_epoch, committee_size, uptime, ...)
+        - num_validators = None: chạy trên các validator hiện tại rồi ghi lại stake, số block, phần thưởng
+          và trạng thái bị slash / bị loại vào chúng (một lần ở cuối, không ghi từng slot vào validation_history);
+          validator bị loại không còn được chọn ở các lần validation sau
+        - num_validators = n: chạy trên mạng giả lập n validator (stake log-normal, trung bình mean_stake),
+          không đụng tới các validator hiện tại (đã có seed thì không cần giữ khoá ghi khi chạy)
+        Không truyền seed thì mỗi lần chạy lấy seed kế tiếp từ stream 'epochs' của simulator (next_epoch_seed)
+        """
+        if epoch_options.get('seed') is None:
+            epoch_options['seed'] = self.next_epoch_seed()
+        if num_validators is not None:
+            simulator = EpochSimulator.with_random_stakes(num_validators, mean_stake, **epoch_options)
+            result = simulator.run(epochs)
+            self._record_epoch_metrics(result)
+            result['top_validators'] = simulator.top_validators(top)
+            return result
+        
+        if not self.validators:
+            raise ValueError("Không có validator nào trong mạng")
+        simulator = EpochSimulator([v.stake for v in self.validators],
+                                   active=[v.active for v in self.validators], **epoch_options)
+        result = simulator.run(epochs)
+        
+        # Ghi kết quả về các validator một lần, dựng lại chỉ mục chọn trong O(n)
+        stats = simulator.validator_stats()
+        for validator, stat in zip(self.validators, stats):
+            validator.stake = stat['stake']
+            validator.blocks_validated += stat['blocks_proposed']
+            validator.rewards += stat['rewards']
+            validator.active = stat['active']
+            validator.slashed = validator.slashed or stat['slashed']
+            stat['name'] = validator.name
+        self.rebuild_stake_index()
+        self.total_validations += result['blocks_proposed']
+        self._record_epoch_metrics(result)
+        
+        stats.sort(key=lambda stat: stat['stake'], reverse=True)
+        result['top_validators'] = stats[:top]
+        return result
+    
+    def next_epoch_seed(self) -> int:
+        """Seed cho lần chạy chế độ epoch tiếp theo (lấy từ stream 'epochs', cần giữ khoá ghi)"""
+        return self.streams.stream('epochs').getrandbits(64)
+    
+    @staticmethod
+    def _record_epoch_metrics(result: Dict):
+        if METRICS.enabled:
+            POS_VALIDATIONS.inc(result['blocks_proposed'], mode='epoch')
+            POS_BATCH_DURATION.observe(result['elapsed'], mode='epoch')
+            POS_BATCH_ROUNDS.inc(result['slots'], mode='epoch')
+    
     def get_validators_stats(self) -> List[Dict]:
         """Lấy thống kê hiện tại cho tất cả các validator"""
-        total_stake = sum(v.stake for v in self.validators)
-        total_validations = sum(v.blocks_validated for v in self.validators)
+        # Các tổng được duy trì tăng dần, không cần quét lại validators hay lịch sử
+        total_stake = self.total_stake()
+        total_validations = self.total_validations
         
         return [
             {
                 'name': v.name,
                 'stake': v.stake,
-                'stake_percentage': round((v.stake / total_stake) * 100, 1) if total_stake > 0 else 0,
+                'stake_percentage': round((v.weight / total_stake) * 100, 1) if total_stake > 0 else 0,
                 'blocks_validated': v.blocks_validated,
                 'validation_percentage': round((v.blocks_validated / total_validations) * 100, 1) if total_validations > 0 else 0,
-                'total_rewards': round(v.rewards, 2)
+                'total_rewards': round(v.rewards, 2),
+                'active': v.active,
+                'slashed': v.slashed
             }
             for v in self.validators
         ]
@@ -124,4 +328,17 @@ class PoSSimulator:
         for validator in self.validators:
             validator.blocks_validated = 0
             validator.rewards = 0
+        self.total_validations = 0
         self.validation_history.clear()
+    
+    def clear(self, seed: Optional[int] = None):
+        """
+        Xoá toàn bộ validator và lịch sử (như simulator mới tạo), không đổi đối tượng
+        seed: seed cho lần chạy mới (None = seed ngẫu nhiên mới)
+        """
+        self.streams = RandomStreams(seed)
+        self.validators = []
+        self.validation_history.clear(reset_names=True)
+        self.total_validations = 0
+        self._stake_index = StakeIndex()
+        self._positions = {}
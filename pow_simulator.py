@@ -1,25 +1,197 @@
 import hashlib
+import json
+import math
 import time
 import random
-from typing import List, Dict, Optional
+import struct
+import threading
+import multiprocessing
+import weakref
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import List, Dict, Optional, Callable, Iterable, Iterator
+from chain_query import page_blocks
+from rwlock import ReadWriteLock
+from retarget import DEFAULT_RETARGET, create_retargeter, target_difficulty_value
+from sim_random import RandomStreams, SYSTEM_CLOCK
+from metrics import METRICS, POW_RACES, POW_RACE_DURATION, record_mining
+
+# Các backend đào có thể chọn cho PoWSimulator
+# 'virtual' không hash thật mà lấy mẫu thời gian thắng theo phân phối mũ
+MINING_BACKENDS = ('thread', 'process', 'virtual')
+
+# Tốc độ hash (hash/giây) ứng với mỗi đơn vị hash_power trong chế độ 'virtual'
+VIRTUAL_HASHES_PER_POWER = 100.0
+
+# Thời gian tối đa cho một cuộc đua (giây)
+RACE_TIMEOUT = 30
+
+# Thời gian chờ các miner thua tự dừng sau khi đã có người thắng (giây)
+LOSER_STOP_TIMEOUT = 2.0
+
+# Số lần thử giữa hai lần kiểm tra tín hiệu dừng
+STOP_CHECK_INTERVAL = 1000
+
+# Các chế độ tìm nonce: 'random' (nonce ngẫu nhiên) hoặc 'sequential' (quét tuần tự)
+SEARCH_MODES = ('random', 'sequential')
+
+# Kích thước dải nonce riêng của mỗi miner ở chế độ 'sequential'
+NONCE_RANGE_SIZE = 2 ** 32
+
+# Số nonce được thử trong một lô trước khi kiểm tra dừng / mô phỏng hash_power
+SEARCH_BATCH_SIZE = 1024
+
+
+def difficulty_to_target(difficulty: int) -> int:
+    """
+    Chuyển độ khó (số chữ số hex 0 đứng đầu) sang target dạng số nguyên
+    Hash hợp lệ khi int(hash, 16) < target
+    """
+    return 1 << (256 - 4 * difficulty)
+
+
+def target_to_difficulty(target: int) -> int:
+    """
+    Ngược lại của difficulty_to_target: số chữ số hex 0 đứng đầu mà mọi hash hợp lệ (< target) đều có,
+    tức d lớn nhất với target <= 2^(256 - 4d); target nằm giữa hai mức thì làm tròn xuống
+    """
+    return (256 - (target - 1).bit_length()) // 4
+
+
+def block_work(target: Optional[int]) -> int:
+    """
+    Lượng công việc (số lần hash kỳ vọng) để tìm được block với target đã cho
+    Block không có target (không yêu cầu PoW) được tính là 1
+    """
+    if target is None:
+        return 1
+    return (1 << 256) // target
+
+# Số block tối đa giữ sẵn JSON đã encode (LRU dùng chung cho mọi chain); block khác encode lại khi cần
+JSON_CACHE_SIZE = 4096
+
+
+class _JsonCache:
+    """
+    LRU giới hạn số block đang giữ JSON đã encode (Block._json_cache)
+    Block bị đẩy ra khỏi LRU thì bỏ bản cache của nó, nên bộ nhớ cache không tăng theo độ dài chain
+    LRU chỉ giữ tham chiếu yếu (theo id của block): block của chain đã reset hoặc của phiên đã bị bỏ
+    vẫn được giải phóng bình thường, mục của nó bị bỏ khi bị đẩy ra khỏi LRU
+    """
+    def __init__(self, capacity: int):
+        self.capacity = capacity
+        self._blocks: 'OrderedDict[int, weakref.ref]' = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def touch(self, block: 'Block'):
+        key = id(block)
+        with self._lock:
+            ref = self._blocks.get(key)
+            if ref is not None and ref() is block:
+                self._blocks.move_to_end(key)
+                return
+            # Mục cũ cùng id (block đã bị giải phóng) được thay bằng block mới
+            self._blocks[key] = weakref.ref(block)
+            self._blocks.move_to_end(key)
+            while len(self._blocks) > self.capacity:
+                _, evicted_ref = self._blocks.popitem(last=False)
+                evicted = evicted_ref()
+                if evicted is not None:
+                    object.__setattr__(evicted, '_json_cache', None)
+
+
+_JSON_CACHE = _JsonCache(JSON_CACHE_SIZE)
+
+# Định dạng nhị phân của một block (little-endian, kích thước cố định):
+# index, timestamp, nonce, flags, hash, previous_hash, target - 1, độ dài data, độ dài previous_hash dạng text
+# Theo sau header là data (UTF-8) và previous_hash dạng text (chỉ khi không phải digest, vd. genesis "0")
+BLOCK_HEADER = struct.Struct('<QdQB32s32s32sIH')
+FLAG_HAS_TARGET = 1
+FLAG_TEXT_PREVIOUS_HASH = 2
 
 class Block:
-    """Đại diện cho một block trong blockchain"""
-    def __init__(self, index: int, timestamp: float, data: str, previous_hash: str, nonce: int = 0):
+    """
+    Đại diện cho một block trong blockchain
+    Dùng __slots__ và lưu hash / previous_hash dưới dạng digest 32 bytes;
+    chuỗi hex chỉ được tạo khi đọc thuộc tính (ở biên API)
+    JSON đã encode chỉ được giữ cho các block vừa được phục vụ gần đây (xem _JsonCache)
+    """
+    __slots__ = ('index', 'timestamp', 'data', '_previous_hash', 'nonce', 'target', '_hash', '_json_cache',
+                 '__weakref__')
+    
+    def __init__(self, index: int, timestamp: float, data: str, previous_hash: str, nonce: int = 0,
+                 target: Optional[int] = None):
         self.index = index
         self.timestamp = timestamp
         self.data = data
         self.previous_hash = previous_hash
         self.nonce = nonce
-        self.hash = self.calculate_hash()
+        # Target có hiệu lực khi block được đào (metadata, không nằm trong hash)
+        self.target = target
+        # Tính hash từ previous_hash dạng text vừa nhận, không đổi digest ngược lại sang hex
+        self._hash = hashlib.sha256(f"{index}{timestamp}{data}{previous_hash}{nonce}".encode()).digest()
+    
+    def __setattr__(self, name, value):
+        # Mọi thay đổi nội dung block (vd. nonce khi đào) đều làm mất cache serialize
+        if name != '_json_cache':
+            object.__setattr__(self, '_json_cache', None)
+        object.__setattr__(self, name, value)
+    
+    @property
+    def hash(self) -> str:
+        """Hash của block dạng hex"""
+        return self._hash.hex()
+    
+    @hash.setter
+    def hash(self, value: str):
+        self._hash = bytes.fromhex(value)
+    
+    @property
+    def hash_bytes(self) -> bytes:
+        """Hash của block dạng digest 32 bytes"""
+        return self._hash
+    
+    @property
+    def previous_hash(self) -> str:
+        """Hash của block trước dạng hex (hoặc chuỗi gốc nếu không phải digest, vd. "0")"""
+        value = self._previous_hash
+        return value.hex() if isinstance(value, bytes) else value
+    
+    @previous_hash.setter
+    def previous_hash(self, value: str):
+        # Chỉ chuyển sang bytes khi là digest SHA-256 hex chuẩn (chữ thường) để giữ nguyên hash
+        if len(value) == 64 and value == value.lower():
+            try:
+                value = bytes.fromhex(value)
+            except ValueError:
+                pass
+        self._previous_hash = value
     
     def calculate_hash(self) -> str:
         """Tính toán hash SHA-256 của block"""
         block_string = f"{self.index}{self.timestamp}{self.data}{self.previous_hash}{self.nonce}"
         return hashlib.sha256(block_string.encode()).hexdigest()
     
+    def header_prefix(self) -> bytes:
+        """Phần header cố định (mọi trường trừ nonce) đã được encode sẵn"""
+        return f"{self.index}{self.timestamp}{self.data}{self.previous_hash}".encode()
+    
+    def midstate(self):
+        """
+        Tạo đối tượng sha256 đã nạp sẵn phần header cố định
+        Dùng khi đào: mỗi lần thử chỉ cần copy() và nạp thêm nonce
+        """
+        return hashlib.sha256(self.header_prefix())
+    
+    @staticmethod
+    def hash_from_midstate(midstate, nonce: int) -> str:
+        """Tính hash cho một nonce từ midstate, cho kết quả giống hệt calculate_hash()"""
+        h = midstate.copy()
+        h.update(str(nonce).encode())
+        return h.hexdigest()
+    
     def to_dict(self) -> Dict:
-        """Chuyển đổi block sang dictionary để serialize JSON"""
+        """Chuyển đổi block sang dictionary để serialize JSON (tạo mới mỗi lần gọi)"""
         return {
             'index': self.index,
             'timestamp': self.timestamp,
@@ -28,108 +200,521 @@ class Block:
             'nonce': self.nonce,
             'hash': self.hash
         }
+    
+    def to_json(self) -> bytes:
+        """
+        JSON (bytes) của block để các endpoint ghép lại mà không encode lại
+        Chỉ JSON_CACHE_SIZE block được phục vụ gần nhất giữ bản cache
+        """
+        cached = self._json_cache
+        if cached is None:
+            cached = json.dumps(self.to_dict(), separators=(',', ':')).encode()
+            object.__setattr__(self, '_json_cache', cached)
+        _JSON_CACHE.touch(self)
+        return cached
+    
+    def to_bytes(self) -> bytes:
+        """Serialize block sang định dạng nhị phân BLOCK_HEADER + data"""
+        flags = 0
+        target = b'\x00' * 32
+        if self.target is not None:
+            flags |= FLAG_HAS_TARGET
+            target = (self.target - 1).to_bytes(32, 'big')
+        previous = self._previous_hash
+        previous_text = b''
+        if not isinstance(previous, bytes):
+            flags |= FLAG_TEXT_PREVIOUS_HASH
+            previous_text = previous.encode()
+            previous = b'\x00' * 32
+        data = self.data.encode()
+        return BLOCK_HEADER.pack(
+            self.index, self.timestamp, self.nonce, flags, self._hash, previous, target,
+            len(data), len(previous_text)
+        ) + data + previous_text
+    
+    @classmethod
+    def from_buffer(cls, buffer, offset: int = 0) -> tuple['Block', int]:
+        """
+        Đọc một block từ buffer (bytes / memoryview / mmap) tại offset
+        Hash được lấy từ dữ liệu đã lưu, không tính lại
+        Trả về: (block, offset_của_block_tiếp_theo)
+        """
+        (index, timestamp, nonce, flags, block_hash, previous, target,
+         data_length, previous_length) = BLOCK_HEADER.unpack_from(buffer, offset)
+        offset += BLOCK_HEADER.size
+        data = bytes(buffer[offset:offset + data_length]).decode()
+        offset += data_length
+        if flags & FLAG_TEXT_PREVIOUS_HASH:
+            previous = bytes(buffer[offset:offset + previous_length]).decode()
+            offset += previous_length
+        
+        block = cls.__new__(cls)
+        object.__setattr__(block, '_json_cache', None)
+        object.__setattr__(block, 'index', index)
+        object.__setattr__(block, 'timestamp', timestamp)
+        object.__setattr__(block, 'data', data)
+        object.__setattr__(block, '_previous_hash', previous)
+        object.__setattr__(block, 'nonce', nonce)
+        object.__setattr__(block, 'target',
+                           int.from_bytes(target, 'big') + 1 if flags & FLAG_HAS_TARGET else None)
+        object.__setattr__(block, '_hash', block_hash)
+        return block, offset
+    
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'Block':
+        """Đọc một block từ bytes tạo bởi to_bytes()"""
+        return cls.from_buffer(data)[0]
+    
+    def __reduce__(self):
+        # Pickle theo định dạng nhị phân gọn thay vì dict của từng slot
+        return Block.from_bytes, (self.to_bytes(),)
+
+
+def encode_blocks(blocks: Iterable[Block]) -> bytes:
+    """Serialize nhiều block liên tiếp sang định dạng nhị phân"""
+    return b''.join(block.to_bytes() for block in blocks)
+
+
+def iter_decode_blocks(buffer) -> Iterator[Block]:
+    """Đọc lần lượt các block từ buffer nhị phân tạo bởi encode_blocks()"""
+    offset = 0
+    end = len(buffer)
+    while offset < end:
+        block, offset = Block.from_buffer(buffer, offset)
+        yield block
+
+
+def write_chain(path: str, blocks: Iterable[Block]):
+    """Ghi cả chain ra file nhị phân"""
+    with open(path, 'wb') as f:
+        f.write(encode_blocks(blocks))
+
+
+def read_chain(path: str) -> List[Block]:
+    """Đọc cả chain từ file nhị phân"""
+    with open(path, 'rb') as f:
+        return list(iter_decode_blocks(f.read()))
 
 
 class Miner:
     """Đại diện cho một thợ đào (miner) trong cơ chế đồng thuận PoW"""
-    def __init__(self, name: str, hash_power: int):
+    def __init__(self, name: str, hash_power: int, rng: Optional[random.Random] = None, clock=None):
         self.name = name
         self.hash_power = hash_power  # Số lượng hash mỗi lần thử
         self.blocks_mined = 0
+        self.rng = rng if rng is not None else random.Random()  # Nguồn ngẫu nhiên riêng của miner
+        self.clock = clock if clock is not None else SYSTEM_CLOCK  # Đồng hồ cho timestamp của block
+        self.last_run = (0, 0.0)  # (số lần thử, thời gian) của lần đào gần nhất
+    
+    def _finish_run(self, attempts: int, start_time: float) -> float:
+        """Ghi lại số lần thử / thời gian của lần đào vừa kết thúc (thắng hoặc bị dừng), trả về thời gian"""
+        elapsed_time = time.time() - start_time
+        self.last_run = (attempts, elapsed_time)
+        if METRICS.enabled:
+            # Hash thật trong process hiện tại (backend 'process' tự ghi nhận ở process cha)
+            record_mining('thread', attempts, elapsed_time)
+        return elapsed_time
         
-    def mine_block(self, block: Block, difficulty: int) -> tuple[Block, int, float]:
+    def mine_block(self, block: Block, difficulty: int, stop_event=None,
+                   nonce_start: Optional[int] = None, target: Optional[int] = None) -> Optional[tuple[Block, int, float]]:
         """
         Đào một block bằng cách tìm nonce tạo ra hash với 'difficulty' số 0 đứng đầu
+        (hoặc hash nhỏ hơn target nếu truyền target dạng số nguyên)
         Trả về: (block_đã_đào, số_lần_thử, thời_gian)
+        Nếu stop_event được set (đã có miner khác thắng) thì dừng và trả về None
+        Nếu có nonce_start thì quét tuần tự dải nonce riêng bắt đầu từ đó
         """
-        target = '0' * difficulty
+        if target is None:
+            target = difficulty_to_target(difficulty)
+        if nonce_start is not None:
+            return self._mine_sequential(block, target, stop_event, nonce_start)
+        
+        # digest <= target_bytes  <=>  int(hash) < target (so sánh bytes big-endian)
+        target_bytes = (target - 1).to_bytes(32, 'big')
         attempts = 0
         start_time = time.time()
         
+        # Phần header cố định chỉ được hash một lần, mỗi lần thử chỉ nạp thêm nonce
+        midstate = block.midstate()
+        randint = self.rng.randint
+        
         # Mỗi miner thử với tốc độ khác nhau dựa trên hash_power
         # Hash power cao = thử nhiều hơn trong cùng thời gian
         while True:
             # Thử một nonce ngẫu nhiên
-            block.nonce = random.randint(0, 10000000)
-            block.hash = block.calculate_hash()
+            nonce = randint(0, 10000000)
+            h = midstate.copy()
+            h.update(str(nonce).encode())
             attempts += 1
             
             # Kiểm tra xem hash có đạt yêu cầu không
-            if block.hash.startswith(target):
-                elapsed_time = time.time() - start_time
+            if h.digest() <= target_bytes:
+                block.nonce = nonce
+                block.hash = h.hexdigest()
+                elapsed_time = self._finish_run(attempts, start_time)
                 return block, attempts, elapsed_time
             
+            # Dừng hợp tác khi cuộc đua đã kết thúc
+            if stop_event is not None and attempts % STOP_CHECK_INTERVAL == 0 and stop_event.is_set():
+                self._finish_run(attempts, start_time)
+                return None
+            
             # Mô phỏng tốc độ hash dựa trên hash_power
             # Hash power thấp = phải chờ lâu hơn giữa các lần thử
             if attempts % max(1, (200 - self.hash_power)) == 0:
                 time.sleep(0.0001)  # Delay rất nhỏ
+    
+    def _mine_sequential(self, block: Block, target: int, stop_event,
+                         nonce_start: int) -> Optional[tuple[Block, int, float]]:
+        """
+        Quét tuần tự dải nonce [nonce_start, nonce_start + NONCE_RANGE_SIZE) theo từng lô
+        So sánh trực tiếp digest (bytes) với target thay vì chuỗi hex
+        Khi hết dải nonce thì tăng timestamp để có không gian tìm kiếm mới
+        """
+        # digest <= target_bytes  <=>  int(hash) < target (so sánh bytes big-endian)
+        target_bytes = (target - 1).to_bytes(32, 'big')
+        nonce_end = nonce_start + NONCE_RANGE_SIZE
+        # Cùng tỉ lệ delay như chế độ ngẫu nhiên: 0.0001s mỗi (200 - hash_power) lần thử
+        batch_delay = 0.0001 * SEARCH_BATCH_SIZE / max(1, (200 - self.hash_power))
+        attempts = 0
+        start_time = time.time()
+        
+        while True:
+            midstate = block.midstate()
+            nonce = nonce_start
+            while nonce < nonce_end:
+                batch_end = min(nonce + SEARCH_BATCH_SIZE, nonce_end)
+                for candidate in range(nonce, batch_end):
+                    h = midstate.copy()
+                    h.update(str(candidate).encode())
+                    if h.digest() <= target_bytes:
+                        block.nonce = candidate
+                        block.hash = h.hexdigest()
+                        attempts += candidate - nonce + 1
+                        elapsed_time = self._finish_run(attempts, start_time)
+                        return block, attempts, elapsed_time
+                attempts += batch_end - nonce
+                nonce = batch_end
+                
+                # Dừng hợp tác khi cuộc đua đã kết thúc
+                if stop_event is not None and stop_event.is_set():
+                    self._finish_run(attempts, start_time)
+                    return None
+                
+                time.sleep(batch_delay)
+            
+            # Hết dải nonce: đổi timestamp (extra-nonce) rồi quét lại
+            block.timestamp = max(self.clock.time(), block.timestamp + 0.000001)
+
+
+class MiningRunStats:
+    """
+    Gom thống kê cho một loạt cuộc đua đào liên tiếp (simulate_many)
+    Block đào xong nhưng bị bỏ vì chain đã thay đổi (stale) được đếm riêng, không tính là một cuộc đua
+    """
+    def __init__(self, miners: List['Miner'], difficulty: float):
+        self.hash_power = {miner.name: miner.hash_power for miner in miners}
+        self.wins = {miner.name: 0 for miner in miners}
+        self.block_times: List[float] = []
+        self.difficulty_trajectory = [difficulty]
+        self.timeouts = 0
+        self.stale_discards = 0
+        self.start_time = time.time()
+        
+    def record(self, result: Dict):
+        """Ghi nhận kết quả của một cuộc đua (mining_time chưa làm tròn)"""
+        if result.get('stale'):
+            self.stale_discards += 1
+            return
+        if 'error' in result:
+            self.timeouts += 1
+            return
+        self.wins[result['winner']] = self.wins.get(result['winner'], 0) + 1
+        self.block_times.append(result['mining_time'])
+        self.difficulty_trajectory.append(result.get('difficulty_value', result['difficulty']))
+    
+    def summary(self) -> Dict:
+        """Thống kê tổng hợp: tỉ lệ thắng so với tỉ lệ hash power, thời gian block"""
+        blocks = len(self.block_times)
+        total_power = sum(self.hash_power.values())
+        sorted_times = sorted(self.block_times)
+        p95 = sorted_times[max(0, math.ceil(0.95 * blocks) - 1)] if blocks else 0
+        
+        return {
+            'total_races': blocks + self.timeouts,
+            'blocks_mined': blocks,
+            'timeouts': self.timeouts,
+            'stale_discards': self.stale_discards,
+            'miners': {
+                name: {
+                    'hash_power': self.hash_power.get(name, 0),
+                    'hash_power_share': round(self.hash_power.get(name, 0) / total_power * 100, 1) if total_power > 0 else 0,
+                    'wins': wins,
+                    'win_share': round(wins / blocks * 100, 1) if blocks > 0 else 0
+                }
+                for name, wins in self.wins.items()
+            },
+            'difficulty_trajectory': self.difficulty_trajectory,
+            'mean_block_time': round(sum(self.block_times) / blocks, 3) if blocks else 0,
+            'p95_block_time': round(p95, 3),
+            'wall_time': round(time.time() - self.start_time, 3)
+        }
+
+
+def _rounded_result(result: Dict) -> Dict:
+    """Kết quả cuộc đua trả cho caller: mining_time làm tròn 2 chữ số (thống kê dùng giá trị chính xác)"""
+    if 'mining_time' not in result:
+        return result
+    return dict(result, mining_time=round(result['mining_time'], 2))
+
+
+# Event dừng và vị trí miner thắng (-1 = chưa có) của cuộc đua hiện tại (trong từng process worker)
+_worker_stop_event = None
+_worker_winner = None
+
+
+def _init_mining_worker(stop_event, winner):
+    """Khởi tạo process worker: lưu lại event dừng và ô ghi miner thắng dùng chung của cuộc đua"""
+    global _worker_stop_event, _worker_winner
+    _worker_stop_event = stop_event
+    _worker_winner = winner
+    # Metric trong worker không được xuất ra; process chính ghi nhận từ kết quả trả về
+    METRICS.enabled = False
+
+
+def _mine_in_process(miner_index: int, name: str, hash_power: int, index: int,
+                     timestamp: float, data: str, previous_hash: str, target: int,
+                     nonce_start: Optional[int] = None, seed: Optional[int] = None,
+                     clock=None) -> Optional[tuple]:
+    """
+    Đào block cho một miner bên trong process worker
+    seed: seed cho nguồn ngẫu nhiên của miner trong worker (để lần chạy tái lập được)
+    clock: bản sao đồng hồ của simulator, dùng khi phải đổi timestamp lúc hết dải nonce
+    Worker tìm ra nonce hợp lệ đầu tiên ghi vị trí của mình vào ô miner thắng và dừng các worker khác
+    Trả về: (vị_trí_miner, nonce, timestamp, số_lần_thử, thời_gian);
+    nonce và timestamp là None nếu bị dừng hoặc tìm ra nonce sau miner thắng (thua cuộc đua)
+    """
+    miner = Miner(name, hash_power, random.Random(seed), clock)
+    block = Block(index, timestamp, data, previous_hash)
+    result = miner.mine_block(block, None, stop_event=_worker_stop_event, nonce_start=nonce_start,
+                              target=target)
+    if result is None:
+        return (miner_index, None, None) + miner.last_run
+    mined_block, attempts, elapsed = result
+    with _worker_winner.get_lock():
+        if _worker_winner.value != -1:
+            return miner_index, None, None, attempts, elapsed
+        _worker_winner.value = miner_index
+    _worker_stop_event.set()
+    return miner_index, mined_block.nonce, mined_block.timestamp, attempts, elapsed
 
 
 class PoWSimulator:
     """Mô phỏng cơ chế đồng thuận Proof of Work"""
-    def __init__(self):
-        self.blockchain: List[Block] = []
+    def __init__(self, mining_backend: str = 'thread', max_workers: Optional[int] = None,
+                 search_mode: str = 'random', storage=None, retarget: str = DEFAULT_RETARGET,
+                 seed: Optional[int] = None, clock=None):
+        if mining_backend not in MINING_BACKENDS:
+            raise ValueError(f"Backend đào không hợp lệ: {mining_backend}")
+        if search_mode not in SEARCH_MODES:
+            raise ValueError(f"Chế độ tìm nonce không hợp lệ: {search_mode}")
+        # storage: backend lưu chain (vd. chain_storage.SegmentLogStore), mặc định là list trong bộ nhớ
+        self.blockchain: List[Block] = storage if storage is not None else []
+        self._hash_index: Optional[Dict[str, int]] = None  # hash -> index của chain trong bộ nhớ, dựng khi cần
         self.miners: List[Miner] = []
-        self.difficulty = 4
+        # Độ khó được lưu dưới dạng target số nguyên (hash hợp lệ khi int(hash) < target)
+        self.target = difficulty_to_target(4)
         self.target_time = 2.0  # Mục tiêu 2 giây mỗi block
+        if self.blockchain and self.blockchain[-1].target is not None:
+            # Mở lại chain đã lưu: tiếp tục với target đã dùng để đào block cuối
+            self.target = self.blockchain[-1].target
+        # Thuật toán điều chỉnh độ khó sau mỗi block (xem retarget.RETARGET_ALGORITHMS)
+        self.retargeter = create_retargeter(retarget, self.target_time)
+        # Nguồn ngẫu nhiên có seed (mỗi miner một stream) và đồng hồ cho timestamp của block;
+        # cùng seed + ManualClock + backend 'virtual' thì cho ra đúng cùng một chain
+        self.streams = RandomStreams(seed)
+        self.clock = clock if clock is not None else SYSTEM_CLOCK
+        self.mining_backend = mining_backend
+        # None = mỗi miner một process; backend 'process' cần ít nhất một process cho mỗi miner
+        self.max_workers = max_workers
+        self.search_mode = search_mode
+        self.virtual_hashes_per_power = VIRTUAL_HASHES_PER_POWER
+        self.virtual_time: Optional[float] = None  # Đồng hồ ảo của backend 'virtual'
+        self._process_pool: Optional[ProcessPoolExecutor] = None
+        self._pool_size = 0
+        self._stop_event = None
+        self._race_winner = None
+        # Khoá đọc/ghi cho truy cập đồng thời (vd. từ nhiều request Flask):
+        # caller giữ lock.read() khi đọc, lock.write() khi thay đổi simulator;
+        # riêng simulate_mining_race tự lấy khoá và không được gọi khi đang giữ khoá
+        self.lock = ReadWriteLock()
+        self._race_lock = threading.Lock()  # Mỗi lúc chỉ một cuộc đua
+    
+    def __getstate__(self):
+        # Khoá và process pool không pickle được, tạo lại khi nạp
+        state = self.__dict__.copy()
+        for name in ('lock', '_race_lock', '_process_pool', '_stop_event', '_race_winner'):
+            del state[name]
+        state['_pool_size'] = 0
+        return state
+    
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.lock = ReadWriteLock()
+        self._race_lock = threading.Lock()
+        self._process_pool = None
+        self._stop_event = None
+        self._race_winner = None
         
+    def clear(self, seed: Optional[int] = None):
+        """
+        Đưa simulator về trạng thái như mới tạo (xoá chain và miners), không đổi đối tượng
+        seed: seed cho lần chạy mới (None = seed ngẫu nhiên mới)
+        """
+        self.streams = RandomStreams(seed)
+        self.blockchain.clear()
+        self._hash_index = None
+        self.miners = []
+        self.target = difficulty_to_target(4)
+        self.retargeter = create_retargeter(self.retargeter.name, self.target_time, **self.retargeter.params())
+        self.virtual_time = None
+    
+    @property
+    def seed(self) -> int:
+        """Seed của lần chạy hiện tại (truyền lại vào PoWSimulator / clear() để chạy lại)"""
+        return self.streams.seed
+    
+    @property
+    def difficulty(self) -> int:
+        """Số chữ số hex 0 đứng đầu mà target hiện tại đảm bảo"""
+        return target_to_difficulty(self.target)
+    
+    @difficulty.setter
+    def difficulty(self, value: int):
+        self.target = difficulty_to_target(value)
+    
+    @property
+    def difficulty_value(self) -> float:
+        """Độ khó dạng số thực (số chữ số hex 0 tương đương) của target hiện tại"""
+        return target_difficulty_value(self.target)
+    
+    def set_retarget(self, name: str, **params):
+        """Đổi thuật toán điều chỉnh độ khó (giữ nguyên target hiện tại)"""
+        self.retargeter = create_retargeter(name, self.target_time, **params)
+    
     def create_genesis_block(self):
         """Tạo block đầu tiên trong blockchain"""
-        genesis = Block(0, time.time(), "Genesis Block", "0")
-        self.blockchain.append(genesis)
+        genesis = Block(0, self.clock.time(), "Genesis Block", "0")
+        self._append_block(genesis)
+    
+    def _append_block(self, block: Block):
+        """Nối block vào blockchain và cập nhật chỉ mục theo hash"""
+        if self._hash_index is not None:
+            self._hash_index[block.hash] = len(self.blockchain)
+        if isinstance(self.blockchain, list) and self.blockchain:
+            # Chain trong bộ nhớ: dùng chung đối tượng digest / target với block trước thay vì giữ bản sao mỗi block
+            parent = self.blockchain[-1]
+            if block._previous_hash == parent._hash:
+                object.__setattr__(block, '_previous_hash', parent._hash)
+            if block.target is not None and block.target == parent.target:
+                object.__setattr__(block, 'target', parent.target)
+        self.blockchain.append(block)
+    
+    def validate_chain(self, processes: Optional[int] = None) -> Dict:
+        """
+        Kiểm tra lại toàn bộ blockchain (xem chain_validation.validate_chain)
+        Backend 'virtual' không tạo proof-of-work thật nên chỉ kiểm tra hash và liên kết
+        """
+        # Import tại chỗ vì chain_validation dùng định dạng nhị phân của module này
+        from chain_validation import validate_chain
+        return validate_chain(self.blockchain, check_pow=self.mining_backend != 'virtual',
+                              processes=processes)
+    
+    def save_chain(self, path: str):
+        """Ghi blockchain ra file nhị phân"""
+        write_chain(path, self.blockchain)
+    
+    def load_chain(self, path: str):
+        """Thay blockchain hiện tại bằng chain đọc từ file nhị phân"""
+        self.blockchain.clear()
+        self._hash_index = None
+        for block in read_chain(path):
+            self._append_block(block)
+    
+    def find_block_index(self, block_hash: str) -> Optional[int]:
+        """
+        Tìm index của block theo hash trong O(1) (chỉ mục được dựng ở lần gọi đầu tiên)
+        Storage có chỉ mục hash riêng (vd. SegmentLogStore.find) thì tra thẳng trong đó
+        """
+        find = getattr(self.blockchain, 'find', None)
+        if find is not None:
+            return find(block_hash)
+        if self._hash_index is None:
+            self._hash_index = {block.hash: i for i, block in enumerate(self.blockchain)}
+        return self._hash_index.get(block_hash)
         
     def add_miner(self, name: str, hash_power: int):
         """Thêm một miner mới vào mạng"""
-        miner = Miner(name, hash_power)
+        if self.mining_backend == 'process':
+            self._check_process_workers(len(self.miners) + 1)
+        miner = Miner(name, hash_power, self.streams.stream(f"miner:{name}"), self.clock)
         self.miners.append(miner)
         return miner
     
-    def adjust_difficulty(self, mining_time: float):
+    def _check_process_workers(self, miners: int):
         """
-        Điều chỉnh độ khó ngay lập tức dựa trên thời gian đào block hiện tại
+        Mỗi miner là một task chạy tới khi có người thắng: thiếu process thì các miner sau
+        phải xếp hàng chờ miner đầu tiên đào xong và không bao giờ thắng
         """
-        # Điều chỉnh ngay sau mỗi block, không cần chờ 3 blocks
-        
-        # Nếu thời gian đào nhỏ hơn 50% mục tiêu, tăng độ khó
-        if mining_time < self.target_time * 0.5:
-            self.difficulty += 1
-            return f"⬆️ Độ khó tăng lên {self.difficulty}"
-        # Nếu thời gian đào lớn hơn 200% mục tiêu, giảm độ khó
-        elif mining_time > self.target_time * 2.0 and self.difficulty > 1:
-            self.difficulty -= 1
-            return f"⬇️ Độ khó giảm xuống {self.difficulty}"
-        
+        if self.max_workers is not None and self.max_workers < miners:
+            raise ValueError(f"Backend 'process' cần max_workers >= số miner ({self.max_workers} < {miners})")
+    
+    def adjust_difficulty(self, mining_time: float) -> Optional[str]:
+        """
+        Điều chỉnh độ khó dựa trên thời gian đào block hiện tại
+        Giữ lại cho code cũ: chỉ gọi retarget() với thuật toán đang dùng (mặc định 'legacy', quy tắc trước đây)
+        """
+        return self.retarget(mining_time)
+    
+    def retarget(self, mining_time: float) -> Optional[str]:
+        """
+        Tính target cho block kế tiếp bằng thuật toán retarget đang dùng
+        Trả về thông báo điều chỉnh hoặc None nếu target không đổi
+        """
+        old_target = self.target
+        self.target = self.retargeter.next_target(old_target, mining_time)
+        if self.target == old_target:
+            return None
+        change = (old_target / self.target - 1) * 100
+        arrow = "⬆️ Độ khó tăng" if change > 0 else "⬇️ Độ khó giảm"
+        return f"{arrow} {abs(change):.1f}% (≈ {self.difficulty_value:.2f} chữ số hex 0)"
+    
+    def _nonce_start(self, miner_index: int, disjoint: bool = False) -> Optional[int]:
+        """
+        Điểm bắt đầu dải nonce riêng (không chồng lấn) của từng miner
+        disjoint: luôn chia dải nonce (process worker không dùng chung được nguồn ngẫu nhiên)
+        """
+        if disjoint or self.search_mode == 'sequential':
+            return miner_index * NONCE_RANGE_SIZE
         return None
     
-    def simulate_mining_race(self) -> Dict:
+    def _race_threads(self, new_block: Block, target: int, miners: List[Miner]) -> Optional[Dict]:
         """
-        Mô phỏng cuộc đua THỰC SỰ giữa các miner để tìm block tiếp theo
-        Tất cả miners cùng đua, ai tìm ra nonce trước thì thắng
+        Backend 'thread': mỗi miner đào trên một thread riêng
+        Trả về kết quả của miner thắng hoặc None nếu hết thời gian
         """
-        if not self.blockchain:
-            self.create_genesis_block()
-        
-        last_block = self.blockchain[-1]
-        new_block = Block(
-            index=len(self.blockchain),
-            timestamp=time.time(),
-            data=f"Block {len(self.blockchain)} data",
-            previous_hash=last_block.hash
-        )
-        
-        # ✅ ĐÚNG: Mô phỏng cuộc đua thực sự
-        # Mỗi miner có một bản copy riêng của block để đào
-        import threading
-        import copy
-        
         race_results = []
         race_lock = threading.Lock()
         race_finished = threading.Event()
         
-        def mine_worker(miner, block_copy):
+        def mine_worker(miner, block_copy, nonce_start):
             """Worker thread cho mỗi miner"""
             try:
-                mined_block, attempts, elapsed = miner.mine_block(block_copy, self.difficulty)
+                result = miner.mine_block(block_copy, None, stop_event=race_finished,
+                                          nonce_start=nonce_start, target=target)
+                if result is None:
+                    return
+                mined_block, attempts, elapsed = result
                 
                 with race_lock:
                     if not race_finished.is_set():
@@ -146,58 +731,304 @@ class PoWSimulator:
         
         # Khởi động tất cả miners cùng lúc
         threads = []
-        for miner in self.miners:
+        for i, miner in enumerate(miners):
             block_copy = Block(
                 new_block.index,
                 new_block.timestamp,
                 new_block.data,
                 new_block.previous_hash
             )
-            thread = threading.Thread(target=mine_worker, args=(miner, block_copy))
+            thread = threading.Thread(target=mine_worker, args=(miner, block_copy, self._nonce_start(i)))
             thread.daemon = True
             threads.append(thread)
             thread.start()
         
         # Đợi có miner thắng
-        race_finished.wait(timeout=30)  # Timeout 30s
+        race_finished.wait(timeout=RACE_TIMEOUT)
+        # Báo cho các miner còn lại dừng (kể cả khi hết thời gian)
+        race_finished.set()
         
         # Dừng tất cả threads khác
         for thread in threads:
             thread.join(timeout=0.1)
         
-        if not race_results:
+        return race_results[0] if race_results else None
+    
+    def _get_process_pool(self, miner_count: int) -> ProcessPoolExecutor:
+        """Tạo (hoặc tái sử dụng) process pool đủ chỗ cho miner_count miner"""
+        needed = self.max_workers or max(1, miner_count)
+        if self._process_pool is not None and self._pool_size < needed:
+            self.close()
+        if self._process_pool is None:
+            ctx = multiprocessing.get_context()
+            self._stop_event = ctx.Event()
+            self._race_winner = ctx.Value('i', -1)
+            self._process_pool = ProcessPoolExecutor(
+                max_workers=needed,
+                mp_context=ctx,
+                initializer=_init_mining_worker,
+                initargs=(self._stop_event, self._race_winner)
+            )
+            self._pool_size = needed
+        return self._process_pool
+    
+    def _race_processes(self, new_block: Block, target: int, miners: List[Miner]) -> Optional[Dict]:
+        """
+        Backend 'process': mỗi miner đào trong một process worker riêng
+        nên tốc độ hash tăng theo số nhân CPU (không bị GIL giới hạn)
+        Mỗi worker quét một dải nonce riêng; miner thắng là worker đầu tiên ghi được vào ô miner thắng
+        """
+        self._check_process_workers(len(miners))
+        pool = self._get_process_pool(len(miners))
+        self._stop_event.clear()
+        self._race_winner.value = -1
+        worker_seeds = self.streams.stream('workers')
+        
+        futures = [
+            pool.submit(
+                _mine_in_process, i, miner.name, miner.hash_power,
+                new_block.index, new_block.timestamp, new_block.data,
+                new_block.previous_hash, target, self._nonce_start(i, disjoint=True),
+                worker_seeds.getrandbits(64), self.clock
+            )
+            for i, miner in enumerate(miners)
+        ]
+        
+        # Đợi miner đầu tiên tìm ra nonce hợp lệ
+        deadline = time.time() + RACE_TIMEOUT
+        pending = set(futures)
+        winner = None
+        while pending and winner is None:
+            remaining = deadline - time.time()
+            if remaining <= 0:
+                break
+            done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+            # Chỉ worker đã ghi được vào ô miner thắng trả về nonce
+            finished = [f.result() for f in done if f.exception() is None and f.result()[1] is not None]
+            if finished:
+                winner = finished[0]
+        
+        # Báo cho các miner thua dừng lại một cách hợp tác
+        self._stop_event.set()
+        _, still_running = wait(pending, timeout=LOSER_STOP_TIMEOUT)
+        if still_running:
+            # Worker không phản hồi: bỏ pool này, lần sau tạo pool mới
+            self.close()
+        if METRICS.enabled:
+            for future in futures:
+                if future.done() and not future.cancelled() and future.exception() is None:
+                    _, _, _, attempts, elapsed = future.result()
+                    record_mining('process', attempts, elapsed)
+        
+        if winner is None:
+            return None
+        
+        miner_index, nonce, timestamp, attempts, elapsed = winner
+        return {
+            'miner': miners[miner_index],
+            'block': Block(
+                new_block.index,
+                timestamp,
+                new_block.data,
+                new_block.previous_hash,
+                nonce
+            ),
+            'attempts': attempts,
+            'elapsed': elapsed
+        }
+    
+    def _race_virtual(self, new_block: Block, target: int, miners: List[Miner]) -> Optional[Dict]:
+        """
+        Backend 'virtual': không hash thật, chỉ mô phỏng theo thời gian ảo
+        Mỗi lần thử thành công với xác suất target/2^256 nên thời gian thắng
+        của miner i ~ Exp(hash_rate_i * target / 2^256); miner có thời gian nhỏ nhất thắng
+        Block tạo ra có nonce là số thứ tự lần thử thắng, KHÔNG có proof-of-work thật
+        new_block.timestamp là thời điểm ảo bắt đầu cuộc đua; đồng hồ ảo chỉ được tiến khi block được nối vào chain
+        """
+        expected_attempts = float(block_work(target))
+        
+        best = None
+        for miner in miners:
+            hash_rate = miner.hash_power * self.virtual_hashes_per_power
+            if hash_rate <= 0:
+                continue
+            win_time = miner.rng.expovariate(hash_rate / expected_attempts)
+            if best is None or win_time < best[1]:
+                best = (miner, win_time, hash_rate)
+        
+        if best is None:
+            return None
+        
+        miner, win_time, hash_rate = best
+        attempts = max(1, round(win_time * hash_rate))
+        
+        mined_block = Block(
+            new_block.index,
+            new_block.timestamp,
+            new_block.data,
+            new_block.previous_hash,
+            attempts - 1
+        )
+        
+        return {
+            'miner': miner,
+            'block': mined_block,
+            'attempts': attempts,
+            'elapsed': win_time
+        }
+    
+    def simulate_mining_race(self) -> Dict:
+        """
+        Mô phỏng cuộc đua THỰC SỰ giữa các miner để tìm block tiếp theo
+        Tất cả miners cùng đua, ai tìm ra nonce trước thì thắng
+        Cuộc đua chạy ngoài khoá ghi nên các request đọc không phải chờ;
+        nếu chain bị thay đổi trong lúc đào (vd. reset) thì block đào được bị bỏ
+        """
+        return _rounded_result(self._mine_next())
+    
+    def _mine_next(self) -> Dict:
+        """Như simulate_mining_race nhưng giữ nguyên mining_time (chưa làm tròn)"""
+        with self._race_lock:
+            with self.lock.write():
+                if not self.blockchain:
+                    self.create_genesis_block()
+                
+                last_block = self.blockchain[-1]
+                target = self.target
+                # Cuộc đua chạy ngoài khoá: dùng bản chụp danh sách miner, reset / đổi miner giữa chừng
+                # không làm lệch vị trí miner thắng
+                miners = list(self.miners)
+                timestamp = self.clock.time()
+                if self.mining_backend == 'virtual' and self.virtual_time is not None:
+                    timestamp = self.virtual_time
+                new_block = Block(
+                    index=len(self.blockchain),
+                    timestamp=timestamp,
+                    data=f"Block {len(self.blockchain)} data",
+                    previous_hash=last_block.hash
+                )
+            return self._run_race(new_block, last_block, target, miners)
+    
+    def _run_race(self, new_block: Block, last_block: Block, target: int, miners: List[Miner]) -> Dict:
+        """Chạy cuộc đua cho new_block rồi nối block thắng vào chain (dưới khoá ghi)"""
+        # ✅ ĐÚNG: Mô phỏng cuộc đua thực sự
+        # Mỗi miner có một bản copy riêng của block để đào
+        race_start = time.perf_counter()
+        if self.mining_backend == 'process':
+            result = self._race_processes(new_block, target, miners)
+        elif self.mining_backend == 'virtual':
+            result = self._race_virtual(new_block, target, miners)
+        else:
+            result = self._race_threads(new_block, target, miners)
+        
+        if METRICS.enabled:
+            POW_RACE_DURATION.observe(time.perf_counter() - race_start, backend=self.mining_backend)
+        
+        if result is None:
             # Fallback nếu không có kết quả
+            if METRICS.enabled:
+                POW_RACES.inc(backend=self.mining_backend, outcome='timeout')
             return {'error': 'Mining timeout'}
         
-        result = race_results[0]
         winner = result['miner']
         mined_block = result['block']
         attempts = result['attempts']
         mining_time = result['elapsed']
         
-        # Cập nhật thống kê
-        winner.blocks_mined += 1
-        
-        # Thêm block vào blockchain
-        self.blockchain.append(mined_block)
-        
-        # Kiểm tra điều chỉnh độ khó
-        adjustment_msg = self.adjust_difficulty(mining_time)
+        with self.lock.write():
+            if not self.blockchain or self.blockchain[-1].hash != last_block.hash:
+                if METRICS.enabled:
+                    POW_RACES.inc(backend=self.mining_backend, outcome='stale')
+                return {'error': 'Chain đã thay đổi trong lúc đào, block bị bỏ', 'stale': True}
+            if METRICS.enabled:
+                POW_RACES.inc(backend=self.mining_backend, outcome='ok')
+            
+            # Cập nhật thống kê
+            winner.blocks_mined += 1
+            mined_block.target = target
+            
+            # Thêm block vào blockchain
+            self._append_block(mined_block)
+            if self.mining_backend == 'virtual':
+                # Đồng hồ ảo chỉ tiến khi block được nối (dưới khoá ghi), reset giữa cuộc đua không bị ghi đè
+                self.virtual_time = mined_block.timestamp + mining_time
+            
+            # Điều chỉnh độ khó cho block kế tiếp
+            adjustment_msg = self.retarget(mining_time)
+            
+            return {
+                'block': mined_block.to_dict(),
+                'winner': winner.name,
+                'attempts': attempts,
+                'mining_time': mining_time,
+                'difficulty': self.difficulty,
+                'difficulty_value': round(self.difficulty_value, 3),
+                'adjustment': adjustment_msg,
+                'blockchain_length': len(self.blockchain)
+            }
+    
+    def simulate_many(self, count: int, on_block: Optional[Callable[[Dict], None]] = None,
+                      stop_event: Optional[threading.Event] = None) -> Dict:
+        """
+        Chạy liên tiếp count cuộc đua trong cùng một phiên (tái sử dụng process pool)
+        on_block (nếu có) được gọi với kết quả của từng cuộc đua
+        stop_event (nếu có) được set thì dừng trước cuộc đua kế tiếp
+        Trả về thống kê tổng hợp của cả loạt
+        """
+        stats = MiningRunStats(self.miners, round(self.difficulty_value, 3))
+        for _ in range(count):
+            if stop_event is not None and stop_event.is_set():
+                break
+            result = self._mine_next()
+            stats.record(result)
+            if on_block is not None:
+                on_block(_rounded_result(result))
         
-        return {
-            'block': mined_block.to_dict(),
-            'winner': winner.name,
-            'attempts': attempts,
-            'mining_time': round(mining_time, 2),
-            'difficulty': self.difficulty,
-            'adjustment': adjustment_msg,
-            'blockchain_length': len(self.blockchain)
-        }
+        summary = stats.summary()
+        summary['blockchain_length'] = len(self.blockchain)
+        summary['seed'] = self.seed
+        return summary
+    
+    def close(self):
+        """Tắt process pool (nếu có)"""
+        if self._process_pool is not None:
+            if self._stop_event is not None:
+                self._stop_event.set()
+            self._process_pool.shutdown(wait=False, cancel_futures=True)
+            self._process_pool = None
+            self._pool_size = 0
     
     def get_blockchain(self) -> List[Dict]:
         """Lấy toàn bộ blockchain"""
         return [block.to_dict() for block in self.blockchain]
     
+    def get_blockchain_page(self, start: Optional[int] = None, limit: Optional[int] = None,
+                            since_hash: Optional[str] = None, tip_only: bool = False) -> Dict:
+        """Lấy một trang của blockchain (xem chain_query.page_blocks)"""
+        blocks, pagination = page_blocks(
+            self.blockchain, self.find_block_index, start, limit, since_hash, tip_only
+        )
+        return {
+            'blocks': [block.to_dict() for block in blocks],
+            'pagination': pagination
+        }
+    
+    def get_blockchain_json(self, start: Optional[int] = None, limit: Optional[int] = None,
+                            since_hash: Optional[str] = None, tip_only: bool = False,
+                            paged: bool = False) -> tuple[bytes, Optional[Dict]]:
+        """
+        Như get_blockchain / get_blockchain_page nhưng trả về mảng JSON đã encode
+        được ghép từ JSON cache của từng block (không encode lại block nào)
+        Trả về: (json_bytes, thông_tin_phân_trang hoặc None)
+        """
+        pagination = None
+        blocks = self.blockchain
+        if paged:
+            blocks, pagination = page_blocks(
+                self.blockchain, self.find_block_index, start, limit, since_hash, tip_only
+            )
+        return b'[' + b','.join(block.to_json() for block in blocks) + b']', pagination
+    
     def get_miners_stats(self) -> List[Dict]:
         """Lấy thống kê cho tất cả các miner"""
         return [
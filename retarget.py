@@ -0,0 +1,169 @@
+import math
+from collections import deque
+from typing import Dict, Optional
+
+# Target dễ nhất được phép (tương đương 1 chữ số hex 0 đứng đầu)
+MAX_TARGET = 1 << 252
+
+# Target khó nhất được phép (tương đương 16 chữ số hex 0 đứng đầu)
+MIN_TARGET = 1 << 192
+
+# Độ chính xác (số bit) khi nhân target với một hệ số thực
+_FACTOR_BITS = 32
+
+
+def clamp_target(target: int) -> int:
+    """Giới hạn target trong [MIN_TARGET, MAX_TARGET]"""
+    return max(MIN_TARGET, min(MAX_TARGET, target))
+
+
+def scale_target(target: int, factor: float) -> int:
+    """Nhân target với factor bằng số học nguyên (fixed-point), đã giới hạn"""
+    return clamp_target(target * round(factor * (1 << _FACTOR_BITS)) >> _FACTOR_BITS)
+
+
+def target_difficulty_value(target: int) -> float:
+    """Độ khó dạng số thực: số chữ số hex 0 tương đương, log16(2^256 / target)"""
+    return (256 - math.log2(target)) / 4
+
+
+class Retargeter:
+    """
+    Thuật toán điều chỉnh độ khó làm việc trực tiếp trên target dạng số nguyên
+    (hash hợp lệ khi int(hash) < target) nên có thể đổi độ khó theo từng phần nhỏ
+    thay vì ±1 chữ số hex (16 lần công việc) như quy tắc cũ
+    Giao diện chung: next_target nhận target của block vừa đào và thời gian đào block đó,
+    trả về target cho block kế tiếp
+    """
+    name = ''
+
+    def __init__(self, target_time: float):
+        if target_time <= 0:
+            raise ValueError("target_time phải lớn hơn 0")
+        self.target_time = target_time
+
+    def next_target(self, target: int, solve_time: float) -> int:
+        raise NotImplementedError
+
+    def params(self) -> Dict:
+        return {}
+
+    def to_dict(self) -> Dict:
+        return {'algorithm': self.name, 'target_time': self.target_time, **self.params()}
+
+
+class LegacyRetarget(Retargeter):
+    """
+    Quy tắc cũ: sau mỗi block, nhanh hơn 50% mục tiêu thì thêm một chữ số hex 0,
+    chậm hơn 200% mục tiêu thì bớt một chữ số
+    """
+    name = 'legacy'
+
+    def next_target(self, target: int, solve_time: float) -> int:
+        if solve_time < self.target_time * 0.5:
+            return clamp_target(target >> 4)
+        if solve_time > self.target_time * 2.0:
+            return clamp_target(target << 4)
+        return target
+
+
+class EpochRetarget(Retargeter):
+    """
+    Kiểu Bitcoin: giữ nguyên target trong một epoch gồm window block, cuối epoch
+    nhân target với (tổng thời gian thực tế / tổng thời gian mục tiêu), giới hạn trong [1/max_step, max_step]
+    """
+    name = 'epoch'
+
+    def __init__(self, target_time: float, window: int = 20, max_step: float = 4.0):
+        super().__init__(target_time)
+        if window <= 0 or max_step < 1:
+            raise ValueError("window phải lớn hơn 0 và max_step >= 1")
+        self.window = window
+        self.max_step = max_step
+        self._elapsed = 0.0
+        self._count = 0
+
+    def next_target(self, target: int, solve_time: float) -> int:
+        self._elapsed += solve_time
+        self._count += 1
+        if self._count < self.window:
+            return target
+        ratio = self._elapsed / (self.window * self.target_time)
+        self._elapsed = 0.0
+        self._count = 0
+        return scale_target(target, min(self.max_step, max(1 / self.max_step, ratio)))
+
+    def params(self) -> Dict:
+        return {'window': self.window, 'max_step': self.max_step}
+
+
+class WindowRetarget(Retargeter):
+    """
+    Cửa sổ trượt (kiểu LWMA): mỗi block, target mới = trung bình target của window block gần nhất
+    nhân với (thời gian đào trung bình có trọng số tuyến tính / target_time);
+    block mới hơn có trọng số lớn hơn nên phản ứng nhanh mà vẫn mượt
+    Mỗi block target chỉ được đổi tối đa max_step lần so với target hiện tại
+    (vd. sau khi cửa sổ vừa reset, một block đào rất nhanh không làm target giảm 100 lần)
+    """
+    name = 'window'
+
+    def __init__(self, target_time: float, window: int = 30, max_step: float = 4.0):
+        super().__init__(target_time)
+        if window <= 0 or max_step < 1:
+            raise ValueError("window phải lớn hơn 0 và max_step >= 1")
+        self.window = window
+        self.max_step = max_step
+        self._samples: deque = deque(maxlen=window)  # (target, solve_time)
+
+    def next_target(self, target: int, solve_time: float) -> int:
+        # Chặn mẫu bất thường (vd. một block rất lâu) để không kéo lệch cả cửa sổ
+        self._samples.append((target, min(max(solve_time, 0.0), self.target_time * 6)))
+        n = len(self._samples)
+        weighted_time = sum((i + 1) * t for i, (_, t) in enumerate(self._samples))
+        mean_time = weighted_time / (n * (n + 1) / 2)
+        mean_target = sum(t for t, _ in self._samples) // n
+        new_target = scale_target(mean_target, mean_time / self.target_time)
+        lowest = scale_target(target, 1 / self.max_step)
+        highest = scale_target(target, self.max_step)
+        return min(highest, max(lowest, new_target))
+
+    def params(self) -> Dict:
+        return {'window': self.window, 'max_step': self.max_step}
+
+
+class AsertRetarget(Retargeter):
+    """
+    Kiểu ASERT / EMA: sau mỗi block nhân target với 2^((solve_time - target_time) / half_life)
+    Tương đương trung bình trượt hàm mũ của thời gian block, chỉ cần target hiện tại (không lưu cửa sổ)
+    half_life: số giây lệch tích luỹ làm target tăng/giảm gấp đôi
+    """
+    name = 'asert'
+
+    def __init__(self, target_time: float, half_life: Optional[float] = None):
+        super().__init__(target_time)
+        self.half_life = half_life if half_life is not None else target_time * 8
+        if self.half_life <= 0:
+            raise ValueError("half_life phải lớn hơn 0")
+
+    def next_target(self, target: int, solve_time: float) -> int:
+        exponent = (solve_time - self.target_time) / self.half_life
+        return scale_target(target, 2 ** max(-4.0, min(4.0, exponent)))
+
+    def params(self) -> Dict:
+        return {'half_life': self.half_life}
+
+
+# Các thuật toán có thể chọn theo tên
+RETARGET_ALGORITHMS = {
+    cls.name: cls for cls in (LegacyRetarget, EpochRetarget, WindowRetarget, AsertRetarget)
+}
+
+# Mặc định giữ quy tắc cũ để hành vi độ khó không đổi; chọn 'asert' / 'window' / 'epoch' bằng set_retarget
+DEFAULT_RETARGET = 'legacy'
+
+
+def create_retargeter(name: str, target_time: float, **params) -> Retargeter:
+    """Tạo retargeter theo tên (xem RETARGET_ALGORITHMS)"""
+    if name not in RETARGET_ALGORITHMS:
+        raise ValueError(f"Thuật toán retarget không hợp lệ: {name}")
+    return RETARGET_ALGORITHMS[name](target_time, **params)
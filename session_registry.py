@@ -0,0 +1,384 @@
+import hashlib
+import hmac
+import os
+import pickle
+import re
+import secrets
+import shutil
+import stat
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional
+
+from event_stream import EventBus
+
+# Số phiên tối đa giữ trong bộ nhớ
+DEFAULT_MAX_SESSIONS = 200
+
+# Phiên không được dùng quá thời gian này (giây) sẽ được đưa ra đĩa
+DEFAULT_SESSION_TTL = 1800.0
+
+# Ngân sách bộ nhớ ước lượng cho tất cả các phiên (bytes)
+DEFAULT_MEMORY_BUDGET = 512 * 1024 * 1024
+
+# File phiên trên đĩa không được nạp lại sau thời gian này (giây) sẽ bị xoá
+DEFAULT_DISK_TTL = 7 * 24 * 3600.0
+
+# Tổng dung lượng tối đa của các file phiên trên đĩa (bytes); vượt thì xoá file cũ nhất trước
+DEFAULT_DISK_BUDGET = 2 * 1024 * 1024 * 1024
+
+# Ước lượng bộ nhớ cho một block / một bản ghi validation (bytes)
+BLOCK_MEMORY_ESTIMATE = 600
+VALIDATION_RECORD_ESTIMATE = 28
+
+# Session id hợp lệ (cũng là tên file khi lưu ra đĩa)
+SESSION_ID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+# Độ dài chữ ký HMAC-SHA256 ở đầu mỗi file phiên
+SIGNATURE_SIZE = hashlib.sha256().digest_size
+
+
+def prepare_private_dir(path: str):
+    """
+    Tạo (nếu chưa có) thư mục chỉ chủ sở hữu truy cập được (0700) và kiểm tra nó thuộc về tiến trình hiện tại
+    Thư mục là symlink, thuộc người dùng khác hoặc cho người khác ghi vào thì báo PermissionError
+    """
+    os.makedirs(path, mode=0o700, exist_ok=True)
+    info = os.lstat(path)
+    if not stat.S_ISDIR(info.st_mode):
+        raise PermissionError(f"{path} không phải thư mục")
+    if hasattr(os, 'getuid') and info.st_uid != os.getuid():
+        raise PermissionError(f"Thư mục {path} thuộc về người dùng khác")
+    if info.st_mode & 0o077:
+        os.chmod(path, 0o700)
+
+
+class Session:
+    """
+    Một phiên mô phỏng độc lập: bộ simulator PoW / PoS / Fork và luồng event riêng
+    simulators: dict tên -> simulator (vd. {'pow': PoWSimulator, ...})
+    """
+    def __init__(self, session_id: str, simulators: Dict, pinned: bool = False):
+        self.id = session_id
+        self.simulators = simulators
+        self.events = EventBus()
+        self.pinned = pinned  # Phiên được ghim không bao giờ bị đưa ra khỏi bộ nhớ
+        self.created_at = time.time()
+        self.last_access = self.created_at
+        self.active_requests = 0
+        self.memory_estimate = 0
+
+    def __getattr__(self, name):
+        # session.pow / session.pos / session.fork
+        simulators = self.__dict__.get('simulators')
+        if simulators is not None and name in simulators:
+            return simulators[name]
+        raise AttributeError(name)
+
+    def estimate_memory(self) -> int:
+        """Ước lượng bộ nhớ của phiên từ số block và số bản ghi validation"""
+        total = 0
+        for simulator in self.simulators.values():
+            blockchain = getattr(simulator, 'blockchain', None)
+            if isinstance(blockchain, list):
+                total += len(blockchain) * BLOCK_MEMORY_ESTIMATE
+            tree = getattr(simulator, 'tree', None)
+            if tree is not None:
+                total += len(tree.blocks) * BLOCK_MEMORY_ESTIMATE
+            history = getattr(simulator, 'validation_history', None)
+            if history is not None:
+                total += len(history) * VALIDATION_RECORD_ESTIMATE
+        return total
+
+    def __getstate__(self):
+        # EventBus (hàng đợi của client đang kết nối) không được lưu, chỉ giữ id event cuối;
+        # nạp lại thì tạo bus mới đánh số tiếp sau id đó
+        state = self.__dict__.copy()
+        state['last_event_id'] = state.pop('events').last_event_id
+        state['active_requests'] = 0
+        return state
+
+    def __setstate__(self, state):
+        last_event_id = state.pop('last_event_id', 0)
+        self.__dict__.update(state)
+        self.events = EventBus(last_event_id=last_event_id)
+
+    def to_dict(self) -> Dict:
+        return {
+            'id': self.id,
+            'created_at': self.created_at,
+            'last_access': self.last_access,
+            'memory_estimate': self.memory_estimate,
+            'pinned': self.pinned
+        }
+
+
+class SessionRegistry:
+    """
+    Quản lý các phiên mô phỏng theo session id
+    - Tạo phiên mới bằng factory(session_id) khi gặp id lần đầu
+    - Giữ tối đa max_sessions phiên và memory_budget bytes (ước lượng) trong bộ nhớ,
+      bỏ phiên ít dùng nhất (LRU) trước; phiên không dùng quá ttl giây cũng bị bỏ
+    - Phiên bị bỏ được pickle ra spill_dir (nếu có) và nạp lại khi được dùng tiếp
+      spill_dir phải là thư mục riêng (0700) của tiến trình; mỗi file được ký HMAC bằng spill_key
+      và chỉ được unpickle khi chữ ký đúng (không truyền spill_key thì sinh khoá ngẫu nhiên cho tiến trình,
+      file của các lần chạy trước bị bỏ qua)
+      temporary_spill=True (không có spill_dir): ghi vào thư mục tạm riêng, chỉ tạo ở lần ghi đầu tiên
+      và xoá khi close()
+    - File phiên quá disk_ttl giây hoặc vượt disk_budget bytes (xoá file cũ nhất trước) bị xoá khỏi đĩa
+    - Phiên đang phục vụ request, có job đào chưa xong hoặc có client theo dõi event thì không bị bỏ
+    _lock chỉ bảo vệ bảng phiên: tạo phiên, pickle / ghi / đọc / unpickle file chạy ngoài khoá,
+    phiên đang được nạp hoặc ghi ra đĩa được đánh dấu để request khác cùng id chờ nó xong
+    """
+    def __init__(self, factory: Callable[[str], Session], max_sessions: int = DEFAULT_MAX_SESSIONS,
+                 ttl: Optional[float] = DEFAULT_SESSION_TTL, memory_budget: Optional[int] = DEFAULT_MEMORY_BUDGET,
+                 spill_dir: Optional[str] = None, disk_ttl: Optional[float] = DEFAULT_DISK_TTL,
+                 is_busy: Optional[Callable[[Session], bool]] = None, spill_key: Optional[bytes] = None,
+                 disk_budget: Optional[int] = DEFAULT_DISK_BUDGET, temporary_spill: bool = False):
+        if max_sessions <= 0:
+            raise ValueError("max_sessions phải lớn hơn 0")
+        self.factory = factory
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.memory_budget = memory_budget
+        self.spill_dir = spill_dir
+        self.spill_key = spill_key or secrets.token_bytes(32)
+        self.disk_ttl = disk_ttl
+        self.disk_budget = disk_budget
+        self.is_busy = is_busy
+        self._temporary_spill = temporary_spill and spill_dir is None
+        self._sessions: 'OrderedDict[str, Session]' = OrderedDict()
+        self._moving: Dict[str, threading.Event] = {}  # id phiên đang được nạp / ghi ra đĩa
+        self._memory = 0
+        self._lock = threading.Lock()
+        self._disk_lock = threading.Lock()  # Tạo thư mục tạm và dọn file trên đĩa
+        self._last_disk_sweep = 0.0
+        self.spilled = 0
+        self.restored = 0
+        self.dropped = 0
+        self.rejected = 0
+        if spill_dir is not None:
+            prepare_private_dir(spill_dir)
+
+    @staticmethod
+    def valid_id(session_id: str) -> bool:
+        return bool(SESSION_ID_PATTERN.match(session_id))
+
+    def acquire(self, session_id: str) -> Session:
+        """Lấy phiên để phục vụ một request (tạo mới hoặc nạp từ đĩa nếu cần); gọi release() khi xong"""
+        if not self.valid_id(session_id):
+            raise ValueError(f"Session id không hợp lệ: {session_id}")
+        while True:
+            with self._lock:
+                session = self._sessions.get(session_id)
+                if session is not None:
+                    self._sessions.move_to_end(session_id)
+                    session.active_requests += 1
+                    session.last_access = time.time()
+                    victims = self._evict()
+                    break
+                moving = self._moving.get(session_id)
+                if moving is None:
+                    moving = self._moving[session_id] = threading.Event()
+                    break
+            # Phiên đang được nạp hoặc ghi ra đĩa bởi request khác: chờ xong rồi thử lại
+            moving.wait()
+        
+        if session is None:
+            # Nạp / tạo phiên ngoài khoá (unpickle, đọc file, factory có thể chậm)
+            try:
+                session = self._restore(session_id) or self.factory(session_id)
+                session.memory_estimate = session.estimate_memory()
+            finally:
+                with self._lock:
+                    del self._moving[session_id]
+                    if session is not None:
+                        self._sessions[session_id] = session
+                        self._memory += session.memory_estimate
+                        session.active_requests += 1
+                        session.last_access = time.time()
+                        victims = self._evict()
+                moving.set()
+        self._spill_all(victims)
+        return session
+
+    def release(self, session: Session):
+        """Kết thúc request trên phiên, cập nhật ước lượng bộ nhớ"""
+        memory = session.estimate_memory()
+        with self._lock:
+            session.active_requests -= 1
+            session.last_access = time.time()
+            if self._sessions.get(session.id) is session:
+                self._memory += memory - session.memory_estimate
+            session.memory_estimate = memory
+            victims = self._evict()
+        self._spill_all(victims)
+
+    def sweep(self):
+        """Bỏ các phiên hết hạn / vượt giới hạn (gọi định kỳ nếu không có request)"""
+        with self._lock:
+            victims = self._evict()
+        self._spill_all(victims)
+
+    def _busy(self, session: Session) -> bool:
+        if session.pinned or session.active_requests > 0 or session.events.subscriber_count > 0:
+            return True
+        return self.is_busy is not None and self.is_busy(session)
+
+    def _evict(self) -> List[Session]:
+        """
+        Chọn phiên cần bỏ theo thứ tự LRU khi vượt giới hạn hoặc hết hạn (gọi khi đang giữ _lock)
+        Phiên được bỏ khỏi bảng và đánh dấu đang ghi ra đĩa; caller gọi _spill_all sau khi nhả khoá
+        """
+        now = time.time()
+        victims = []
+        for session_id in list(self._sessions):
+            session = self._sessions[session_id]
+            over_limit = (
+                len(self._sessions) > self.max_sessions
+                or (self.memory_budget is not None and self._memory > self.memory_budget)
+            )
+            expired = self.ttl is not None and now - session.last_access > self.ttl
+            if not (over_limit or expired) or self._busy(session):
+                continue
+            del self._sessions[session_id]
+            self._memory -= session.memory_estimate
+            self._moving[session_id] = threading.Event()
+            victims.append(session)
+        return victims
+
+    def _spill_all(self, victims: List[Session]):
+        """Ghi các phiên vừa bị bỏ ra đĩa (ngoài _lock), rồi dọn file phiên trên đĩa"""
+        for session in victims:
+            spilled = False
+            try:
+                spilled = self._spill(session)
+            finally:
+                with self._lock:
+                    if spilled:
+                        self.spilled += 1
+                    else:
+                        self.dropped += 1
+                    self._moving.pop(session.id).set()
+        if victims:
+            self._sweep_disk(time.time())
+
+    def _path(self, session_id: str) -> str:
+        return os.path.join(self.spill_dir, f"{session_id}.session")
+
+    def _ensure_spill_dir(self) -> bool:
+        """Có nơi ghi phiên không; thư mục tạm (temporary_spill) chỉ được tạo ở lần ghi đầu tiên"""
+        if self.spill_dir is None and self._temporary_spill:
+            with self._disk_lock:
+                if self.spill_dir is None:
+                    self.spill_dir = tempfile.mkdtemp(prefix='blockchain-sim-sessions-')
+        return self.spill_dir is not None
+
+    def _spill(self, session: Session) -> bool:
+        """Ghi phiên ra đĩa; trả về False nếu phiên bị bỏ hẳn (không có nơi ghi)"""
+        if not self._ensure_spill_dir():
+            return False
+        path = self._path(session.id)
+        tmp_path = path + '.tmp'
+        payload = pickle.dumps(session, protocol=pickle.HIGHEST_PROTOCOL)
+        fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(self._sign(payload))
+            f.write(payload)
+        os.replace(tmp_path, path)
+        return True
+
+    def _sign(self, payload: bytes) -> bytes:
+        return hmac.new(self.spill_key, payload, hashlib.sha256).digest()
+
+    def _restore(self, session_id: str) -> Optional[Session]:
+        """
+        Nạp lại phiên đã ghi ra đĩa (file bị xoá sau khi nạp)
+        File có chữ ký sai (không do registry này ghi) bị xoá mà không unpickle
+        """
+        if self.spill_dir is None:
+            return None
+        path = self._path(session_id)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            os.remove(path)
+        except FileNotFoundError:
+            return None
+        signature, payload = data[:SIGNATURE_SIZE], data[SIGNATURE_SIZE:]
+        if not hmac.compare_digest(signature, self._sign(payload)):
+            with self._lock:
+                self.rejected += 1
+            return None
+        session = pickle.loads(payload)
+        with self._lock:
+            self.restored += 1
+        return session
+
+    def _sweep_disk(self, now: float):
+        """
+        Dọn file phiên: xoá file quá disk_ttl giây không được nạp lại (tối đa mỗi phút một lần),
+        rồi xoá file cũ nhất cho tới khi tổng dung lượng không vượt disk_budget
+        """
+        if self.spill_dir is None or not self._disk_lock.acquire(blocking=False):
+            return
+        try:
+            expire = self.disk_ttl is not None and now - self._last_disk_sweep > 60
+            if expire:
+                self._last_disk_sweep = now
+            elif self.disk_budget is None:
+                return
+            files = []
+            with os.scandir(self.spill_dir) as entries:
+                for entry in entries:
+                    if not entry.name.endswith('.session'):
+                        continue
+                    try:
+                        info = entry.stat()
+                    except OSError:
+                        continue
+                    if expire and now - info.st_mtime > self.disk_ttl:
+                        _remove_quietly(entry.path)
+                    else:
+                        files.append((info.st_mtime, info.st_size, entry.path))
+            total = sum(size for _, size, _ in files)
+            if self.disk_budget is not None and total > self.disk_budget:
+                for _, size, path in sorted(files):
+                    if total <= self.disk_budget:
+                        break
+                    _remove_quietly(path)
+                    total -= size
+        finally:
+            self._disk_lock.release()
+
+    def close(self):
+        """Xoá thư mục tạm (temporary_spill) cùng các phiên đã ghi vào đó"""
+        with self._disk_lock:
+            if self._temporary_spill and self.spill_dir is not None:
+                shutil.rmtree(self.spill_dir, ignore_errors=True)
+                self.spill_dir = None
+
+    def stats(self) -> Dict:
+        """Thống kê registry"""
+        with self._lock:
+            return {
+                'sessions_in_memory': len(self._sessions),
+                'max_sessions': self.max_sessions,
+                'memory_estimate': self._memory,
+                'memory_budget': self.memory_budget,
+                'ttl': self.ttl,
+                'spilled': self.spilled,
+                'restored': self.restored,
+                'dropped': self.dropped,
+                'rejected': self.rejected
+            }
+
+
+def _remove_quietly(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
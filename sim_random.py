@@ -0,0 +1,81 @@
+import hashlib
+import random
+import time
+from typing import Dict, Optional
+
+try:
+    import numpy as np
+except ImportError:  # numpy là tuỳ chọn, chỉ cần khi dùng RandomStreams.numpy()
+    np = None
+
+
+def new_seed() -> int:
+    """Seed ngẫu nhiên mới (lấy từ nguồn ngẫu nhiên của hệ điều hành)"""
+    return random.SystemRandom().getrandbits(63)
+
+
+class RandomStreams:
+    """
+    Nguồn ngẫu nhiên có seed cho một simulator, tách thành các luồng (stream) độc lập theo tên
+    - Mỗi thành phần (từng miner, phần chọn validator, độ trễ mạng...) dùng một stream riêng
+      nên thêm / bớt một thành phần không làm lệch dãy số ngẫu nhiên của các thành phần khác
+    - Seed của stream suy ra từ (seed, tên) bằng SHA-256 nên giống nhau giữa các process và các lần chạy
+    - Không truyền seed thì tự sinh seed mới; seed luôn được ghi lại để chạy lại đúng kết quả
+    """
+    def __init__(self, seed: Optional[int] = None):
+        self.seed = seed if seed is not None else new_seed()
+        self._streams: Dict[str, random.Random] = {}
+        self._numpy_streams: Dict[str, object] = {}
+
+    def seed_for(self, name: str) -> int:
+        """Seed 64-bit của stream có tên name (dùng để khởi tạo RNG trong process worker)"""
+        digest = hashlib.sha256(f"{self.seed}:{name}".encode()).digest()
+        return int.from_bytes(digest[:8], 'big')
+
+    def stream(self, name: str) -> random.Random:
+        """random.Random riêng cho thành phần name (tạo ở lần gọi đầu, các lần sau dùng lại)"""
+        rng = self._streams.get(name)
+        if rng is None:
+            rng = self._streams[name] = random.Random(self.seed_for(name))
+        return rng
+
+    def numpy(self, name: str):
+        """numpy.random.Generator riêng cho thành phần name (cần numpy)"""
+        if np is None:
+            raise RuntimeError("Cần cài numpy để dùng RandomStreams.numpy()")
+        rng = self._numpy_streams.get(name)
+        if rng is None:
+            rng = self._numpy_streams[name] = np.random.default_rng(self.seed_for(name))
+        return rng
+
+    def spawn(self, name: str) -> 'RandomStreams':
+        """Bộ stream con độc lập (vd. cho từng lần chạy song song), xác định bởi seed và name"""
+        return RandomStreams(self.seed_for(name))
+
+
+class SystemClock:
+    """Đồng hồ thật (time.time)"""
+    def time(self) -> float:
+        return time.time()
+
+
+class ManualClock:
+    """
+    Đồng hồ giả lập cho các lần chạy tái lập được: trả về thời điểm hiện tại rồi tự tiến thêm tick giây
+    Dùng advance() để tiến thời gian thủ công
+    """
+    def __init__(self, start: float = 0.0, tick: float = 0.0):
+        self.now = start
+        self.tick = tick
+
+    def time(self) -> float:
+        now = self.now
+        self.now += self.tick
+        return now
+
+    def advance(self, seconds: float):
+        self.now += seconds
+
+
+# Đồng hồ mặc định của các simulator
+SYSTEM_CLOCK = SystemClock()
@@ -0,0 +1,75 @@
+import random
+from typing import Iterable, List
+
+
+class StakeIndex:
+    """
+    Chỉ mục chọn validator theo stake dựa trên Fenwick tree (Binary Indexed Tree)
+    - Thêm validator / thay đổi stake: O(log n)
+    - Chọn ngẫu nhiên theo trọng số stake: O(log n)
+    Nhờ vậy chi phí chọn mỗi block gần như không đổi khi số validator tăng lên hàng trăm nghìn
+    """
+    def __init__(self, stakes: Iterable[float] = ()):
+        self.values: List[float] = list(stakes)
+        self._build()
+    
+    def _build(self):
+        """Xây dựng cây trong O(n) từ danh sách stake hiện tại"""
+        n = len(self.values)
+        self.tree = [0.0] * (n + 1)
+        for i, value in enumerate(self.values, start=1):
+            self.tree[i] += value
+            parent = i + (i & -i)
+            if parent <= n:
+                self.tree[parent] += self.tree[i]
+        self.total = float(sum(self.values))
+    
+    def __len__(self) -> int:
+        return len(self.values)
+    
+    def _prefix_sum(self, i: int) -> float:
+        """Tổng stake của i phần tử đầu tiên"""
+        result = 0.0
+        while i > 0:
+            result += self.tree[i]
+            i -= i & -i
+        return result
+    
+    def append(self, stake: float):
+        """Thêm stake của một validator mới vào cuối chỉ mục"""
+        self.values.append(stake)
+        i = len(self.values)
+        # Nút i quản lý đoạn (i - lowbit(i), i]
+        covered = self._prefix_sum(i - 1) - self._prefix_sum(i - (i & -i))
+        self.tree.append(covered + stake)
+        self.total += stake
+    
+    def update(self, index: int, stake: float):
+        """Đặt lại stake của validator ở vị trí index (tính từ 0)"""
+        delta = stake - self.values[index]
+        self.values[index] = stake
+        self.total += delta
+        i = index + 1
+        while i < len(self.tree):
+            self.tree[i] += delta
+            i += i & -i
+    
+    def find(self, value: float) -> int:
+        """Vị trí nhỏ nhất có tổng stake tích luỹ lớn hơn value"""
+        n = len(self.values)
+        position = 0
+        step = 1 << n.bit_length()
+        while step:
+            candidate = position + step
+            if candidate <= n and self.tree[candidate] <= value:
+                position = candidate
+                value -= self.tree[candidate]
+            step >>= 1
+        # Chặn sai số làm tròn số thực ở cuối dãy
+        return min(position, n - 1)
+    
+    def select(self, rng=random) -> int:
+        """Chọn ngẫu nhiên một vị trí với xác suất tỉ lệ thuận với stake"""
+        if self.total <= 0:
+            raise ValueError("Tổng stake phải lớn hơn 0")
+        return self.find(rng.random() * self.total)
@@ -1,6 +1,22 @@
 // ==================== Global State ====================
 let currentTab = 'pow';
 const API_BASE = window.location.origin + '/api';
+let eventSource = null;
+let powChainLength = 0;
+// Dữ liệu đang hiển thị, được cập nhật trực tiếp từ delta của event stream
+let powMiners = null;
+let posValidators = null;
+let forkChains = null;
+
+// Mỗi trình duyệt dùng một phiên mô phỏng riêng (server đọc cookie sim_session)
+function ensureSession() {
+    if (document.cookie.split('; ').some(c => c.startsWith('sim_session='))) return;
+    const id = (window.crypto && crypto.randomUUID)
+        ? crypto.randomUUID()
+        : Date.now().toString(36) + '-' + Math.random().toString(36).slice(2);
+    document.cookie = `sim_session=${id}; path=/; max-age=31536000; SameSite=Lax`;
+}
+ensureSession();
 
 // ==================== Tab Switching ====================
 function switchTab(tabName) {
@@ -58,13 +74,38 @@ async function mineBlock() {
     btn.textContent = '⛏️ Mining...';
     
     try {
-        const response = await fetch(`${API_BASE}/pow/mine`, {
-            method: 'POST'
+        // Gửi job đào chạy nền rồi chờ kết quả (long-poll) thay vì giữ request trong lúc đào
+        const response = await fetch(`${API_BASE}/pow/jobs`, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ count: 1 })
         });
         const data = await response.json();
+        if (!data.success) {
+            throw new Error(data.error);
+        }
         
-        if (data.success) {
-            showPoWResult(data.data);
+        let job = data.data;
+        while (job.status === 'queued' || job.status === 'running') {
+            const poll = await fetch(`${API_BASE}/pow/jobs/${job.id}?wait=10`).then(r => r.json());
+            if (!poll.success) {
+                throw new Error(poll.error);
+            }
+            job = poll.data;
+        }
+        
+        if (job.status === 'failed') {
+            throw new Error(job.error);
+        }
+        if (job.results.length > 0) {
+            const result = job.results[job.results.length - 1];
+            // Cuộc đua hết thời gian hoặc block bị bỏ vì chain đã thay đổi: hiển thị lỗi của server
+            if ('error' in result) {
+                throw new Error(result.error);
+            }
+            showPoWResult(result);
+        }
+        if (!eventSource) {
             await loadPoWData();
         }
     } catch (error) {
@@ -85,7 +126,12 @@ function renderPoWBlockchain(blockchain) {
         return;
     }
     
-    container.innerHTML = blockchain.map((block, idx) => `
+    powChainLength = blockchain.length;
+    container.innerHTML = blockchain.map((block, idx) => powBlockCard(block, idx < blockchain.length - 1)).join('');
+}
+
+function powBlockCard(block, hasNext) {
+    return `
         <div class="bg-gradient-to-r from-indigo-600 to-purple-600 text-white rounded-xl p-6 relative animate-block-appear">
             <div class="flex justify-between items-center mb-3">
                 <span class="text-xl font-bold">Block #${block.index}</span>
@@ -98,12 +144,49 @@ function renderPoWBlockchain(blockchain) {
             <div class="bg-white/10 p-3 rounded-lg font-mono text-sm break-all">
                 🔗 Previous: ${block.previous_hash}
             </div>
-            ${idx < blockchain.length - 1 ? '<div class="absolute left-1/2 -bottom-4 transform -translate-x-1/2 text-2xl">⬇️</div>' : ''}
+            ${hasNext ? '<div class="absolute left-1/2 -bottom-4 transform -translate-x-1/2 text-2xl">⬇️</div>' : ''}
         </div>
-    `).join('');
+    `;
+}
+
+// Thêm một block mới vào cuối danh sách (từ event stream) thay vì tải lại cả chain
+// Trả về true nếu block được thêm (false nếu đã hiển thị hoặc phải tải lại toàn bộ)
+function appendPoWBlock(block, blockchainLength) {
+    if (block.index < powChainLength) return false;  // Đã hiển thị
+    if (block.index > powChainLength) {
+        // Bị lỡ event: tải lại toàn bộ
+        loadPoWData();
+        return false;
+    }
+    
+    const container = document.getElementById('pow-blockchain');
+    if (powChainLength === 0) {
+        container.innerHTML = '';
+    } else if (container.lastElementChild) {
+        container.lastElementChild.insertAdjacentHTML('beforeend', '<div class="absolute left-1/2 -bottom-4 transform -translate-x-1/2 text-2xl">⬇️</div>');
+    }
+    container.insertAdjacentHTML('beforeend', powBlockCard(block, false));
+    powChainLength = blockchainLength;
+    document.getElementById('pow-length').textContent = blockchainLength;
+    return true;
+}
+
+// Cộng block cho miner thắng (từ event block) thay vì tải lại danh sách miner
+function creditMiner(name) {
+    const miner = powMiners && powMiners.find(m => m.name === name);
+    if (!miner) {
+        // Miner chưa có trong danh sách đang hiển thị (vd. thêm từ tab khác): tải lại danh sách
+        fetch(`${API_BASE}/pow/miners`).then(r => r.json()).then(miners => {
+            if (miners.success) renderMiners(miners.data);
+        });
+        return;
+    }
+    miner.blocks_mined += 1;
+    renderMiners(powMiners);
 }
 
 function renderMiners(miners) {
+    powMiners = miners;
     const container = document.getElementById('pow-miners');
     
     const totalBlocks = miners.reduce((sum, m) => sum + m.blocks_mined, 0);
@@ -188,7 +271,7 @@ function showPoWResult(result) {
     }
     
     // Update difficulty display
-    document.getElementById('pow-difficulty').textContent = result.difficulty;
+    document.getElementById('pow-difficulty').textContent = result.difficulty_value ?? result.difficulty;
     
     content.innerHTML = `
         <div class="p-4 bg-gray-50 rounded-xl border-l-4 border-indigo-600 mb-3">
@@ -205,7 +288,7 @@ function showPoWResult(result) {
         </div>
         <div class="p-4 bg-gray-50 rounded-xl border-l-4 border-indigo-600 mb-3">
             <span class="block text-sm font-semibold text-gray-700 mb-1">Current Difficulty:</span>
-            <span class="text-lg text-gray-900">📊 ${result.difficulty}</span>
+            <span class="text-lg text-gray-900">📊 ${result.difficulty_value ?? result.difficulty}</span>
         </div>
         ${result.adjustment ? `
             <div class="bg-blue-50 border-l-4 border-blue-500 p-4 rounded-lg text-blue-800">
@@ -215,7 +298,7 @@ function showPoWResult(result) {
     `;
     
     card.classList.remove('hidden');
-    document.getElementById('pow-difficulty').textContent = result.difficulty;
+    document.getElementById('pow-difficulty').textContent = result.difficulty_value ?? result.difficulty;
 }
 
 async function resetPoW() {
@@ -265,7 +348,9 @@ async function validateBlock() {
         
         if (data.success) {
             showPoSResult(data.data);
-            await loadPoSData();
+            if (!eventSource) {
+                await loadPoSData();
+            }
         }
     } catch (error) {
         console.error('Error validating block:', error);
@@ -304,7 +389,9 @@ async function runPoSTest(count = 100) {
             data.data.duration = duration;
             data.data.count = count;
             showPoSTestResult(data.data);
-            await loadPoSData();
+            if (!eventSource) {
+                await loadPoSData();
+            }
         }
     } catch (error) {
         console.error('Error running PoS test:', error);
@@ -316,7 +403,44 @@ async function runPoSTest(count = 100) {
     }
 }
 
+// Áp dụng kết quả một lần validation (event validator_selected) lên danh sách validator đang hiển thị
+function applyValidation(event) {
+    const validator = posValidators && posValidators.find(v => v.name === event.validator);
+    if (!validator) {
+        loadPoSData();
+        return;
+    }
+    validator.blocks_validated = event.total_blocks_validated;
+    validator.total_rewards = event.total_rewards;
+    renderValidatorStats();
+}
+
+// Áp dụng thống kê của một loạt validation (event validations): số lần được chọn thêm và tổng thưởng mới
+function applyValidations(statistics) {
+    if (!posValidators || posValidators.length !== Object.keys(statistics).length
+            || posValidators.some(v => !(v.name in statistics))) {
+        loadPoSData();
+        return;
+    }
+    posValidators.forEach(v => {
+        v.blocks_validated += statistics[v.name].times_selected;
+        v.total_rewards = statistics[v.name].total_rewards;
+    });
+    renderValidatorStats();
+}
+
+// Tính lại tỉ lệ validate (như server) rồi vẽ lại danh sách và biểu đồ
+function renderValidatorStats() {
+    const total = posValidators.reduce((sum, v) => sum + v.blocks_validated, 0);
+    posValidators.forEach(v => {
+        v.validation_percentage = total > 0 ? Math.round(v.blocks_validated / total * 1000) / 10 : 0;
+    });
+    renderValidators(posValidators);
+    renderPoSChart(posValidators);
+}
+
 function renderValidators(validators) {
+    posValidators = validators;
     const container = document.getElementById('pos-validators');
     
     container.innerHTML = validators.map(validator => {
@@ -499,7 +623,9 @@ async function createFork() {
         
         if (data.success) {
             showForkResult(data.data);
-            await loadForkData();
+            if (!eventSource) {
+                await loadForkData();
+            }
         }
     } catch (error) {
         console.error('Error creating fork:', error);
@@ -528,7 +654,9 @@ async function resolveFork() {
                 alert(data.data.error);
             } else {
                 showForkResolution(data.data);
-                await loadForkData();
+                if (!eventSource) {
+                    await loadForkData();
+                }
             }
         }
     } catch (error) {
@@ -541,7 +669,36 @@ async function resolveFork() {
     }
 }
 
+// Nối đoạn block mới của hai nhánh (từ event fork_created) vào chain đang hiển thị
+function applyForkCreated(event) {
+    const base = forkChains && forkChains[0];
+    const tip = base && base.blocks[base.blocks.length - 1];
+    if (!tip || tip.hash !== event.fork_point.hash) {
+        loadForkData();
+        return;
+    }
+    renderChains([event.fork_a, event.fork_b].map(fork => ({
+        name: fork.name,
+        length: fork.length,
+        blocks: base.blocks.concat(fork.blocks)
+    })));
+}
+
+// Chỉ giữ lại nhánh thắng (từ event fork_resolved)
+function applyForkResolved(event) {
+    if (event.error) return;
+    const winner = event.chains_compared.find(c => c.is_winner);
+    const chain = winner && forkChains && forkChains.find(c => c.name === winner.name);
+    const tip = chain && chain.blocks[chain.blocks.length - 1];
+    if (!tip || tip.hash !== event.tip_hash) {
+        loadForkData();
+        return;
+    }
+    renderChains([{ ...chain, name: event.winner }]);
+}
+
 function renderChains(chains) {
+    forkChains = chains;
     const container = document.getElementById('fork-chains');
     
     if (!chains || chains.length === 0) {
@@ -656,7 +813,53 @@ async function resetFork() {
     }
 }
 
+// ==================== Event Stream ====================
+// Nhận thay đổi qua Server-Sent Events, mỗi event chỉ chứa phần thay đổi
+function connectEventStream() {
+    if (!window.EventSource) return;
+    
+    eventSource = new EventSource(`${API_BASE}/events`);
+    
+    eventSource.addEventListener('block', (e) => {
+        const event = JSON.parse(e.data).data;
+        if (appendPoWBlock(event.block, event.blockchain_length)) {
+            creditMiner(event.winner);
+        }
+    });
+    
+    eventSource.addEventListener('difficulty', (e) => {
+        const event = JSON.parse(e.data).data;
+        document.getElementById('pow-difficulty').textContent = event.difficulty_value ?? event.difficulty;
+        updateDifficultyAdjustment(event.adjustment);
+    });
+    
+    // Tab khác tải lại dữ liệu khi được mở nên chỉ áp dụng delta cho tab đang hiển thị
+    eventSource.addEventListener('validator_selected', (e) => {
+        if (currentTab === 'pos') applyValidation(JSON.parse(e.data).data);
+    });
+    
+    eventSource.addEventListener('validations', (e) => {
+        if (currentTab === 'pos') applyValidations(JSON.parse(e.data).data.statistics);
+    });
+    
+    eventSource.addEventListener('fork_created', (e) => {
+        if (currentTab === 'fork') applyForkCreated(JSON.parse(e.data).data);
+    });
+    
+    eventSource.addEventListener('fork_resolved', (e) => {
+        if (currentTab === 'fork') applyForkResolved(JSON.parse(e.data).data);
+    });
+    
+    eventSource.addEventListener('reset', (e) => {
+        const simulator = JSON.parse(e.data).data.simulator;
+        if (simulator === 'pow') loadPoWData();
+        else if (simulator === 'pos' && currentTab === 'pos') loadPoSData();
+        else if (simulator === 'fork' && currentTab === 'fork') loadForkData();
+    });
+}
+
 // ==================== Initialize ====================
 document.addEventListener('DOMContentLoaded', () => {
     loadPoWData();
+    connectEventStream();
 });
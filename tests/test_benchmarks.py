@@ -0,0 +1,33 @@
+from benchmarks.suite import compare, result, run
+
+
+def report(**results):
+    return {'meta': {}, 'results': results}
+
+
+def test_compare_flags_only_regressions_past_threshold():
+    baseline = report(**{
+        'hashing.calculate_hash': result(100.0, 'hash/s', True),
+        'pos.loop.1000': result(1.0, 's', False),
+        'pos.vectorized.1000': result(1.0, 's', False)
+    })
+    current = report(**{
+        'hashing.calculate_hash': result(80.0, 'hash/s', True),
+        'pos.loop.1000': result(1.05, 's', False),
+        'pos.vectorized.1000': result(0.5, 's', False),
+        'pos.vectorized.100000': result(2.0, 's', False)
+    })
+    rows = {row['name']: row for row in compare(baseline, current, 10.0)}
+    # Chỉ số chỉ có ở một lần chạy thì không so sánh
+    assert set(rows) == {'hashing.calculate_hash', 'pos.loop.1000', 'pos.vectorized.1000'}
+    assert rows['hashing.calculate_hash']['regression']
+    assert rows['hashing.calculate_hash']['change'] == -20.0
+    assert not rows['pos.loop.1000']['regression']
+    assert not rows['pos.vectorized.1000']['regression']
+
+
+def test_run_reports_selected_groups_with_metadata():
+    output = run('quick', ['hashing'])
+    assert output['meta']['profile'] == 'quick'
+    assert set(output['results']) == {'hashing.calculate_hash', 'hashing.midstate'}
+    assert all(metric['higher_is_better'] and metric['value'] > 0 for metric in output['results'].values())
@@ -0,0 +1,61 @@
+import gc
+import json
+import weakref
+from pow_simulator import Block, _JsonCache, difficulty_to_target
+
+
+def make_chain(length):
+    blocks = [Block(0, 1700000000.0, "Genesis Block", "0", target=difficulty_to_target(4))]
+    for i in range(1, length):
+        parent = blocks[-1]
+        blocks.append(Block(i, 1700000000.0 + i * 1.5, f"Block {i} data ✓", parent.hash, nonce=i * 7919,
+                            target=difficulty_to_target(3 + i % 3)))
+    return blocks
+
+
+def test_to_bytes_round_trip():
+    for block in make_chain(5):
+        copy = Block.from_bytes(block.to_bytes())
+        assert copy.to_dict() == block.to_dict()
+        assert copy.target == block.target
+        assert copy.calculate_hash() == block.hash
+
+
+def test_from_buffer_reads_consecutive_records():
+    blocks = make_chain(8)
+    buffer = b''.join(block.to_bytes() for block in blocks)
+    offset = 0
+    decoded = []
+    while offset < len(buffer):
+        block, offset = Block.from_buffer(memoryview(buffer), offset)
+        decoded.append(block)
+    assert offset == len(buffer)
+    assert [block.to_dict() for block in decoded] == [block.to_dict() for block in blocks]
+
+
+def test_to_json_follows_mutation():
+    block = make_chain(1)[0]
+    before = block.to_json()
+    block.nonce = 42
+    block.hash = block.calculate_hash()
+    assert block.to_json() != before
+    assert json.loads(block.to_json())['nonce'] == 42
+
+
+def test_json_cache_does_not_keep_blocks_alive():
+    block = make_chain(1)[0]
+    block.to_json()
+    ref = weakref.ref(block)
+    del block
+    gc.collect()
+    assert ref() is None
+
+
+def test_json_cache_drops_encoding_of_evicted_blocks():
+    cache = _JsonCache(2)
+    blocks = make_chain(3)
+    for block in blocks:
+        object.__setattr__(block, '_json_cache', block.to_dict())
+        cache.touch(block)
+    assert blocks[0]._json_cache is None
+    assert blocks[1]._json_cache is not None and blocks[2]._json_cache is not None
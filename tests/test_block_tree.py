@@ -0,0 +1,48 @@
+import pytest
+from block_tree import BlockTree
+from fork_resolution import Blockchain
+from pow_simulator import Block
+
+
+def extend(chain, count, label):
+    for i in range(count):
+        parent = chain.get_last_block()
+        chain.add_block(Block(parent.index + 1, float(parent.index + 1), f"{label} {i}", parent.hash))
+    return chain
+
+
+def make_fork():
+    """Chain chính 5 block, nhánh rẽ ra từ block 2 với 3 block riêng"""
+    main = Blockchain("Main", BlockTree())
+    main.add_block(Block(0, 0.0, "Genesis Block", "0"))
+    extend(main, 2, "Main")
+    fork_point = main.get_last_block()
+    branch = extend(main.fork("Branch"), 3, "Branch")
+    extend(main, 2, "Main tail")
+    return main, branch, fork_point
+
+
+def test_forks_share_the_common_prefix():
+    main, branch, fork_point = make_fork()
+    assert main.tree is branch.tree
+    assert len(main.tree) == 8
+    assert main.get_length() == 5 and branch.get_length() == 6
+    # Phần tổ tiên chung là cùng các đối tượng block, không phải bản copy
+    assert all(a is b for a, b in zip(main.chain[:3], branch.chain[:3]))
+    assert main.chain[3] is not branch.chain[3]
+
+
+def test_common_ancestor_and_segment_cover_only_the_divergence():
+    main, branch, fork_point = make_fork()
+    tree = main.tree
+    assert tree.common_ancestor(main.tip_hash, branch.tip_hash) == fork_point.hash
+    assert [block.data for block in tree.segment(branch.tip_hash, fork_point.hash)] == \
+        ["Branch 0", "Branch 1", "Branch 2"]
+    assert [block.index for block in tree.path_to(branch.tip_hash)] == list(range(6))
+    assert tree.height(branch.tip_hash) == 5
+
+
+def test_block_with_unknown_parent_is_rejected():
+    main, _, _ = make_fork()
+    with pytest.raises(ValueError):
+        main.add_block(Block(9, 9.0, "Orphan", "ab" * 32))
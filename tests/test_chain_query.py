@@ -0,0 +1,164 @@
+import pytest
+from chain_query import MAX_PAGE_SIZE, page_blocks
+from fork_resolution import ForkResolutionSimulator
+from pow_simulator import Block, difficulty_to_target
+from sim_random import ManualClock
+
+
+def make_chain(length):
+    blocks = [Block(0, 0.0, "Genesis Block", "0", target=difficulty_to_target(4))]
+    for i in range(1, length):
+        blocks.append(Block(i, float(i), f"Block {i} data", blocks[-1].hash, target=blocks[-1].target))
+    return blocks
+
+
+def index_lookup(blocks):
+    positions = {block.hash: i for i, block in enumerate(blocks)}
+    return positions.get
+
+
+def test_pages_follow_cursor_to_the_end():
+    blocks = make_chain(25)
+    seen = []
+    start = 0
+    while start is not None:
+        page, pagination = page_blocks(blocks, index_lookup(blocks), start, 10)
+        seen.extend(page)
+        start = pagination['next_start']
+    assert seen == blocks
+
+
+@pytest.mark.parametrize('limit', [0, -5])
+def test_non_positive_limit_still_advances(limit):
+    blocks = make_chain(5)
+    page, pagination = page_blocks(blocks, index_lookup(blocks), 0, limit)
+    assert pagination['limit'] == 1
+    assert len(page) == 1 and pagination['next_start'] == 1
+
+
+def test_limit_is_capped_and_since_and_tip_work():
+    blocks = make_chain(30)
+    _, pagination = page_blocks(blocks, index_lookup(blocks), 0, MAX_PAGE_SIZE * 10)
+    assert pagination['limit'] == MAX_PAGE_SIZE
+    page, _ = page_blocks(blocks, index_lookup(blocks), since_hash=blocks[26].hash)
+    assert page == blocks[27:]
+    page, pagination = page_blocks(blocks, index_lookup(blocks), tip_only=True)
+    assert page == [blocks[-1]] and pagination['tip_hash'] == blocks[-1].hash
+    with pytest.raises(KeyError):
+        page_blocks(blocks, index_lookup(blocks), since_hash='ab' * 32)
+
+
+def test_fork_chains_resolve_since_per_chain():
+    sim = ForkResolutionSimulator(seed=4, clock=ManualClock(tick=1.0))
+    sim.create_initial_chain()
+    sim.simulate_fork_scenario()
+    assert len(sim.blockchains) >= 2
+    only_first = sim.blockchains[0].chain[-1].hash
+    assert all(chain.find_block_index(only_first) is None for chain in sim.blockchains[1:])
+
+    pages = sim.get_chains_page(since_hash=only_first)
+    assert pages[0]['blocks'] == [] and 'since_missing' not in pages[0]['pagination']
+    assert all(page['pagination'].get('since_missing') for page in pages[1:])
+    with pytest.raises(KeyError):
+        sim.get_chains_page(since_hash='ab' * 32)
+
+
+def test_fork_chain_pages_walk_back_from_the_tip(monkeypatch):
+    sim = ForkResolutionSimulator(seed=4, clock=ManualClock(tick=1.0))
+    main = sim.create_initial_chain()
+    for i in range(1, 500):
+        last = main.get_last_block()
+        main.add_block(Block(i, float(i), f"Block {i} data", last.hash, target=last.target))
+    sim.simulate_fork_scenario()
+    expected = [chain.chain for chain in sim.blockchains]
+
+    def full_path(tip_hash):
+        raise AssertionError("pagination must not build the whole chain")
+    monkeypatch.setattr(sim.tree, 'path_to', full_path)
+
+    pages = sim.get_chains_page(start=495, limit=10)
+    for page, blocks in zip(pages, expected):
+        assert [b['hash'] for b in page['blocks']] == [block.hash for block in blocks[495:505]]
+        assert page['pagination']['total'] == len(blocks)
+    since = expected[0][497].hash
+    pages = sim.get_chains_page(since_hash=since, limit=2)
+    assert [b['hash'] for b in pages[0]['blocks']] == [block.hash for block in expected[0][498:500]]
+    tips = sim.get_chains_page(tip_only=True)
+    assert [page['blocks'][0]['hash'] for page in tips] == [blocks[-1].hash for blocks in expected]
+
+
+def test_fork_chains_endpoint_pages_each_chain():
+    from app import app
+    client = app.test_client()
+    headers = {'X-Session-Id': 'chain-query'}
+    client.post('/api/fork/reset', headers=headers)
+    client.post('/api/fork/create', headers=headers)
+    chains = client.get('/api/fork/chains', headers=headers).get_json()['data']
+    assert len(chains) >= 2
+    since = chains[0]['blocks'][-1]['hash']
+    response = client.get(f'/api/fork/chains?since={since}&limit=0', headers=headers)
+    assert response.status_code == 200
+    pages = response.get_json()['data']
+    assert pages[0]['pagination']['limit'] == 1
+    assert any(page['pagination'].get('since_missing') for page in pages[1:])
+
+
+def test_blockchain_endpoint_pages_and_reports_unknown_since():
+    from app import app
+    client = app.test_client()
+    headers = {'X-Session-Id': 'chain-query-pow'}
+    client.post('/api/pow/reset', headers=headers)
+    response = client.get('/api/pow/blockchain?start=0&limit=1', headers=headers)
+    assert response.status_code == 200
+    body = response.get_json()
+    assert len(body['data']) == 1 and body['data'][0]['index'] == 0
+    assert body['pagination']['limit'] == 1
+    response = client.get(f"/api/pow/blockchain?since={'ab' * 32}", headers=headers)
+    assert response.status_code == 404
+
+
+def test_fork_chain_pages_index_the_best_chain_by_height(monkeypatch):
+    sim = ForkResolutionSimulator(seed=4, clock=ManualClock(tick=1.0))
+    main = sim.create_initial_chain()
+    for i in range(1, 500):
+        last = main.get_last_block()
+        main.add_block(Block(i, float(i), f"Block {i} data", last.hash, target=last.target))
+    sim.simulate_fork_scenario()
+    expected = [chain.chain for chain in sim.blockchains]
+
+    walked = []
+    iter_ancestors = type(sim.tree).iter_ancestors
+
+    def counting_ancestors(block_hash):
+        for block in iter_ancestors(sim.tree, block_hash):
+            walked.append(block)
+            yield block
+    monkeypatch.setattr(sim.tree, 'iter_ancestors', counting_ancestors)
+    pages = sim.get_chains_page(start=0, limit=5)
+    for page, blocks in zip(pages, expected):
+        assert [b['hash'] for b in page['blocks']] == [block.hash for block in blocks[:5]]
+    # Chỉ đi ngược đoạn rẽ nhánh của từng chain, không phải cả chain
+    assert len(walked) < 50
+
+
+def test_unknown_since_on_reopened_storage_does_not_scan_the_log(tmp_path):
+    from chain_storage import SegmentLogStore
+    sim = ForkResolutionSimulator(storage=SegmentLogStore(str(tmp_path)), seed=3)
+    main = sim.create_initial_chain()
+    for i in range(1, 300):
+        last = main.get_last_block()
+        main.add_block(Block(i, float(i), f"Block {i} data", last.hash, target=last.target))
+    sim.tree.save_meta()
+    sim.storage.close()
+
+    reopened = ForkResolutionSimulator(storage=SegmentLogStore(str(tmp_path)))
+    assert reopened.load_from_storage()
+    storage = reopened.storage
+    storage.find('00' * 32)
+    reads = []
+    digest = type(storage).digest
+    storage.digest = lambda i: reads.append(i) or digest(storage, i)
+    with pytest.raises(KeyError):
+        reopened.get_chains_page(since_hash='ab' * 32)
+    assert len(reads) < 10
+    storage.close()
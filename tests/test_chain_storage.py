@@ -0,0 +1,197 @@
+import os
+import sys
+from chain_storage import INDEX_ENTRY, SegmentLogStore
+from fork_choice import META_INTERVAL
+from fork_resolution import ForkResolutionSimulator
+from pow_simulator import Block, difficulty_to_target
+
+
+def make_chain(length):
+    blocks = [Block(0, 0.0, "Genesis Block", "0", target=difficulty_to_target(4))]
+    for i in range(1, length):
+        blocks.append(Block(i, float(i), f"Block {i} data", blocks[-1].hash, target=blocks[-1].target))
+    return blocks
+
+
+def test_reopen_reads_same_blocks(tmp_path):
+    blocks = make_chain(50)
+    store = SegmentLogStore(str(tmp_path), segment_size=2048)
+    for block in blocks:
+        store.append(block)
+    store.close()
+
+    store = SegmentLogStore(str(tmp_path), segment_size=2048)
+    assert len(store) == len(blocks)
+    assert [block.hash for block in store] == [block.hash for block in blocks]
+    assert list(store.iter_hashes()) == [block.hash for block in blocks]
+    assert store[-1].to_dict() == blocks[-1].to_dict()
+    store.append(Block(50, 50.0, "Block 50 data", blocks[-1].hash, target=blocks[-1].target))
+    assert store[50].previous_hash == blocks[-1].hash
+    store.close()
+
+
+def test_reopen_drops_torn_index_entries(tmp_path):
+    blocks = make_chain(10)
+    store = SegmentLogStore(str(tmp_path))
+    for block in blocks:
+        store.append(block)
+    store.close()
+    index_path = os.path.join(str(tmp_path), 'index.bin')
+
+    # Mục index ghi dở (chưa đủ INDEX_ENTRY.size bytes)
+    with open(index_path, 'ab') as f:
+        f.write(b'\x01\x02\x03')
+    store = SegmentLogStore(str(tmp_path))
+    assert len(store) == len(blocks)
+    store.close()
+    assert os.path.getsize(index_path) == len(blocks) * INDEX_ENTRY.size
+
+    # Mục index đầy đủ nhưng trỏ ra ngoài segment (segment chưa kịp ghi)
+    with open(index_path, 'ab') as f:
+        f.write(INDEX_ENTRY.pack(0, 10 ** 9, 100))
+    store = SegmentLogStore(str(tmp_path))
+    assert len(store) == len(blocks)
+    assert store[-1].hash == blocks[-1].hash
+    store.close()
+
+
+def test_reopen_truncates_torn_segment_tail(tmp_path):
+    blocks = make_chain(11)
+    store = SegmentLogStore(str(tmp_path))
+    for block in blocks[:10]:
+        store.append(block)
+    store.close()
+    segment_path = os.path.join(str(tmp_path), 'segment-000000.log')
+    size = os.path.getsize(segment_path)
+    # Bản ghi block ghi dở: có dữ liệu trong segment nhưng chưa có mục index
+    with open(segment_path, 'ab') as f:
+        f.write(blocks[10].to_bytes()[:40])
+
+    store = SegmentLogStore(str(tmp_path))
+    assert os.path.getsize(segment_path) == size
+    store.append(blocks[10])
+    store.close()
+    store = SegmentLogStore(str(tmp_path))
+    assert [block.hash for block in store] == [block.hash for block in blocks]
+    store.close()
+
+
+def test_reopened_chain_pages_without_loading_every_block(tmp_path):
+    sim = ForkResolutionSimulator(storage=SegmentLogStore(str(tmp_path), cache_size=16), seed=3)
+    main = sim.create_initial_chain()
+    for i in range(1, 2 * META_INTERVAL):
+        last = main.get_last_block()
+        main.add_block(Block(i, float(i), f"Block {i} data", last.hash, target=last.target))
+    sim.tree.save_meta()
+    expected = [block.hash for block in main.chain]
+    sim.storage.close()
+
+    reopened = ForkResolutionSimulator(storage=SegmentLogStore(str(tmp_path), cache_size=16))
+    assert reopened.load_from_storage()
+    storage = reopened.storage
+    decoded = []
+    read_block = type(storage).__getitem__
+    storage.__class__ = type('CountingStore', (type(storage),), {
+        '__getitem__': lambda self, i: decoded.append(i) or read_block(self, i),
+        'iter_digests': None
+    })
+    page = reopened.get_chains_page(since_hash=expected[-6], limit=10)[0]
+    assert [b['hash'] for b in page['blocks']] == expected[-5:]
+    page = reopened.get_chains_page(start=len(expected) - 20, limit=3)[0]
+    assert [b['hash'] for b in page['blocks']] == expected[-20:-17]
+    assert len(decoded) < 50
+    storage.close()
+
+
+def test_fork_tree_reopens_from_metadata(tmp_path):
+    sim = ForkResolutionSimulator(storage=SegmentLogStore(str(tmp_path)), seed=7)
+    sim.create_initial_chain()
+    while len(sim.tree) < META_INTERVAL + 20:
+        sim.simulate_fork_scenario()
+    tree = sim.tree
+    expected = (tree.best_tip, dict(tree.tips), len(tree), [b.hash for b in tree.path_to(tree.best_tip)])
+    sim.storage.close()
+
+    reopened = ForkResolutionSimulator(storage=SegmentLogStore(str(tmp_path)))
+    assert reopened.load_from_storage()
+    tree = reopened.tree
+    # Chỉ các block ghi sau lần lưu metadata cuối được nạp lại vào bộ nhớ
+    assert len(tree.blocks) < META_INTERVAL
+    assert (tree.best_tip, dict(tree.tips), len(tree), [b.hash for b in tree.path_to(tree.best_tip)]) == expected
+    reopened.simulate_fork_scenario()
+    assert tree.best_tip in tree
+    reopened.storage.close()
+
+
+def test_concurrent_readers_while_appending(tmp_path):
+    import random
+    import threading
+    blocks = make_chain(20000)
+    store = SegmentLogStore(str(tmp_path), segment_size=1024 * 1024, cache_size=1)
+    for block in blocks[:10]:
+        store.append(block)
+    errors = []
+    done = threading.Event()
+
+    def reader(seed):
+        rng = random.Random(seed)
+        try:
+            while not done.is_set():
+                count = len(store)
+                # Đọc sát cuối log buộc các reader map lại vùng map của nhau
+                i = count - 1 - rng.randrange(min(count, 3))
+                assert store[i].hash == blocks[i].hash
+                assert store.raw(i)
+                assert len(store.raw_range(max(0, i - 5), i + 1)) > 0
+        except Exception as e:  # noqa: BLE001 - ghi lại để assert ở thread chính
+            errors.append(e)
+
+    # Đổi thread thật dày để lộ khoảng giữa lúc lấy vùng map và lúc đọc nó
+    switch_interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    try:
+        threads = [threading.Thread(target=reader, args=(seed,)) for seed in range(6)]
+        for thread in threads:
+            thread.start()
+        for block in blocks[10:]:
+            store.append(block)
+        done.set()
+        for thread in threads:
+            thread.join()
+    finally:
+        sys.setswitchinterval(switch_interval)
+    store.close()
+    assert errors == []
+
+
+def test_find_looks_up_blocks_by_hash(tmp_path, monkeypatch):
+    import chain_storage
+    monkeypatch.setattr(chain_storage, 'HASH_INDEX_TAIL', 8)
+    blocks = make_chain(100)
+    store = SegmentLogStore(str(tmp_path), segment_size=2048)
+    for block in blocks[:60]:
+        store.append(block)
+    assert store.find(blocks[42].hash) == 42
+    # Block ghi sau lần dựng chỉ mục (qua dict rồi được gộp vào mảng đã sắp xếp)
+    for block in blocks[60:]:
+        store.append(block)
+    assert [store.find(block.hash) for block in blocks] == list(range(100))
+    assert store.find(blocks[7].hash_bytes) == 7
+    assert store.find('00' * 32) is None
+    assert store.find('not a hash') is None
+    store.clear()
+    assert store.find(blocks[0].hash) is None
+    store.close()
+
+
+def test_pow_find_block_index_uses_storage_index(tmp_path):
+    from pow_simulator import PoWSimulator
+    store = SegmentLogStore(str(tmp_path))
+    for block in make_chain(20):
+        store.append(block)
+    store.iter_hashes = None
+    sim = PoWSimulator(storage=store)
+    assert sim.find_block_index(store[13].hash) == 13
+    assert sim.find_block_index('ff' * 32) is None
+    assert sim._hash_index is None
+    store.close()
@@ -0,0 +1,99 @@
+import pytest
+from chain_storage import SegmentLogStore
+from chain_validation import (
+    ERROR_BAD_INDEX, ERROR_BROKEN_LINK, ERROR_HASH_MISMATCH, ERROR_INSUFFICIENT_WORK,
+    ERROR_TARGET_TOO_EASY, validate_chain
+)
+from pow_simulator import Block, difficulty_to_target
+from retarget import MAX_TARGET
+
+CHUNK_SIZE = 10
+
+
+def mine(block):
+    """Tìm nonce để hash đạt target của block"""
+    while int(block.calculate_hash(), 16) >= block.target:
+        block.nonce += 1
+    block.hash = block.calculate_hash()
+    return block
+
+
+def make_chain(length):
+    target = difficulty_to_target(1)
+    blocks = [Block(0, 0.0, "Genesis Block", "0", target=target)]
+    for i in range(1, length):
+        blocks.append(mine(Block(i, float(i), f"Block {i} data", blocks[-1].hash, target=target)))
+    return blocks
+
+
+def tamper_data(blocks, i):
+    blocks[i].data = "tampered"
+
+
+def relink(blocks, i):
+    # Block được đào lại (hash và PoW hợp lệ) nhưng previous_hash không trỏ tới block liền trước,
+    # nên block sau nó cũng không còn trỏ đúng
+    blocks[i].previous_hash = blocks[i - 2].hash
+    mine(blocks[i])
+
+
+def raise_difficulty(blocks, i):
+    blocks[i].target = 1
+
+
+def lower_difficulty(blocks, i):
+    blocks[i].target = MAX_TARGET << 4
+    mine(blocks[i])
+    blocks[i + 1].previous_hash = blocks[i].hash
+    mine(blocks[i + 1])
+
+
+def renumber(blocks, i):
+    blocks[i].index = i + 100
+    mine(blocks[i])
+
+
+# (cách làm hỏng, vị trí block bị hỏng, các lỗi mong đợi)
+CORRUPTIONS = [
+    (tamper_data, 17, [(17, ERROR_HASH_MISMATCH)]),
+    # Block đầu chunk: liên kết với chunk trước chỉ được kiểm tra khi gộp kết quả
+    (relink, 20, [(20, ERROR_BROKEN_LINK), (21, ERROR_BROKEN_LINK)]),
+    (relink, 29, [(29, ERROR_BROKEN_LINK), (30, ERROR_BROKEN_LINK)]),
+    (raise_difficulty, 33, [(33, ERROR_INSUFFICIENT_WORK)]),
+    (lower_difficulty, 38, [(38, ERROR_TARGET_TOO_EASY)]),
+    (renumber, 44, [(44, ERROR_BAD_INDEX)]),
+]
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_valid_chain_passes(processes):
+    result = validate_chain(make_chain(45), processes=processes, chunk_size=CHUNK_SIZE)
+    assert result['valid']
+    assert result['first_invalid_index'] is None
+    assert result['chunks'] == 5
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+@pytest.mark.parametrize('corrupt, index, errors', CORRUPTIONS)
+def test_reports_index_of_corrupted_block(processes, corrupt, index, errors):
+    blocks = make_chain(45)
+    corrupt(blocks, index)
+    result = validate_chain(blocks, processes=processes, chunk_size=CHUNK_SIZE)
+    assert not result['valid']
+    assert result['first_invalid_index'] == index
+    assert result['errors'] == [{'index': i, 'error': error} for i, error in errors]
+
+
+@pytest.mark.parametrize('processes', [1, 2])
+def test_reports_corrupted_block_read_from_storage(tmp_path, processes):
+    blocks = make_chain(45)
+    tamper_data(blocks, 31)
+    store = SegmentLogStore(str(tmp_path), segment_size=1024)
+    for block in blocks:
+        store.append(block)
+    try:
+        result = validate_chain(store, processes=processes, chunk_size=CHUNK_SIZE)
+    finally:
+        store.close()
+    assert result['first_invalid_index'] == 31
+    assert result['errors'] == [{'index': 31, 'error': ERROR_HASH_MISMATCH}]
@@ -0,0 +1,79 @@
+import json
+import queue
+from event_stream import EventBus
+
+
+def drain(subscriber):
+    ids = []
+    while True:
+        try:
+            event_id, _ = subscriber.get_nowait()
+        except queue.Empty:
+            return ids
+        ids.append(event_id)
+
+
+def test_last_event_id_replays_only_later_events():
+    bus = EventBus()
+    ids = [bus.publish('block', {'n': n}) for n in range(5)]
+    assert drain(bus.subscribe(ids[1])) == ids[2:]
+    assert drain(bus.subscribe(0)) == ids
+    # Không có Last-Event-ID: chỉ nhận event mới
+    subscriber = bus.subscribe()
+    assert drain(subscriber) == []
+    new_id = bus.publish('block', {'n': 5})
+    assert drain(subscriber) == [new_id]
+
+
+def test_replay_is_limited_to_recent_events():
+    bus = EventBus(replay_size=3)
+    ids = [bus.publish('block', {'n': n}) for n in range(6)]
+    assert drain(bus.subscribe(ids[0])) == ids[3:]
+
+
+def test_slow_subscriber_drops_events_without_blocking_others():
+    bus = EventBus(subscriber_queue_size=2)
+    slow = bus.subscribe()
+    fast = bus.subscribe()
+    ids = []
+    for n in range(5):
+        ids.append(bus.publish('block', {'n': n}))
+        assert drain(fast) == ids[-1:]
+    # Event mới hơn bị bỏ khi hàng đợi đầy; client bù lại bằng Last-Event-ID
+    assert drain(slow) == ids[:2]
+    assert drain(bus.subscribe(ids[2])) == ids[3:]
+
+
+def test_stream_unsubscribes_when_closed():
+    bus = EventBus()
+    event_id = bus.publish('reset', {'simulator': 'pow'})
+    stream = bus.stream(0)
+    assert bus.subscriber_count == 1
+    assert next(stream) == b"retry: 3000\n\n"
+    chunk = next(stream).decode()
+    assert chunk.startswith(f"id: {event_id}\nevent: reset\ndata: ")
+    assert json.loads(chunk.split('data: ', 1)[1])['data'] == {'simulator': 'pow'}
+    stream.close()
+    assert bus.subscriber_count == 0
+
+
+def test_events_endpoint_replays_after_last_event_id():
+    from app import app
+    client = app.test_client()
+    headers = {'X-Session-Id': 'event-replay'}
+    for _ in range(3):
+        assert client.post('/api/fork/create', headers=headers).status_code == 200
+
+    def read_ids(last_event_id, count):
+        response = client.get('/api/events', headers={**headers, 'Last-Event-ID': str(last_event_id)},
+                              buffered=False)
+        try:
+            chunks = response.iter_encoded()
+            assert next(chunks) == b"retry: 3000\n\n"
+            return [int(next(chunks).decode().split('\n', 1)[0][len('id: '):]) for _ in range(count)]
+        finally:
+            response.close()
+
+    ids = read_ids(0, 3)
+    assert ids == sorted(ids)
+    assert read_ids(ids[0], 2) == ids[1:]
@@ -0,0 +1,71 @@
+from fork_choice import ForkChoice
+from pow_simulator import Block, block_work, difficulty_to_target
+
+
+def add_child(tree, parent, difficulty, label):
+    block = Block(parent.index + 1, float(parent.index + 1), label, parent.hash,
+                  target=difficulty_to_target(difficulty))
+    tree.add_block(block)
+    return block
+
+
+def make_tree():
+    tree = ForkChoice()
+    genesis = Block(0, 0.0, "Genesis Block", "0", target=difficulty_to_target(1))
+    tree.add_block(genesis)
+    return tree, genesis
+
+
+def test_heaviest_chain_wins_over_longest():
+    tree, genesis = make_tree()
+    tip = genesis
+    for i in range(3):
+        tip = add_child(tree, tip, 1, f"Easy {i}")
+    assert tree.best_tip == tip.hash
+    heavy = add_child(tree, genesis, 3, "Heavy")
+    assert tree.best_tip == heavy.hash
+    assert tree.cumulative_work(heavy.hash) == block_work(genesis.target) + block_work(heavy.target)
+    assert tree.cumulative_work(tip.hash) == 4 * block_work(genesis.target)
+    assert tree.top_tips(2) == [heavy.hash, tip.hash]
+
+
+def test_equal_work_keeps_first_seen_tip():
+    tree, genesis = make_tree()
+    first = add_child(tree, genesis, 2, "First")
+    add_child(tree, genesis, 2, "Second")
+    assert tree.best_tip == first.hash
+
+
+def test_reorg_walks_back_only_to_the_common_ancestor():
+    tree, genesis = make_tree()
+    base = add_child(tree, genesis, 1, "Base")
+    old = add_child(tree, base, 1, "Old 0")
+    old = add_child(tree, old, 1, "Old 1")
+    new = add_child(tree, base, 3, "New")
+    reorg = tree.reorg(old.hash, new.hash)
+    assert reorg['common_ancestor'] == base.hash
+    assert reorg['depth'] == 2
+    assert reorg['connected'] == [new.hash]
+    assert tree.best_tip == new.hash
+
+
+def test_main_chain_index_follows_reorgs(tmp_path):
+    from chain_storage import SegmentLogStore
+    for storage in (None, SegmentLogStore(str(tmp_path))):
+        tree = ForkChoice(storage)
+        genesis = Block(0, 0.0, "Genesis Block", "0", target=difficulty_to_target(1))
+        tree.add_block(genesis)
+        base = add_child(tree, genesis, 1, "Base")
+        old = add_child(tree, add_child(tree, base, 1, "Old 0"), 1, "Old 1")
+        assert [tree.main_hash(h) for h in range(4)] == [block.hash for block in tree.path_to(old.hash)]
+        new = add_child(tree, base, 3, "New")
+        new = add_child(tree, new, 1, "New 1")
+        expected = [block.hash for block in tree.path_to(new.hash)]
+        assert [tree.main_hash(h) for h in range(4)] == expected
+        assert [tree.main_block(h).hash for h in range(4)] == expected
+        assert tree.main_hash(4) is None
+        if storage is not None:
+            tree.save_meta()
+            reopened = ForkChoice.from_storage(storage)
+            assert [reopened.main_hash(h) for h in range(4)] == expected
+            storage.close()
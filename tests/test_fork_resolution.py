@@ -0,0 +1,27 @@
+from fork_resolution import ForkResolutionSimulator
+from pow_simulator import Block
+from sim_random import ManualClock
+
+
+def extend(chain, count):
+    for _ in range(count):
+        last = chain.get_last_block()
+        chain.add_block(Block(last.index + 1, last.timestamp + 1, f"Block {last.index + 1}",
+                              last.hash, target=last.target))
+
+
+def test_resolution_returns_only_the_reorg_segments():
+    sim = ForkResolutionSimulator(seed=2, clock=ManualClock(tick=1.0))
+    extend(sim.create_initial_chain(), 300)
+    sim.simulate_fork_scenario()
+    result = sim.apply_longest_chain_rule()
+
+    assert 'resolved_chain' not in result
+    winner = sim.blockchains[0]
+    assert result['tip_hash'] == winner.tip_hash
+    assert len(result['reorgs']) == 1
+    reorg = result['reorgs'][0]
+    assert reorg['depth'] == len(reorg['disconnected']) == result['reorg_depth']
+    assert reorg['connected'][-1]['hash'] == winner.tip_hash
+    assert reorg['connected'][0]['previous_hash'] == reorg['common_ancestor']
+    assert len(reorg['connected']) + len(reorg['disconnected']) <= 6
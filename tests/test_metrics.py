@@ -0,0 +1,85 @@
+import re
+from metrics import MetricsRegistry
+
+# Một dòng mẫu: tên{nhãn="giá trị",...} giá_trị
+SAMPLE_LINE = re.compile(r'^([a-zA-Z_:][a-zA-Z0-9_:]*)(\{([a-zA-Z_][a-zA-Z0-9_]*="(\\.|[^"\\])*",?)*\})? (\S+)$')
+
+
+def test_counter_and_gauge_exposition():
+    registry = MetricsRegistry()
+    counter = registry.counter('jobs_total', 'Số job', ('backend',))
+    counter.inc(backend='thread')
+    counter.inc(2.5, backend='process')
+    registry.gauge('queue_depth', 'Độ dài hàng đợi', callback=lambda: 3)
+    assert registry.render() == (
+        '# HELP jobs_total Số job\n'
+        '# TYPE jobs_total counter\n'
+        'jobs_total{backend="process"} 2.5\n'
+        'jobs_total{backend="thread"} 1\n'
+        '# HELP queue_depth Độ dài hàng đợi\n'
+        '# TYPE queue_depth gauge\n'
+        'queue_depth 3\n'
+    )
+
+
+def test_histogram_buckets_are_cumulative():
+    registry = MetricsRegistry()
+    histogram = registry.histogram('race_seconds', 'Thời gian đua', ('backend',), buckets=(0.5, 1, 2))
+    for value in (0.2, 0.5, 1.5, 7):
+        histogram.observe(value, backend='virtual')
+    assert registry.render().splitlines() == [
+        '# HELP race_seconds Thời gian đua',
+        '# TYPE race_seconds histogram',
+        'race_seconds_bucket{backend="virtual",le="0.5"} 2',
+        'race_seconds_bucket{backend="virtual",le="1"} 2',
+        'race_seconds_bucket{backend="virtual",le="2"} 3',
+        'race_seconds_bucket{backend="virtual",le="+Inf"} 4',
+        'race_seconds_sum{backend="virtual"} 9.2',
+        'race_seconds_count{backend="virtual"} 4',
+    ]
+    assert histogram.count(backend='virtual') == 4
+
+
+def test_label_values_are_escaped():
+    registry = MetricsRegistry()
+    registry.counter('events_total', 'Số event', ('name',)).inc(name='a"b\\c\nd')
+    assert registry.render().splitlines()[-1] == 'events_total{name="a\\"b\\\\c\\nd"} 1'
+
+
+def test_registering_same_name_returns_existing_metric():
+    registry = MetricsRegistry()
+    first = registry.counter('jobs_total', 'Số job')
+    assert registry.counter('jobs_total', 'Số job') is first
+    first.inc()
+    assert registry.render().count('# TYPE jobs_total counter') == 1
+
+
+def test_metrics_endpoint_is_valid_exposition():
+    from app import app
+    client = app.test_client()
+    headers = {'X-Session-Id': 'metrics-format'}
+    client.post('/api/pow/mine', headers=headers)
+    response = client.get('/api/metrics', headers=headers)
+    assert response.status_code == 200
+    assert response.content_type.startswith('text/plain; version=0.0.4')
+    text = response.get_data(as_text=True)
+    assert text.endswith('\n')
+
+    declared = {}
+    for line in text.splitlines():
+        if line.startswith('# HELP '):
+            continue
+        if line.startswith('# TYPE '):
+            _, _, name, kind = line.split(' ')
+            assert name not in declared
+            declared[name] = kind
+            continue
+        match = SAMPLE_LINE.match(line)
+        assert match, line
+        float(match.group(5).replace('+Inf', 'inf'))
+        name = match.group(1)
+        # Mỗi mẫu thuộc một metric đã khai báo TYPE (histogram có hậu tố _bucket / _sum / _count)
+        family = re.sub(r'_(bucket|sum|count)$', '', name) if name not in declared else name
+        assert family in declared, line
+    assert declared['pow_hashes_total'] == 'counter'
+    assert declared['pow_race_duration_seconds'] == 'histogram'
@@ -0,0 +1,91 @@
+import threading
+import time
+import pytest
+from mining_jobs import JOB_DONE, JOB_FAILED, MiningScheduler, QueueFullError
+
+
+class FakeSimulator:
+    """Mỗi cuộc đua mất delay giây; ghi lại số cuộc đua chạy đồng thời trên simulator này"""
+    def __init__(self, delay=0.005):
+        self.delay = delay
+        self.races = 0
+        self.running = 0
+        self.max_running = 0
+        self._lock = threading.Lock()
+
+    def simulate_mining_race(self):
+        with self._lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        time.sleep(self.delay)
+        with self._lock:
+            self.running -= 1
+            self.races += 1
+            return {'block_index': self.races}
+
+
+def test_large_job_does_not_block_other_sessions():
+    scheduler = MiningScheduler(workers=1)
+    big = scheduler.submit(2000, simulator=FakeSimulator(), owner='big')
+    small = scheduler.submit(3, simulator=FakeSimulator(), owner='small')
+    assert small.wait(5) and small.status == JOB_DONE
+    assert not big.finished
+    assert len(big.results) < 100
+
+
+def test_jobs_of_one_session_run_one_race_at_a_time():
+    scheduler = MiningScheduler(workers=4)
+    simulator = FakeSimulator(delay=0.001)
+    jobs = [scheduler.submit(20, simulator=simulator, owner='a') for _ in range(5)]
+    assert all(job.wait(10) for job in jobs)
+    assert simulator.races == 100 and simulator.max_running == 1
+    assert [job.results[-1]['block_index'] for job in jobs] == [20, 40, 60, 80, 100]
+
+
+def test_queue_limits_per_session_and_in_total():
+    scheduler = MiningScheduler(workers=1, queue_size=5, owner_queue_size=2)
+    slow = FakeSimulator(delay=0.05)
+    scheduler.submit(10, simulator=slow, owner='a')
+    scheduler.submit(10, simulator=slow, owner='a')
+    with pytest.raises(QueueFullError):
+        scheduler.submit(1, simulator=slow, owner='a')
+    for owner in ('b', 'c', 'd'):
+        scheduler.submit(1, simulator=FakeSimulator(), owner=owner)
+    with pytest.raises(QueueFullError):
+        scheduler.submit(1, simulator=FakeSimulator(), owner='e')
+    assert scheduler.stats()['unfinished'] == 5
+
+
+def test_failed_race_fails_the_job_and_frees_the_session():
+    class Broken:
+        def simulate_mining_race(self):
+            raise RuntimeError("boom")
+
+    scheduler = MiningScheduler(workers=1, owner_queue_size=1)
+    job = scheduler.submit(3, simulator=Broken(), owner='a')
+    assert job.wait(5) and job.status == JOB_FAILED and job.error == 'boom'
+    assert not scheduler.is_busy('a')
+    assert scheduler.submit(1, simulator=FakeSimulator(), owner='a').wait(5)
+
+
+@pytest.mark.parametrize('wait', ['nan', 'inf', '-inf', 'soon'])
+def test_job_endpoint_rejects_non_finite_wait(monkeypatch, wait):
+    import app as app_module
+    waits = []
+
+    class FakeJob:
+        owner = 'job-wait'
+
+        def wait(self, timeout):
+            waits.append(timeout)
+            return True
+
+        def to_dict(self):
+            return {'id': 'fake'}
+    monkeypatch.setattr(app_module.mining_scheduler, 'get', lambda job_id: FakeJob())
+    client = app_module.app.test_client()
+    headers = {'X-Session-Id': 'job-wait'}
+    response = client.get(f'/api/pow/jobs/fake?wait={wait}', headers=headers)
+    assert response.status_code == 400 and not response.get_json()['success']
+    assert client.get('/api/pow/jobs/fake?wait=100', headers=headers).status_code == 200
+    assert waits == [app_module.MAX_JOB_WAIT]
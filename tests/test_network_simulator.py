@@ -0,0 +1,101 @@
+import pytest
+from fork_resolution import ForkResolutionSimulator
+from network_simulator import NetworkSimulator
+from pow_simulator import Block
+
+
+def test_duplicate_orphan_is_buffered_once():
+    sim = NetworkSimulator(num_nodes=3, peers_per_node=2, seed=1)
+    genesis = sim.tree.get(sim.nodes[0].best_tip)
+    parent = Block(1, 1.0, "Block 1", genesis.hash, target=sim.target)
+    child = Block(2, 2.0, "Block 2", parent.hash, target=sim.target)
+    for block in (parent, child):
+        sim.tree.add_block(block)
+        sim._reach[block.hash] = [0, 0.0]
+    node = sim.nodes[1]
+
+    # Block con đến trước block cha, từ hai peer khác nhau
+    sim._deliver(node, child)
+    sim._deliver(node, child)
+    assert sim.orphan_arrivals == 1
+    assert node.waiting[parent.hash] == [child]
+
+    sim._deliver(node, parent)
+    assert node.best_tip == child.hash
+    assert not node.pending and not node.waiting
+    assert sim._reach[child.hash][0] == 1
+    # Block đã nhận đến lần nữa thì bị bỏ qua
+    sim._deliver(node, child)
+    assert sim._reach[child.hash][0] == 1
+
+
+def test_block_reaches_each_node_at_most_once():
+    sim = NetworkSimulator(num_nodes=40, peers_per_node=6, latency_max=5.0, seed=3)
+    sim.run(600)
+    assert all(count <= len(sim.nodes) for count, _ in sim._reach.values())
+
+
+@pytest.mark.parametrize('options', [
+    {'block_interval': 0},
+    {'block_interval': -1},
+    {'latency_min': -0.1},
+    {'latency_min': 2, 'latency_max': 1},
+    {'latency_jitter': -1},
+    {'peers_per_node': -1},
+])
+def test_network_sim_endpoint_rejects_out_of_range_options(options):
+    from app import app
+    response = app.test_client().post('/api/fork/network-sim',
+                                      json={'num_nodes': 5, 'duration': 10, 'seed': 1, **options},
+                                      headers={'X-Session-Id': 'network-sim-invalid'})
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+
+
+def test_network_sim_endpoint_runs_with_valid_options():
+    from app import app
+    response = app.test_client().post('/api/fork/network-sim', json={
+        'num_nodes': 5, 'duration': 100, 'block_interval': 5, 'latency_min': 0, 'latency_max': 0,
+        'latency_jitter': 0, 'peers_per_node': 0, 'seed': 1
+    }, headers={'X-Session-Id': 'network-sim-valid'})
+    assert response.status_code == 200
+    assert response.get_json()['data']['blocks_mined'] > 0
+
+
+def test_same_seed_gives_the_same_run():
+    first = NetworkSimulator(num_nodes=20, peers_per_node=4, seed=5).run(1200)
+    second = NetworkSimulator(num_nodes=20, peers_per_node=4, seed=5).run(1200)
+    assert first == second
+
+
+def test_report_accounts_for_every_mined_block():
+    sim = NetworkSimulator(num_nodes=30, peers_per_node=5, latency_max=3.0, seed=9)
+    report = sim.run(3600)
+    assert report['simulated_time'] == 3600
+    assert report['blocks_mined'] > 0
+    assert report['canonical_length'] - 1 + report['stale_blocks'] == report['blocks_mined']
+    assert 0 < report['nodes_on_best_tip'] <= report['nodes'] == 30
+
+
+def test_simulate_network_without_seed_takes_the_next_network_seed():
+    drawn, implicit = ForkResolutionSimulator(seed=3), ForkResolutionSimulator(seed=3)
+    seed = drawn.next_network_seed()
+    assert implicit.simulate_network(300, num_nodes=10) == drawn.simulate_network(300, num_nodes=10, seed=seed)
+
+
+def test_network_sim_endpoint_draws_the_seed_under_the_write_lock(monkeypatch):
+    from app import app, sessions
+    session = sessions.acquire('network-sim-seed')
+    sessions.release(session)
+    fork = session.fork
+    draws = []
+    next_network_seed = fork.next_network_seed
+
+    def next_seed():
+        draws.append(fork.lock._writer)
+        return next_network_seed()
+    monkeypatch.setattr(fork, 'next_network_seed', next_seed)
+    response = app.test_client().post('/api/fork/network-sim', json={'num_nodes': 5, 'duration': 50},
+                                      headers={'X-Session-Id': 'network-sim-seed'})
+    assert response.status_code == 200
+    assert draws == [True]
@@ -0,0 +1,52 @@
+import numpy as np
+import pytest
+from pos_epoch import EpochSimulator
+
+
+@pytest.mark.parametrize('committee_size', [None, 3, 1000])
+def test_each_validator_attests_at_most_once_per_epoch(committee_size):
+    sim = EpochSimulator.with_random_stakes(200, slots_per_epoch=8, committee_size=committee_size,
+                                            uptime=0.8, seed=3)
+    for _ in range(5):
+        before = sim.attested + sim.missed_attestations
+        sim.run_epoch()
+        duties = sim.attested + sim.missed_attestations - before
+        assert duties.max() <= 1
+
+
+def test_full_committees_attest_exactly_once_per_epoch():
+    sim = EpochSimulator.with_random_stakes(200, slots_per_epoch=8, committee_size=None, seed=3)
+    sim.run(5)
+    assert (sim.attested == 5).all()
+    assert sim.missed_attestations.sum() == 0
+
+
+def test_stake_is_conserved_without_rewards():
+    sim = EpochSimulator.with_random_stakes(300, slots_per_epoch=16, committee_size=8, proposer_reward=0.0,
+                                            attester_reward=0.0, missed_penalty=0.0, uptime=0.5, seed=4)
+    total = sim.stake.sum()
+    result = sim.run(10)
+    assert sim.stake.sum() == pytest.approx(total)
+    assert result['total_stake_end'] == result['total_stake_start']
+    assert result['history']['active_stake'][-1] == pytest.approx(total)
+
+
+def test_stake_changes_only_by_rewards_penalties_and_slashing():
+    sim = EpochSimulator.with_random_stakes(300, slots_per_epoch=16, committee_size=8, uptime=0.7,
+                                            slashing_rate=0.01, min_stake=1.0, seed=5)
+    sim.run(20)
+    assert np.allclose(sim.stake - sim.initial_stake, sim.rewards)
+    # Tổng stake đang hoạt động được cập nhật dần phải khớp với tính lại từ đầu
+    assert sim.stake_history[-1] == pytest.approx(sim.stake[sim.active].sum())
+    assert not sim.active[sim.slashed].any()
+
+
+def test_inactive_validators_get_no_duties():
+    stakes = [10.0] * 20
+    active = [i % 2 == 0 for i in range(20)]
+    sim = EpochSimulator(stakes, slots_per_epoch=4, committee_size=None, active=active, seed=6)
+    sim.run(5)
+    inactive = ~np.array(active)
+    assert sim.proposed[inactive].sum() == 0
+    assert sim.attested[inactive].sum() == 0
+    assert (sim.stake[inactive] == 10.0).all()
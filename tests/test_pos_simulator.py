@@ -0,0 +1,146 @@
+import threading
+import time
+import pytest
+from pos_simulator import PoSSimulator
+from rwlock import ReadWriteLock
+
+
+def make_simulator(**options):
+    sim = PoSSimulator(seed=5, **options)
+    for i, stake in enumerate((10, 50, 40, 25, 75)):
+        sim.add_validator(f"V{i}", stake)
+    return sim
+
+
+def test_clear_truncates_spilled_history(tmp_path):
+    path = str(tmp_path / 'history.bin')
+    sim = make_simulator(history_limit=10, history_spill_path=path)
+    sim.simulate_multiple_validations(100)
+    assert sim.validation_history.total_spilled > 0
+
+    sim.clear(2)
+    sim.add_validator("N0", 10)
+    sim.add_validator("N1", 20)
+    assert list(sim.validation_history.iter_spilled()) == []
+    with open(path + '.names', encoding='utf-8') as f:
+        assert f.read().split() == ['"N0"', '"N1"']
+    sim.simulate_multiple_validations(50)
+    assert {record['validator'] for record in sim.validation_history.iter_spilled()} <= {'N0', 'N1'}
+
+
+def test_readers_share_lock_and_writer_is_exclusive():
+    lock = ReadWriteLock()
+    inside = []
+    peak = [0, 0]
+    guard = threading.Lock()
+
+    def reader():
+        with lock.read():
+            with guard:
+                inside.append('r')
+                peak[0] = max(peak[0], inside.count('r'))
+            time.sleep(0.02)
+            with guard:
+                inside.remove('r')
+
+    def writer():
+        with lock.write():
+            with guard:
+                # Không có reader hay writer nào khác trong lúc ghi
+                peak[1] = max(peak[1], len(inside) + 1)
+                inside.append('w')
+            time.sleep(0.01)
+            with guard:
+                inside.remove('w')
+
+    threads = [threading.Thread(target=reader) for _ in range(4)] + [threading.Thread(target=writer) for _ in range(2)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert peak[0] > 1
+    assert peak[1] == 1
+
+
+def test_concurrent_validate_requests_keep_totals_consistent():
+    from app import app
+    headers = {'X-Session-Id': 'concurrent-pos'}
+    app.test_client().post('/api/pos/reset', headers=headers)
+
+    def validate():
+        client = app.test_client()
+        for _ in range(50):
+            assert client.post('/api/pos/validate', headers=headers).status_code == 200
+
+    threads = [threading.Thread(target=validate) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    validators = app.test_client().get('/api/pos/validators', headers=headers).get_json()['data']
+    assert sum(v['blocks_validated'] for v in validators) == 200
+
+
+def test_validation_result_carries_running_totals():
+    # Event validator_selected mang tổng của validator để giao diện cập nhật mà không tải lại danh sách
+    sim = make_simulator()
+    for _ in range(5):
+        result = sim.simulate_validation()
+    validator = next(v for v in sim.get_validators_stats() if v['name'] == result['validator'])
+    assert result['total_blocks_validated'] == validator['blocks_validated']
+    assert result['total_rewards'] == validator['total_rewards']
+
+
+def test_vectorized_history_matches_selection_counts():
+    sim = make_simulator(history_limit=50)
+    stats = sim.simulate_multiple_validations(10000, vectorized=True)
+    history = sim.validation_history
+    assert len(history) == 50 and history.total_appended == 10000
+    last = history[-1]
+    validator = next(v for v in sim.validators if v.name == last['validator'])
+    assert last['total_blocks_validated'] == validator.blocks_validated
+    assert last['reward'] == round(validator.stake * 0.1, 2)
+    assert sum(s['times_selected'] for s in stats['statistics'].values()) == 10000
+
+
+def test_vectorized_batch_keeps_per_validator_totals():
+    sim = make_simulator()
+    stats = sim.simulate_multiple_validations(5000, vectorized=True)
+    assert stats['total_validations'] == 5000
+    assert sum(s['times_selected'] for s in stats['statistics'].values()) == 5000
+    running = {}
+    for record in sim.validation_history:
+        # total_blocks_validated của mỗi validator tăng dần từng vòng như ở chế độ tuần tự
+        running[record['validator']] = running.get(record['validator'], 0) + 1
+        assert record['total_blocks_validated'] == running[record['validator']]
+    for validator in sim.validators:
+        assert stats['statistics'][validator.name]['times_selected'] == validator.blocks_validated
+        assert running.get(validator.name, 0) == validator.blocks_validated
+        assert validator.rewards == pytest.approx(validator.blocks_validated * validator.stake * 0.1)
+    # V4 giữ 75 / 200 tổng stake
+    assert stats['statistics']['V4']['percentage'] == pytest.approx(37.5, abs=5)
+
+
+@pytest.mark.parametrize('body', [
+    {'count': 0},
+    {'count': -5},
+    {'count': 'abc'},
+    {'count': True},
+    {'count': 2.5},
+    {'count': 10 ** 8},
+    {'count': 10, 'vectorized': 'yes'},
+])
+def test_validate_multiple_endpoint_rejects_bad_options(body):
+    from app import app
+    response = app.test_client().post('/api/pos/validate-multiple', json=body,
+                                      headers={'X-Session-Id': 'pos-validate-invalid'})
+    assert response.status_code == 400
+    assert response.get_json()['success'] is False
+
+
+def test_validate_multiple_endpoint_runs_with_valid_count():
+    from app import app
+    response = app.test_client().post('/api/pos/validate-multiple', json={'count': 50, 'vectorized': False},
+                                      headers={'X-Session-Id': 'pos-validate-valid'})
+    assert response.status_code == 200
+    assert response.get_json()['data']['total_validations'] == 50
@@ -0,0 +1,188 @@
+import json
+import random
+import pytest
+import pow_simulator
+from pow_simulator import Block, Miner, MiningRunStats, NONCE_RANGE_SIZE, PoWSimulator, difficulty_to_target
+from sim_random import ManualClock
+
+
+def make_simulator(backend='thread', miners=(100, 150, 80), difficulty=2, **options):
+    sim = PoWSimulator(mining_backend=backend, seed=21, clock=ManualClock(tick=1.0), **options)
+    sim.set_retarget('epoch', window=10 ** 12)
+    sim.difficulty = difficulty
+    sim.create_genesis_block()
+    for i, hash_power in enumerate(miners):
+        sim.add_miner(f"Miner {i + 1}", hash_power)
+    return sim
+
+
+def test_process_backend_mines_valid_chain():
+    sim = make_simulator('process')
+    try:
+        winners = set()
+        for _ in range(4):
+            result = sim.simulate_mining_race()
+            assert 'error' not in result
+            winners.add(result['winner'])
+        assert winners <= {miner.name for miner in sim.miners}
+        assert sim.validate_chain()['valid']
+        assert len(sim.blockchain) == 5
+    finally:
+        sim.close()
+
+
+def test_process_backend_requires_a_worker_per_miner():
+    sim = make_simulator('process', miners=(100,), max_workers=1)
+    with pytest.raises(ValueError):
+        sim.add_miner("Miner 2", 100)
+    sim.close()
+
+    sim = make_simulator('process')
+    sim.max_workers = 2
+    with pytest.raises(ValueError):
+        sim.simulate_mining_race()
+    sim.close()
+
+
+def test_exhausted_nonce_range_takes_timestamp_from_clock(monkeypatch):
+    # Dải nonce rất nhỏ để miner phải đổi timestamp nhiều lần trước khi tìm ra nonce hợp lệ
+    monkeypatch.setattr(pow_simulator, 'NONCE_RANGE_SIZE', 4)
+    monkeypatch.setattr(pow_simulator, 'SEARCH_BATCH_SIZE', 4)
+
+    def mine():
+        miner = Miner("Miner", 199, random.Random(1), ManualClock(start=500.0))
+        block = Block(1, 0.0, "data", "0" * 64)
+        return miner.mine_block(block, None, nonce_start=0, target=difficulty_to_target(2))[0]
+
+    first, second = mine(), mine()
+    assert 500.0 <= first.timestamp < 501.0
+    assert (first.timestamp, first.nonce, first.hash) == (second.timestamp, second.nonce, second.hash)
+    assert first.hash == first.calculate_hash()
+
+
+def test_run_stats_count_stale_discards_separately():
+    sim = make_simulator('virtual')
+    stats = MiningRunStats(sim.miners, 2.0)
+    stats.record({'winner': 'Miner 1', 'mining_time': 1.234567, 'difficulty': 2})
+    stats.record({'error': 'Mining timeout'})
+    stats.record({'error': 'Chain đã thay đổi trong lúc đào, block bị bỏ', 'stale': True})
+    summary = stats.summary()
+    assert (summary['total_races'], summary['blocks_mined']) == (2, 1)
+    assert (summary['timeouts'], summary['stale_discards']) == (1, 1)
+    assert summary['mean_block_time'] == 1.235
+
+
+def test_race_results_round_mining_time_but_stats_use_exact_times():
+    sim = make_simulator('virtual')
+    results = []
+    summary = sim.simulate_many(20, on_block=results.append)
+    assert all(result['mining_time'] == round(result['mining_time'], 2) for result in results)
+    exact = [b.timestamp for b in sim.blockchain[1:]] + [sim.virtual_time]
+    block_times = [later - earlier for earlier, later in zip(exact, exact[1:])]
+    assert summary['mean_block_time'] == round(sum(block_times) / len(block_times), 3)
+
+
+def test_process_race_uses_miner_snapshot(monkeypatch):
+    sim = make_simulator('process')
+    miners = list(sim.miners)
+    get_pool = sim._get_process_pool
+
+    def pool_then_drop_miners(count):
+        pool = get_pool(count)
+        sim.miners = []  # Đổi danh sách miner trong lúc cuộc đua đang chạy
+        return pool
+    monkeypatch.setattr(sim, '_get_process_pool', pool_then_drop_miners)
+    try:
+        result = sim.simulate_mining_race()
+    finally:
+        sim.close()
+    winner = next(miner for miner in miners if miner.name == result['winner'])
+    assert winner.blocks_mined == 1
+
+
+def test_reset_during_virtual_race_is_not_overwritten(monkeypatch):
+    sim = make_simulator('virtual')
+    sim.simulate_mining_race()
+    rng = sim.miners[0].rng
+    draw = rng.expovariate
+
+    def draw_then_reset(rate):
+        sim.clear()  # Reset từ request khác trong lúc cuộc đua đang chạy
+        return draw(rate)
+    monkeypatch.setattr(rng, 'expovariate', draw_then_reset)
+    result = sim.simulate_mining_race()
+    assert result.get('stale')
+    assert sim.virtual_time is None and len(sim.blockchain) == 0
+
+
+def assert_linked_chain(sim, difficulty=2):
+    """Mỗi block có hash đúng, đạt độ khó và trỏ tới block liền trước"""
+    for previous, block in zip(sim.blockchain, sim.blockchain[1:]):
+        assert block.hash == block.calculate_hash()
+        assert block.hash.startswith('0' * difficulty)
+        assert block.previous_hash == previous.hash
+
+
+def test_midstate_hash_matches_calculate_hash():
+    block = Block(3, 1700000000.25, "Block 3 data", "ab" * 32)
+    midstate = block.midstate()
+    for nonce in (0, 1, 987654321):
+        block.nonce = nonce
+        assert Block.hash_from_midstate(midstate, nonce) == block.calculate_hash()
+
+
+def test_sequential_search_uses_disjoint_nonce_ranges():
+    sim = make_simulator(search_mode='sequential')
+    names = [miner.name for miner in sim.miners]
+    for _ in range(4):
+        result = sim.simulate_mining_race()
+        assert 'error' not in result
+        start = names.index(result['winner']) * NONCE_RANGE_SIZE
+        assert start <= result['block']['nonce'] < start + NONCE_RANGE_SIZE
+    assert_linked_chain(sim)
+
+
+def test_virtual_backend_advances_virtual_clock():
+    sim = make_simulator('virtual', difficulty=6)
+    for _ in range(50):
+        before = sim.virtual_time
+        result = sim.simulate_mining_race()
+        assert 'error' not in result
+        # Block bắt đầu ở thời điểm ảo hiện tại, đồng hồ ảo tiến thêm thời gian đào
+        if before is not None:
+            assert result['block']['timestamp'] == before
+        assert sim.virtual_time > result['block']['timestamp']
+    assert len(sim.blockchain) == 51
+
+
+def test_simulate_many_summarizes_every_race():
+    sim = make_simulator('virtual', difficulty=6)
+    results = []
+    summary = sim.simulate_many(200, on_block=results.append)
+    assert len(results) == 200
+    assert summary['total_races'] == summary['blocks_mined'] == 200
+    assert sum(miner['wins'] for miner in summary['miners'].values()) == 200
+    assert len(summary['difficulty_trajectory']) == 201
+    assert summary['blockchain_length'] == len(sim.blockchain) == 201
+
+
+def test_blockchain_json_matches_block_dicts():
+    sim = make_simulator('virtual', difficulty=3)
+    for _ in range(5):
+        sim.simulate_mining_race()
+    body, pagination = sim.get_blockchain_json()
+    assert pagination is None
+    assert json.loads(body) == sim.get_blockchain()
+    body, pagination = sim.get_blockchain_json(start=2, limit=2, paged=True)
+    assert json.loads(body) == sim.get_blockchain()[2:4]
+    assert pagination['next_start'] == 4
+
+
+def test_cached_block_json_follows_changes():
+    sim = make_simulator('virtual', difficulty=3)
+    sim.simulate_mining_race()
+    block = sim.blockchain[-1]
+    before = block.to_json()
+    block.data = "changed"
+    assert block.to_json() != before
+    assert json.loads(block.to_json())['data'] == "changed"
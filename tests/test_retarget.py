@@ -0,0 +1,80 @@
+import statistics
+import pytest
+from pow_simulator import PoWSimulator, difficulty_to_target, target_to_difficulty
+from retarget import MIN_TARGET, create_retargeter, scale_target
+from sim_random import ManualClock
+
+
+def equilibrium_target(sim):
+    """Target có thời gian block kỳ vọng đúng bằng target_time với hash rate hiện tại"""
+    hash_rate = sum(miner.hash_power for miner in sim.miners) * sim.virtual_hashes_per_power
+    return int(2 ** 256 / (hash_rate * sim.target_time))
+
+
+@pytest.mark.parametrize('algorithm', ['epoch', 'window', 'asert'])
+def test_retarget_converges_to_target_time(algorithm):
+    sim = PoWSimulator(mining_backend='virtual', retarget=algorithm, seed=11, clock=ManualClock())
+    sim.create_genesis_block()
+    for i, hash_power in enumerate((100, 150, 80)):
+        sim.add_miner(f"Miner {i + 1}", hash_power)
+    # Bắt đầu khó hơn mức cân bằng 16 lần
+    sim.target = equilibrium_target(sim) // 16
+    sim.virtual_time = 0.0
+
+    times = []
+    for _ in range(1200):
+        start = sim.virtual_time
+        result = sim.simulate_mining_race()
+        assert 'error' not in result
+        times.append(sim.virtual_time - start)
+    steady = times[-400:]
+    assert statistics.fmean(steady) == pytest.approx(sim.target_time, rel=0.15)
+    assert sim.target == pytest.approx(equilibrium_target(sim), rel=0.5)
+
+
+def test_window_retarget_limits_change_per_block():
+    retargeter = create_retargeter('window', 10.0, window=30, max_step=4.0)
+    target = MIN_TARGET << 40
+    # Cửa sổ mới: một block gần như tức thì không được làm target giảm quá max_step lần
+    fast = retargeter.next_target(target, 0.0)
+    assert fast == scale_target(target, 0.25)
+    slow = retargeter.next_target(fast, 10.0 * 100)
+    assert slow <= scale_target(fast, 4.0)
+    assert retargeter.to_dict()['max_step'] == 4.0
+
+
+def test_default_is_legacy_and_adjust_difficulty_still_works():
+    sim = PoWSimulator(mining_backend='virtual', seed=1, clock=ManualClock())
+    assert sim.retargeter.name == 'legacy'
+    sim.difficulty = 3
+    assert sim.adjust_difficulty(sim.target_time * 0.1) is not None
+    assert sim.difficulty == 4
+    assert sim.adjust_difficulty(sim.target_time) is None
+    sim.adjust_difficulty(sim.target_time * 5)
+    assert sim.difficulty == 3
+
+
+@pytest.mark.parametrize('difficulty', [2, 4, 8])
+def test_difficulty_is_only_the_guaranteed_leading_zeros(difficulty):
+    target = difficulty_to_target(difficulty)
+    assert target_to_difficulty(target) == difficulty
+    # Target hơi dễ hơn 2^(256 - 4d) cho phép hash (target - 1) chỉ có d - 1 chữ số hex 0
+    assert target_to_difficulty(target + 1) == difficulty - 1
+    assert target_to_difficulty(target - 1) == difficulty
+    assert target_to_difficulty(scale_target(target, 1.5)) == difficulty - 1
+
+
+def test_retarget_endpoint_rejects_non_numeric_params():
+    from app import app
+    client = app.test_client()
+    headers = {'X-Session-Id': 'retarget-params'}
+    response = client.post('/api/pow/retarget', json={'algorithm': 'window', 'window': 'abc'}, headers=headers)
+    assert response.status_code == 400
+    assert response.get_json()['error'] == 'window phải là số nguyên'
+    response = client.post('/api/pow/retarget', json={'algorithm': 'window', 'bogus': 1}, headers=headers)
+    assert response.status_code == 400
+    response = client.post('/api/pow/retarget', json={'algorithm': 'window', 'window': 12, 'max_step': 2},
+                           headers=headers)
+    assert response.status_code == 200
+    data = response.get_json()['data']
+    assert (data['algorithm'], data['window'], data['max_step']) == ('window', 12, 2.0)
@@ -0,0 +1,145 @@
+import os
+import threading
+import pytest
+from session_registry import SIGNATURE_SIZE, Session, SessionRegistry
+
+
+class Counter:
+    def __init__(self):
+        self.value = 0
+
+
+def new_session(session_id):
+    return Session(session_id, {'counter': Counter()})
+
+
+def use(registry, session_id, increment=0):
+    session = registry.acquire(session_id)
+    session.counter.value += increment
+    registry.release(session)
+    return session
+
+
+def test_spilled_session_round_trips(tmp_path):
+    registry = SessionRegistry(new_session, max_sessions=1, spill_dir=str(tmp_path))
+    use(registry, 'alice', 5)
+    use(registry, 'bob')
+    assert os.path.exists(tmp_path / 'alice.session')
+    assert use(registry, 'alice').counter.value == 5
+    stats = registry.stats()
+    assert (stats['spilled'], stats['restored'], stats['rejected']) == (2, 1, 0)
+    assert not os.path.exists(tmp_path / 'alice.session')
+
+
+def test_event_ids_continue_after_spill_and_restore(tmp_path):
+    registry = SessionRegistry(new_session, max_sessions=1, spill_dir=str(tmp_path))
+    alice = use(registry, 'alice')
+    assert [alice.events.publish('block', {'n': n}) for n in range(3)] == [1, 2, 3]
+    use(registry, 'bob')
+    restored = use(registry, 'alice')
+    assert restored is not alice
+    assert restored.events.publish('block', {'n': 3}) == 4
+
+
+def test_tampered_session_file_is_rejected(tmp_path):
+    registry = SessionRegistry(new_session, max_sessions=1, spill_dir=str(tmp_path))
+    use(registry, 'alice', 5)
+    use(registry, 'bob')
+    path = tmp_path / 'alice.session'
+    data = bytearray(path.read_bytes())
+    data[SIGNATURE_SIZE + 10] ^= 0xFF
+    path.write_bytes(bytes(data))
+
+    assert use(registry, 'alice').counter.value == 0
+    assert registry.stats()['rejected'] == 1
+    assert not path.exists()
+
+
+def test_file_signed_with_another_key_is_not_loaded(tmp_path):
+    writer = SessionRegistry(new_session, max_sessions=1, spill_dir=str(tmp_path), spill_key=b'old')
+    use(writer, 'alice', 3)
+    use(writer, 'bob')
+    reader = SessionRegistry(new_session, spill_dir=str(tmp_path), spill_key=b'new')
+    assert use(reader, 'alice').counter.value == 0
+    assert reader.stats()['rejected'] == 1
+
+
+def test_least_recently_used_session_is_evicted_first(tmp_path):
+    registry = SessionRegistry(new_session, max_sessions=2, spill_dir=str(tmp_path))
+    use(registry, 'a')
+    use(registry, 'b')
+    use(registry, 'a')
+    use(registry, 'c')
+    assert sorted(os.listdir(tmp_path)) == ['b.session']
+    use(registry, 'd')
+    assert sorted(os.listdir(tmp_path)) == ['a.session', 'b.session']
+
+
+def test_busy_session_is_not_evicted(tmp_path):
+    registry = SessionRegistry(new_session, max_sessions=1, spill_dir=str(tmp_path))
+    held = registry.acquire('a')
+    use(registry, 'b')
+    assert os.listdir(tmp_path) == ['b.session']
+    registry.release(held)
+
+
+def test_disk_budget_removes_oldest_files(tmp_path):
+    registry = SessionRegistry(new_session, max_sessions=1, spill_dir=str(tmp_path))
+    use(registry, 's0')
+    use(registry, 's1')
+    size = os.path.getsize(tmp_path / 's0.session')
+    registry.disk_budget = 3 * size
+    for i in range(2, 8):
+        os.utime(tmp_path / f's{i - 2}.session', (i, i))
+        use(registry, f's{i}')
+    assert len(os.listdir(tmp_path)) == 3
+    assert 's0.session' not in os.listdir(tmp_path)
+
+
+def test_temporary_spill_dir_is_created_lazily_and_removed_on_close():
+    registry = SessionRegistry(new_session, max_sessions=1, temporary_spill=True)
+    use(registry, 'a')
+    assert registry.spill_dir is None
+    use(registry, 'b')
+    spill_dir = registry.spill_dir
+    assert os.listdir(spill_dir) == ['a.session']
+    registry.close()
+    assert not os.path.exists(spill_dir)
+
+
+def test_spill_runs_outside_the_registry_lock(tmp_path):
+    started, finish = threading.Event(), threading.Event()
+
+    class SlowPickle:
+        def __reduce__(self):
+            started.set()
+            finish.wait(5)
+            return (Counter, ())
+
+    registry = SessionRegistry(new_session, max_sessions=1, spill_dir=str(tmp_path))
+    session = registry.acquire('slow')
+    session.simulators['slow'] = SlowPickle()
+    registry.release(session)
+    spiller = threading.Thread(target=use, args=(registry, 'other'))
+    spiller.start()
+    assert started.wait(5)
+    # Khoá của registry không bị giữ trong lúc phiên 'slow' đang được ghi ra đĩa
+    assert registry._lock.acquire(timeout=1)
+    registry._lock.release()
+    finish.set()
+    spiller.join()
+    assert registry.acquire('slow').counter.value == 0
+
+
+def test_session_without_spill_dir_is_dropped():
+    registry = SessionRegistry(new_session, max_sessions=1)
+    use(registry, 'alice', 5)
+    use(registry, 'bob')
+    assert use(registry, 'alice').counter.value == 0
+    assert registry.stats()['dropped'] == 2
+
+
+def test_invalid_session_id_is_rejected():
+    registry = SessionRegistry(new_session)
+    with pytest.raises(ValueError):
+        registry.acquire('../etc/passwd')
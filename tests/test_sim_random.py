@@ -0,0 +1,68 @@
+from fork_resolution import ForkResolutionSimulator
+from pos_simulator import PoSSimulator
+from pow_simulator import PoWSimulator
+from sim_random import ManualClock, RandomStreams
+
+# Thời gian chạy thật, không thuộc kết quả mô phỏng
+WALL_CLOCK_FIELDS = ('elapsed', 'slots_per_second')
+
+
+def run_pow(seed):
+    sim = PoWSimulator(mining_backend='virtual', seed=seed, clock=ManualClock(1700000000.0, tick=0.5))
+    sim.difficulty = 2
+    sim.create_genesis_block()
+    for i, hash_power in enumerate((100, 150, 80)):
+        sim.add_miner(f"Miner {i + 1}", hash_power)
+    results = [sim.simulate_mining_race() for _ in range(8)]
+    return results, [block.to_dict() for block in sim.blockchain]
+
+
+def run_pos(seed):
+    sim = PoSSimulator(seed=seed)
+    for i, stake in enumerate((10, 50, 40, 25, 75)):
+        sim.add_validator(f"V{i}", stake)
+    loop = sim.simulate_multiple_validations(200)
+    vectorized = sim.simulate_multiple_validations(200, vectorized=True)
+    epochs = sim.simulate_epochs(3, slots_per_epoch=8, committee_size=2, uptime=0.9)
+    synthetic = sim.simulate_epochs(2, num_validators=500)
+    for result in (epochs, synthetic):
+        for field in WALL_CLOCK_FIELDS:
+            result.pop(field)
+    return loop, vectorized, epochs, synthetic, list(sim.validation_history)
+
+
+def run_fork(seed):
+    sim = ForkResolutionSimulator(seed=seed, clock=ManualClock(1700000000.0, tick=1.0))
+    sim.create_initial_chain()
+    events = []
+    for _ in range(3):
+        events.append(sim.simulate_fork_scenario())
+        events.append(sim.apply_longest_chain_rule())
+    network = sim.simulate_network(duration=600.0, num_nodes=8)
+    return events, network, sim.get_all_chains()
+
+
+def test_streams_are_stable_per_name():
+    streams = RandomStreams(7)
+    assert streams.seed_for('a') == RandomStreams(7).seed_for('a')
+    assert streams.seed_for('a') != streams.seed_for('b')
+    first = [streams.stream('a').random() for _ in range(3)]
+    # Dùng thêm một stream khác không làm lệch dãy số của stream 'a'
+    other = RandomStreams(7)
+    other.stream('b').random()
+    assert [other.stream('a').random() for _ in range(3)] == first
+
+
+def test_same_seed_reproduces_virtual_pow_run():
+    assert run_pow(11) == run_pow(11)
+    assert run_pow(11)[1] != run_pow(12)[1]
+
+
+def test_same_seed_reproduces_pos_runs():
+    assert run_pos(11) == run_pos(11)
+    assert run_pos(11) != run_pos(12)
+
+
+def test_same_seed_reproduces_fork_runs():
+    assert run_fork(11) == run_fork(11)
+    assert run_fork(11) != run_fork(12)
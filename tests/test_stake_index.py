@@ -0,0 +1,58 @@
+import random
+import pytest
+from stake_index import StakeIndex
+
+
+def prefix_find(values, value):
+    """Cách chọn tuyến tính để đối chiếu: vị trí nhỏ nhất có tổng tích luỹ lớn hơn value"""
+    total = 0.0
+    for i, stake in enumerate(values):
+        total += stake
+        if total > value:
+            return i
+    return len(values) - 1
+
+
+def test_find_matches_linear_scan():
+    rng = random.Random(1)
+    values = [rng.uniform(0, 100) for _ in range(37)]
+    index = StakeIndex(values)
+    for _ in range(500):
+        value = rng.random() * index.total
+        assert index.find(value) == prefix_find(values, value)
+
+
+def test_append_and_update_keep_tree_consistent():
+    rng = random.Random(2)
+    index = StakeIndex()
+    values = []
+    for _ in range(50):
+        stake = rng.uniform(1, 10)
+        index.append(stake)
+        values.append(stake)
+    for _ in range(100):
+        i = rng.randrange(len(values))
+        values[i] = rng.uniform(0, 10)
+        index.update(i, values[i])
+    assert index.total == pytest.approx(sum(values))
+    rebuilt = StakeIndex(values)
+    assert index.tree == pytest.approx(rebuilt.tree)
+
+
+def test_zero_stake_is_never_selected():
+    index = StakeIndex([5.0, 0.0, 3.0, 0.0])
+    rng = random.Random(3)
+    picks = {index.select(rng) for _ in range(2000)}
+    assert picks == {0, 2}
+
+
+def test_select_follows_stake_share():
+    index = StakeIndex([1.0, 3.0])
+    rng = random.Random(4)
+    share = sum(index.select(rng) for _ in range(20000)) / 20000
+    assert share == pytest.approx(0.75, abs=0.02)
+
+
+def test_select_requires_positive_total():
+    with pytest.raises(ValueError):
+        StakeIndex([0.0, 0.0]).select()
@@ -0,0 +1,69 @@
+import pytest
+from validation_history import ValidationHistory
+
+
+def fill(history, rounds, validators=2):
+    for i in range(rounds):
+        history.append(i % validators, 10.0 + i, 0.5, i // validators + 1)
+
+
+def test_window_keeps_latest_entries():
+    history = ValidationHistory(max_entries=5)
+    history.register_validator('A')
+    history.register_validator('B')
+    fill(history, 23)
+    assert len(history) == 5
+    assert history.total_appended == 23
+    assert [record['stake'] for record in history] == [28.0, 29.0, 30.0, 31.0, 32.0]
+    assert history[-1]['validator'] == 'A'
+
+
+def test_spilled_records_are_read_back_in_order(tmp_path):
+    path = str(tmp_path / 'history.bin')
+    history = ValidationHistory(max_entries=4, spill_path=path)
+    history.register_validator('A')
+    history.register_validator('B')
+    fill(history, 20)
+    spilled = list(history.iter_spilled())
+    assert len(spilled) == history.total_spilled
+    assert [record['stake'] for record in spilled] == [10.0 + i for i in range(len(spilled))]
+
+
+def test_new_history_does_not_inherit_previous_spill(tmp_path):
+    path = str(tmp_path / 'history.bin')
+    old = ValidationHistory(max_entries=4, spill_path=path)
+    old.register_validator('A')
+    fill(old, 30, validators=1)
+    assert old.total_spilled > 0
+
+    new = ValidationHistory(max_entries=4, spill_path=path)
+    new.register_validator('B')
+    assert list(new.iter_spilled()) == []
+    with open(path + '.names', encoding='utf-8') as f:
+        assert f.read().split() == ['"B"']
+
+
+def test_clear_truncates_spill_and_resets_counters(tmp_path):
+    path = str(tmp_path / 'history.bin')
+    history = ValidationHistory(max_entries=4, spill_path=path)
+    history.register_validator('A')
+    fill(history, 30, validators=1)
+    history.clear()
+    assert (len(history), history.total_appended, history.total_spilled) == (0, 0, 0)
+    assert list(history.iter_spilled()) == []
+    fill(history, 10, validators=1)
+    assert [record['stake'] for record in history.iter_spilled()] == [10.0 + i for i in range(history.total_spilled)]
+
+
+def test_numpy_columns_are_copied_without_python_objects():
+    np = pytest.importorskip('numpy')
+    history = ValidationHistory(max_entries=3)
+    history.register_validator('A')
+    history.register_validator('B')
+    ids = np.array([0, 1, 0, 1, 1], dtype=np.int64)
+    history.extend(ids, np.arange(5, dtype=float), np.full(5, 0.5), np.arange(1, 6))
+    assert history.total_appended == 5
+    assert [record['validator'] for record in history] == ['A', 'B', 'B']
+    assert [record['stake'] for record in history] == [2.0, 3.0, 4.0]
+    assert history[-1]['total_blocks_validated'] == 5
+
@@ -0,0 +1,165 @@
+import json
+import struct
+from array import array
+from typing import Dict, Iterator, List, Optional, Sequence
+
+# Mỗi bản ghi khi ghi ra đĩa: validator_id, stake, reward, total_blocks_validated
+SPILL_RECORD = struct.Struct('<Iddq')
+
+
+def _extend_column(column: array, values: Sequence):
+    """Nối values vào cột; mảng numpy được đổi sang đúng kiểu của cột rồi chép bytes"""
+    if hasattr(values, 'astype'):
+        column.frombytes(values.astype(column.typecode).tobytes())
+    else:
+        column.extend(values)
+
+
+class ValidationHistory:
+    """
+    Lịch sử validation lưu theo cột (array) thay vì một dict cho mỗi lần validate
+    - max_entries: giới hạn số bản ghi giữ trong bộ nhớ (ring buffer), None = không giới hạn
+    - spill_path: nếu có, các bản ghi bị đẩy ra khỏi bộ nhớ được ghi nối vào file này
+      (file spill và file .names đi kèm được tạo mới khi khởi tạo: dữ liệu của lần chạy trước bị bỏ)
+    Vẫn có thể đọc từng phần tử dưới dạng dict như danh sách cũ
+    """
+    def __init__(self, max_entries: Optional[int] = None, spill_path: Optional[str] = None):
+        if max_entries is not None and max_entries <= 0:
+            raise ValueError("max_entries phải lớn hơn 0")
+        self.max_entries = max_entries
+        self.spill_path = spill_path
+        self.names: List[str] = []
+        self.total_appended = 0
+        self.total_spilled = 0
+        self._new_columns()
+        self._reset_spill()
+    
+    def _new_columns(self):
+        self.validator_ids = array('I')
+        self.stakes = array('d')
+        self.rewards = array('d')
+        self.totals = array('q')
+        self._offset = 0  # Số bản ghi đầu mảng đã bị loại khỏi cửa sổ nhưng chưa xoá
+    
+    def register_validator(self, name: str) -> int:
+        """Đăng ký tên validator, trả về id dùng trong các cột"""
+        self.names.append(name)
+        if self.spill_path is not None:
+            with open(self.spill_path + '.names', 'a', encoding='utf-8') as f:
+                f.write(json.dumps(name) + '\n')
+        return len(self.names) - 1
+    
+    def __len__(self) -> int:
+        return len(self.validator_ids) - self._offset
+    
+    def __getitem__(self, i: int) -> Dict:
+        size = len(self)
+        if i < 0:
+            i += size
+        if not 0 <= i < size:
+            raise IndexError("validation history index out of range")
+        return self._record(self._offset + i)
+    
+    def __iter__(self) -> Iterator[Dict]:
+        for i in range(self._offset, len(self.validator_ids)):
+            yield self._record(i)
+    
+    def _record(self, i: int) -> Dict:
+        return {
+            'validator': self.names[self.validator_ids[i]],
+            'stake': self.stakes[i],
+            'reward': self.rewards[i],
+            'total_blocks_validated': self.totals[i]
+        }
+    
+    def append(self, validator_id: int, stake: float, reward: float, total_blocks_validated: int):
+        """Thêm một bản ghi"""
+        self.validator_ids.append(validator_id)
+        self.stakes.append(stake)
+        self.rewards.append(reward)
+        self.totals.append(total_blocks_validated)
+        self.total_appended += 1
+        self._enforce_limit()
+    
+    def extend(self, validator_ids: Sequence[int], stakes: Sequence[float],
+               rewards: Sequence[float], totals: Sequence[int]):
+        """
+        Thêm hàng loạt bản ghi (các cột cùng độ dài)
+        Các cột có thể là mảng numpy: chúng được chép thẳng dạng bytes vào cột, không tạo đối tượng Python cho từng bản ghi
+        """
+        self.total_appended += len(validator_ids)
+        if self.max_entries is not None and self.spill_path is None and len(validator_ids) > self.max_entries:
+            # Không ghi ra đĩa: chỉ cần giữ max_entries bản ghi cuối cùng
+            skip = len(validator_ids) - self.max_entries
+            validator_ids, stakes = validator_ids[skip:], stakes[skip:]
+            rewards, totals = rewards[skip:], totals[skip:]
+        _extend_column(self.validator_ids, validator_ids)
+        _extend_column(self.stakes, stakes)
+        _extend_column(self.rewards, rewards)
+        _extend_column(self.totals, totals)
+        self._enforce_limit()
+    
+    def _enforce_limit(self):
+        """Giữ tối đa max_entries bản ghi mới nhất; phần cũ được ghi ra file (nếu có)"""
+        if self.max_entries is None:
+            return
+        stored = len(self.validator_ids)
+        self._offset = max(self._offset, stored - self.max_entries)
+        # Chỉ xoá vật lý khi phần thừa đủ lớn để chi phí dịch mảng được chia đều
+        if self._offset >= max(1, self.max_entries // 2):
+            self._spill(self._offset)
+            del self.validator_ids[:self._offset]
+            del self.stakes[:self._offset]
+            del self.rewards[:self._offset]
+            del self.totals[:self._offset]
+            self._offset = 0
+    
+    def _spill(self, count: int):
+        """Ghi count bản ghi đầu mảng ra file spill"""
+        if self.spill_path is None or count == 0:
+            return
+        pack = SPILL_RECORD.pack
+        with open(self.spill_path, 'ab') as f:
+            f.write(b''.join(
+                pack(self.validator_ids[i], self.stakes[i], self.rewards[i], self.totals[i])
+                for i in range(count)
+            ))
+        self.total_spilled += count
+    
+    def iter_spilled(self) -> Iterator[Dict]:
+        """Đọc lại các bản ghi đã ghi ra file spill"""
+        if self.spill_path is None:
+            return
+        try:
+            with open(self.spill_path, 'rb') as f:
+                data = f.read()
+        except FileNotFoundError:
+            return
+        for validator_id, stake, reward, total in SPILL_RECORD.iter_unpack(data):
+            yield {
+                'validator': self.names[validator_id],
+                'stake': stake,
+                'reward': reward,
+                'total_blocks_validated': total
+            }
+    
+    def clear(self, reset_names: bool = False):
+        """
+        Xoá toàn bộ lịch sử, kể cả phần đã ghi ra file spill
+        File spill bị cắt về rỗng, file .names được ghi lại chỉ với bảng tên hiện tại
+        reset_names: xoá cả bảng tên validator (khi bộ validator cũng bị xoá)
+        """
+        if reset_names:
+            self.names = []
+        self._new_columns()
+        self.total_appended = 0
+        self.total_spilled = 0
+        self._reset_spill()
+    
+    def _reset_spill(self):
+        """Cắt file spill về rỗng và ghi lại file .names chỉ với bảng tên hiện tại"""
+        if self.spill_path is None:
+            return
+        open(self.spill_path, 'wb').close()
+        with open(self.spill_path + '.names', 'w', encoding='utf-8') as f:
+            f.writelines(json.dumps(name) + '\n' for name in self.names)